@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Installs (image check, create, start, inspect, the lifecycle exec and the property
+# archive calls each) run against the fake Docker API, comparing eight workers that each
+# block on one transition at a time with the async engine keeping every transition in
+# flight on a single loop thread, then the average time per phase of an async install.
+# Run from the docker-rm directory: python3 benchmarks/async_engine_benchmark.py
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine
+from controllers.transition.TransitionTimings import TransitionTimings
+from tests.fake_docker_api import FakeDockerAPI
+
+TRANSITIONS=[100, 1000]
+WORKERS=8
+EXEC_DELAY=0.05
+
+class BenchType:
+	name='resource::example::1.0'
+	imageName='dockerrm_example'
+	lifecyclePath={'lifecycle':{'install':'/lifecycle/install.sh'}}
+	operationsPath=None
+
+class BenchInstance:
+	# the attributes the engine reads and writes on a ResourceInstance
+	def __init__(self, resourceId):
+		self.resourceId=resourceId
+		self.name='example'+str(resourceId)
+		self.type=BenchType()
+		self.properties={'docker_network':'bridge','docker_ipaddr':'','hostname':'example'}
+		self.containerId=None
+		self.containerName=None
+		self.readonly=False
+
+def startFakeDocker(socketPath):
+	ready=threading.Event()
+	def serve():
+		loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(FakeDockerAPI(EXEC_DELAY).serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+
+def blockingWorkers(engine, count):
+	# each worker waits on its transition before taking the next, like the docker SDK on a scheduler worker
+	pending=list(range(count))
+	lock=threading.Lock()
+	def worker():
+		while True:
+			with lock:
+				if len(pending)==0:
+					return
+				resourceId=pending.pop()
+			engine.submit(engine.runStandardTransition(BenchInstance(resourceId), 'install', None)).result()
+	threads=[threading.Thread(target=worker) for i in range(WORKERS)]
+	start=time.perf_counter()
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	return time.perf_counter()-start
+
+def asyncInFlight(engine, count, timings):
+	start=time.perf_counter()
+	futures=[engine.submit(engine.runStandardTransition(BenchInstance(i), 'install', None, timings=timings[i])) for i in range(count)]
+	for f in futures:
+		f.result()
+	return time.perf_counter()-start
+
+def averagePhases(timings):
+	phases={}
+	for t in timings:
+		for name, ms in t.asDict().items():
+			phases.setdefault(name, []).append(ms)
+	return [(name, sum(values)/len(values)) for name, values in phases.items()]
+
+def main():
+	logging.disable(logging.INFO)
+	socketPath=os.path.join(tempfile.mkdtemp(), 'docker.sock')
+	startFakeDocker(socketPath)
+	engine=AsyncTransitionEngine(socketPath=socketPath, maxInFlight=1000)
+	engine.start()
+
+	print('install transitions, %.0f ms per lifecycle exec' % (EXEC_DELAY*1e3))
+	print('%12s %26s %26s' % ('transitions', '%d blocking workers (s)' % WORKERS, 'async, one thread (s)'))
+	for count in TRANSITIONS:
+		timings=[TransitionTimings() for i in range(count)]
+		print('%12d %26.2f %26.2f' % (count, blockingWorkers(engine, count), asyncInFlight(engine, count, timings)))
+	print(engine.getMetrics())
+
+	print('average ms per phase of the last %d async installs' % TRANSITIONS[-1])
+	for name, ms in averagePhases(timings):
+		print('%18s %10.2f' % (name, ms))
+
+if __name__ == '__main__':
+	main()
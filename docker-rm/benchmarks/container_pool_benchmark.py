@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Scale-out bursts of installs of one type against a fake backend where running a new
+# container takes much longer than the few calls a claim makes. Compares how long each
+# install waits for its container with no pool and with a warm pool, which is refilled
+# in the background between bursts, and reports the pool's hits, misses and claim latency.
+# Run from the docker-rm directory: python3 benchmarks/container_pool_benchmark.py
+
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.resource.ContainerPool import ContainerPools
+
+RUN_SECONDS=0.3
+CALL_SECONDS=0.002
+POOL_SIZE=5
+BURSTS=[3, 5, 10]
+BURST_GAP=2.0
+
+class BenchType:
+	name='resource::example::1.0'
+	imageName='dockerrm_example'
+	resourceDescriptor={'pool':{'size':POOL_SIZE}}
+
+class FakeBackend:
+	def __init__(self):
+		self.ids=itertools.count(1)
+
+	def create(self, resourceType, name):
+		time.sleep(RUN_SECONDS)
+		return 'c%d' % next(self.ids)
+
+	def remove(self, containerId):
+		time.sleep(CALL_SECONDS)
+
+	def listPooled(self, resourceType):
+		return []
+
+def claimContainer(containerId):
+	# rename, connect, disconnect and an exec for the hostname
+	time.sleep(CALL_SECONDS*4)
+
+def burst(pools, count):
+	# installs of a scale-out run at once on the scheduler workers
+	waits=[]
+	lock=threading.Lock()
+	def install():
+		start=time.perf_counter()
+		if pools==None or not pools.claim(BenchType, claimContainer):
+			time.sleep(RUN_SECONDS)
+		with lock:
+			waits.append(time.perf_counter()-start)
+	threads=[threading.Thread(target=install) for i in range(count)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	return sum(waits)/len(waits), max(waits)
+
+def main():
+	logging.disable(logging.ERROR)
+	pools=ContainerPools(FakeBackend(), refillInterval=BURST_GAP)
+	pools.configure([BenchType])
+	while pools.getMetrics()[BenchType.name]['ready']<POOL_SIZE:
+		time.sleep(0.05)
+
+	print('container run %.0f ms, pool of %d refilled one container at a time' % (RUN_SECONDS*1e3, POOL_SIZE))
+	print('%8s %18s %18s %18s %18s' % ('burst', 'no pool avg (ms)', 'no pool max (ms)', 'pool avg (ms)', 'pool max (ms)'))
+	for count in BURSTS:
+		coldAverage, coldMax=burst(None, count)
+		warmAverage, warmMax=burst(pools, count)
+		print('%8d %18.1f %18.1f %18.1f %18.1f' % (count, coldAverage*1e3, coldMax*1e3, warmAverage*1e3, warmMax*1e3))
+		# the pool refills before the next scale-out
+		time.sleep(BURST_GAP)
+	print(pools.getMetrics())
+
+if __name__ == '__main__':
+	main()
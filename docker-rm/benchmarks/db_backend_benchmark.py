@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Compares the TinyDB and SQLite transition stores for the write and lookup
+# pattern of a burst of transitions: insert, two status updates, then polls.
+# Run from the docker-rm directory: python3 benchmarks/db_backend_benchmark.py
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.util.TinyDBStore import TinyDBStore
+from controllers.util.SQLiteStore import SQLiteStore
+
+SIZES=[250, 1000, 2000]
+THREADS=8
+
+def transition(requestId):
+	return {
+		'requestId': requestId,
+		'requestState': 'IN_PROGRESS',
+		'requestStateReason': '',
+		'resourceId': 'None',
+		'startedAt': '2018-01-01T00:00:00+00:00',
+		'finishedAt': '',
+		'context': {'AsynchronousTransitionResponses': True},
+		'transitionName': 'Install'
+	}
+
+def runBurst(store, size):
+	# each worker thread owns a slice of the requests, as transition tasks would
+	def worker(requestIds):
+		for requestId in requestIds:
+			eid=store.insert(transition(requestId))
+			store.update(eid, {'resourceId': str(requestId)})
+			store.update(eid, {'requestState': 'COMPLETED'})
+			store.findByRequestId(requestId)
+			store.findByResourceId(requestId)
+
+	threads=[threading.Thread(target=worker, args=(range(1+i, size+1, THREADS),)) for i in range(THREADS)]
+	start=time.perf_counter()
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	return time.perf_counter()-start
+
+def main():
+	print('%8s %10s %12s %14s' % ('backend', 'rows', 'total (s)', 'per row (ms)'))
+	for size in SIZES:
+		for name, storeClass, filename in [('tinydb', TinyDBStore, 'db.json'), ('sqlite', SQLiteStore, 'db.sqlite')]:
+			with tempfile.TemporaryDirectory() as tmp:
+				store=storeClass(os.path.join(tmp, filename))
+				elapsed=runBurst(store, size)
+				store.close()
+			print('%8s %10d %12.3f %14.3f' % (name, size, elapsed, elapsed/size*1000))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Multi-homed installs against an in-process fake daemon with a fixed latency per call
+# that reports container and network changes as docker events. Compares the calls an
+# install made on the transition path before (reload after start, then a list, get,
+# connect and reload per extra network) with reading addresses from the state cache
+# (a connect per extra network). Then drops the event stream and checks that reads go
+# to the daemon until the cache has resynced.
+# Run from the docker-rm directory: python3 benchmarks/docker_state_cache_benchmark.py
+
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import controllers.resource.DockerStateCache
+from controllers.resource.DockerStateCache import DockerStateCache
+
+INSTALLS=200
+EXTRA_NETWORKS=2
+CALL_DELAY=0.002
+
+class FakeDaemon:
+	# containers and networks as docker would report them, every change is queued as an event
+	def __init__(self):
+		self.lock=threading.Lock()
+		self.ids=itertools.count(1)
+		self.containers={}
+		self.networks={}
+		self.stream=None
+		self.calls=0
+
+	def call(self):
+		with self.lock:
+			self.calls=self.calls+1
+		time.sleep(CALL_DELAY)
+
+	def emit(self, eventType, action, actorId, attributes=None):
+		if self.stream!=None:
+			self.stream.put({'Type':eventType, 'Action':action, 'Actor':{'ID':actorId, 'Attributes':attributes or {}}})
+
+	def createNetwork(self, name):
+		networkId='net%d' % next(self.ids)
+		self.networks[networkId]={'Id':networkId, 'Name':name, 'Labels':{}, 'IPAM':{'Config':[]}}
+		self.emit('network', 'create', networkId)
+		return networkId
+
+	def run(self, name, network):
+		# create and start, as containers.run does
+		self.call()
+		containerId='c%d' % next(self.ids)
+		self.containers[containerId]={'Id':containerId, 'Name':'/'+name, 'State':{'Status':'running'}, 'Config':{'Labels':{}},
+									'NetworkSettings':{'Networks':{network:{'NetworkID':network, 'IPAddress':'172.17.0.%d' % (len(self.containers)%250+2)}}}}
+		self.emit('container', 'create', containerId)
+		self.emit('container', 'start', containerId)
+		return containerId
+
+	def connect(self, containerId, networkId):
+		self.call()
+		network=self.networks[networkId]
+		self.containers[containerId]['NetworkSettings']['Networks'][network['Name']]={'NetworkID':networkId, 'IPAddress':'10.%d.0.2' % len(self.containers)}
+		self.emit('network', 'connect', networkId, {'container':containerId})
+
+	# the calls made by the state cache source
+
+	def listContainers(self):
+		self.call()
+		return list(self.containers.values())
+
+	def inspectContainer(self, key):
+		self.call()
+		for attrs in list(self.containers.values()):
+			if attrs['Id']==key or attrs['Name']=='/'+key:
+				return attrs
+		return None
+
+	def listNetworks(self):
+		self.call()
+		return list(self.networks.values())
+
+	def inspectNetwork(self, key):
+		self.call()
+		for attrs in list(self.networks.values()):
+			if attrs['Id']==key or attrs['Name']==key:
+				return attrs
+		return None
+
+	def events(self):
+		self.stream=queue.Queue()
+		stream=self.stream
+		def follow():
+			while True:
+				event=stream.get()
+				if event==None:
+					return
+				yield event
+		return follow()
+
+	def dropStream(self):
+		self.stream.put(None)
+		self.stream=None
+
+def installPolling(daemon, i, extraNetworks):
+	containerId=daemon.run('example%d' % i, 'bridge')
+	daemon.inspectContainer(containerId)
+	for name in extraNetworks:
+		# networks.list(names=...), networks.get, connect, reload
+		network=daemon.inspectNetwork(name)
+		daemon.inspectNetwork(network['Id'])
+		daemon.connect(containerId, network['Id'])
+		daemon.inspectContainer(containerId)
+
+def installCached(daemon, cache, i, extraNetworks, pathCalls):
+	containerId=daemon.run('cached%d' % i, 'bridge')
+	cache.waitForContainer(containerId, lambda c: c['state']!='created' and 'bridge' in c['networks'])
+	for name in extraNetworks:
+		network=cache.findNetwork(name)
+		daemon.connect(containerId, network['id'])
+		cache.waitForContainer(containerId, lambda c: name in c['networks'])
+	# only the calls made by the install, the event thread makes the others
+	pathCalls[0]=pathCalls[0]+1+len(extraNetworks)
+
+def measure(daemon, install):
+	calls=daemon.calls
+	start=time.perf_counter()
+	for i in range(INSTALLS):
+		install(i)
+	elapsed=time.perf_counter()-start
+	return elapsed, (daemon.calls-calls)/INSTALLS
+
+def main():
+	logging.disable(logging.ERROR)
+	controllers.resource.DockerStateCache.RESUBSCRIBE_DELAY=0.05
+	daemon=FakeDaemon()
+	extraNetworks=['backend%d' % n for n in range(EXTRA_NETWORKS)]
+	for name in extraNetworks:
+		daemon.createNetwork(name)
+
+	print('%d installs with %d extra networks, %.0f ms per docker call' % (INSTALLS, EXTRA_NETWORKS, CALL_DELAY*1e3))
+	print('%10s %18s %12s %16s' % ('state', 'calls/install', 'total (s)', 'per install (ms)'))
+	elapsed, calls=measure(daemon, lambda i: installPolling(daemon, i, extraNetworks))
+	print('%10s %18.1f %12.2f %16.2f' % ('polling', calls, elapsed, elapsed*1e3/INSTALLS))
+
+	cache=DockerStateCache(daemon)
+	cache.watch()
+	while not cache.live:
+		time.sleep(0.01)
+	pathCalls=[0]
+	elapsed, calls=measure(daemon, lambda i: installCached(daemon, cache, i, extraNetworks, pathCalls))
+	print('%10s %18.1f %12.2f %16.2f' % ('cached', pathCalls[0]/INSTALLS, elapsed, elapsed*1e3/INSTALLS))
+	print('calls per install including the event thread: %.1f' % calls)
+
+	daemon.dropStream()
+	while cache.live:
+		time.sleep(0.001)
+	before=cache.misses
+	cache.getContainer('cached0')
+	print('stream down: read went to docker %s' % (cache.misses>before))
+	while not cache.live:
+		time.sleep(0.01)
+	print(cache.getMetrics())
+
+if __name__ == '__main__':
+	main()
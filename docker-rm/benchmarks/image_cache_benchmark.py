@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Installs on the async engine against the fake Docker API with a fixed daemon latency
+# per request, looking the image up with docker on every install as before, then with the
+# image loaded into the image cache when the types load. Then checks that a type whose
+# image is missing is found at load, and that image events and a dropped event stream
+# invalidate the cache.
+# Run from the docker-rm directory: python3 benchmarks/image_cache_benchmark.py
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine
+from controllers.resource.DockerEndpoint import dockerEndpoints, DEFAULT_ENDPOINT
+from controllers.util.DockerAPI import DockerAPIException
+import controllers.resource.ImageCache
+from async_engine_benchmark import BenchInstance
+from tests.fake_docker_api import FakeDockerAPI
+
+TRANSITIONS=500
+REQUEST_DELAY=0.002
+EXEC_DELAY=0.01
+IMAGES=['dockerrm_example']
+
+def startFakeDocker(socketPath):
+	fake=FakeDockerAPI(EXEC_DELAY, images=IMAGES, requestDelay=REQUEST_DELAY)
+	ready=threading.Event()
+	def serve():
+		loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(fake.serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+	return fake
+
+def installs(engine, fake, imageCache, uncached):
+	requests=fake.requests
+	start=time.perf_counter()
+	futures=[]
+	for i in range(TRANSITIONS):
+		if uncached:
+			# every install finds the cache empty and asks docker
+			imageCache.invalidateAll()
+		futures.append(engine.submit(engine.runStandardTransition(BenchInstance(i), 'install', None)))
+		# one at a time so each install sees the cache as it was left
+		futures[-1].result()
+	return time.perf_counter()-start, (fake.requests-requests)/TRANSITIONS
+
+def main():
+	logging.disable(logging.ERROR)
+	socketPath=os.path.join(tempfile.mkdtemp(), 'docker.sock')
+	fake=startFakeDocker(socketPath)
+	engine=AsyncTransitionEngine(socketPath=socketPath)
+	engine.start()
+	# the images of the default endpoint, the one the engine sends these installs to
+	imageCache=dockerEndpoints.get(DEFAULT_ENDPOINT).images
+
+	def lookup(imageName):
+		try:
+			return engine.submit(engine.apis[DEFAULT_ENDPOINT].inspectImage(imageName)).result()
+		except DockerAPIException as ex:
+			if ex.status==404:
+				return None
+			raise
+	imageCache.lookup=lookup
+
+	print('%d installs, %.0f ms per docker request' % (TRANSITIONS, REQUEST_DELAY*1e3))
+	print('%10s %20s %12s %16s' % ('image', 'requests/install', 'total (s)', 'per install (ms)'))
+	elapsed, requests=installs(engine, fake, imageCache, True)
+	print('%10s %20.1f %12.2f %16.2f' % ('lookup', requests, elapsed, elapsed*1e3/TRANSITIONS))
+	missing=imageCache.refresh(IMAGES+['dockerrm_missing'])
+	elapsed, requests=installs(engine, fake, imageCache, False)
+	print('%10s %20.1f %12.2f %16.2f' % ('cached', requests, elapsed, elapsed*1e3/TRANSITIONS))
+	print('missing at type load: %s' % missing)
+
+	# a rebuilt image is retagged, the next install looks it up again
+	imageCache.handleEvent({'Type':'image', 'Action':'tag', 'Actor':{'ID':'sha256:new', 'Attributes':{'name':'dockerrm_example:latest'}}})
+	print('after tag event, cached: %s' % (imageCache.peek('dockerrm_example')!=None))
+	imageCache.get('dockerrm_example')
+
+	# everything is dropped when the event stream has to be reopened
+	controllers.resource.ImageCache.RESUBSCRIBE_DELAY=0.01
+	streams=[]
+	def events():
+		streams.append(1)
+		return iter([])
+	imageCache.watch(events)
+	while len(streams)<2:
+		time.sleep(0.01)
+	print('after event stream reconnect, cached: %s' % (imageCache.peek('dockerrm_example')!=None))
+	print(imageCache.getMetrics())
+
+if __name__ == '__main__':
+	main()
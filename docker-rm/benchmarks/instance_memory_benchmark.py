@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# Bytes held per resource instance and per transition, comparing the old layout
+# (per object __dict__ and logger, ISO timestamp strings, a properties dict per
+# instance) with the slotted layout, epoch timestamps and shared property keys.
+# ResourceInstance and Transition connect to docker when imported, so the classes
+# below copy their attributes, both layouts with every attribute they have today;
+# the property maps and transition timings are the real ones.
+# Run from the docker-rm directory: python3 benchmarks/instance_memory_benchmark.py
+
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.resource.PropertyMap import PropertyMap, internLayout
+from controllers.transition.TransitionTimings import TransitionTimings
+
+COUNT=20000
+PROPERTY_NAMES=['docker_network','docker_network1','docker_hostname','docker_ipaddr','docker_ipaddr1',
+		'hostname','port','username','password','config_dir','log_level','replicas']
+
+def isoNow():
+	return str(datetime.now(timezone.utc).astimezone().isoformat())
+
+class BenchType:
+	def __init__(self):
+		self.name='resource::example::1.0'
+		self.propertyLayout=internLayout(PROPERTY_NAMES)
+		self.propertyDefaults=['']*len(PROPERTY_NAMES)
+
+def requestProperties(i):
+	# keys arrive as fresh strings from each json request
+	return dict((''.join(list(name)), name+str(i)) for name in PROPERTY_NAMES)
+
+class OldInstance:
+	def __init__(self, resourceType, i):
+		self.logger=logging.getLogger(__name__)
+		self.type=resourceType
+		self.properties={}
+		for name in PROPERTY_NAMES:
+			self.properties[name]=''
+		for key, value in requestProperties(i).items():
+			self.properties[str(key)]=value
+		self.location='dev'
+		self.createdAt=isoNow()
+		self.lastModifiedAt=isoNow()
+		self.name='instance'+str(i)
+		self.resourceId=i
+		self.container=None
+		self.containerId=None
+		self.containerName=None
+		self.readonly=False
+		self.endpoint=None
+		self.placement=None
+
+class NewInstance:
+	__slots__=('type','properties','location','createdAt','lastModifiedAt','name','resourceId',
+			'container','containerId','containerName','readonly','endpoint','placement')
+
+	logger=logging.getLogger(__name__)
+
+	def __init__(self, resourceType, i):
+		self.type=resourceType
+		self.properties=PropertyMap(resourceType.propertyLayout, resourceType.propertyDefaults)
+		for key, value in requestProperties(i).items():
+			self.properties[str(key)]=value
+		self.location='dev'
+		self.createdAt=time.time()
+		self.lastModifiedAt=self.createdAt
+		self.name='instance'+str(i)
+		self.resourceId=i
+		self.container=None
+		self.containerId=None
+		self.containerName=None
+		self.readonly=False
+		self.endpoint=None
+		self.placement=None
+
+class OldTransition:
+	def __init__(self, i):
+		self.logger=logging.getLogger(__name__)
+		self.startedAt=isoNow()
+		self.requestState='IN_PROGRESS'
+		self.requestStateReason=''
+		self.finishedAt=isoNow()
+		self.requestId=i
+		self.properties=None
+		self.resourceName='instance'+str(i)
+		self.metricKey=None
+		self.resourceId=str(i)
+		self.resourceTypeName='resource::example::1.0'
+		self.resourceManagerId='docker-rm::dev'
+		self.deploymentLocation='dev'
+		self.transitionName='Start'
+		self.dependsOn=None
+		self.acceptedAt=time.monotonic()
+		self.timings=TransitionTimings()
+		self.eid=i
+		self.task=None
+		self.resourceInstance=None
+
+class NewTransition:
+	__slots__=('startedAt','requestState','requestStateReason','finishedAt','requestId','properties',
+			'resourceName','metricKey','resourceId','resourceTypeName','resourceManagerId',
+			'deploymentLocation','transitionName','dependsOn','acceptedAt','timings','eid','task','resourceInstance')
+
+	logger=logging.getLogger(__name__)
+
+	def __init__(self, i):
+		self.startedAt=time.time()
+		self.requestState='IN_PROGRESS'
+		self.requestStateReason=''
+		self.finishedAt=time.time()
+		self.requestId=i
+		self.properties=None
+		self.resourceName='instance'+str(i)
+		self.metricKey=None
+		self.resourceId=str(i)
+		self.resourceTypeName='resource::example::1.0'
+		self.resourceManagerId='docker-rm::dev'
+		self.deploymentLocation='dev'
+		self.transitionName='Start'
+		self.dependsOn=None
+		self.acceptedAt=time.monotonic()
+		self.timings=TransitionTimings()
+		self.eid=i
+		self.task=None
+		self.resourceInstance=None
+
+def bytesPer(build):
+	gc.collect()
+	tracemalloc.start()
+	before=tracemalloc.get_traced_memory()[0]
+	objects=[build(i) for i in range(COUNT)]
+	gc.collect()
+	after=tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	# the list holding the objects is not part of their cost
+	return (after-before-sys.getsizeof(objects))/len(objects)
+
+def main():
+	resourceType=BenchType()
+	oldInstance=bytesPer(lambda i: OldInstance(resourceType, i))
+	newInstance=bytesPer(lambda i: NewInstance(resourceType, i))
+	oldTransition=bytesPer(OldTransition)
+	newTransition=bytesPer(NewTransition)
+
+	print('%d objects, %d properties per instance' % (COUNT, len(PROPERTY_NAMES)))
+	print('%12s %14s %14s %10s' % ('object', 'before (B)', 'after (B)', 'saved'))
+	print('%12s %14.0f %14.0f %9.0f%%' % ('instance', oldInstance, newInstance, 100*(1-newInstance/oldInstance)))
+	print('%12s %14.0f %14.0f %9.0f%%' % ('transition', oldTransition, newTransition, 100*(1-newTransition/oldTransition)))
+
+if __name__ == '__main__':
+	main()
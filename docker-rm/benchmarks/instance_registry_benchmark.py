@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Lookup, dedup and removal cost of the instance registry against the plain list
+# scans it replaced, at 100k instances.
+# Run from the docker-rm directory: python3 benchmarks/instance_registry_benchmark.py
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.resource.InstanceRegistry import InstanceRegistry
+
+INSTANCES=100000
+LOCATIONS=['dev','test','prod','edge']
+TYPES=['resource::example::1.0','resource::docker-network::1.0','resource::db::1.0']
+OPERATIONS=200
+
+class BenchType:
+	def __init__(self, name):
+		self.name=name
+
+class BenchInstance:
+	# the attributes the registry indexes on
+	def __init__(self, resourceId):
+		self.resourceId=resourceId
+		self.location=LOCATIONS[resourceId % len(LOCATIONS)]
+		self.type=BenchType(TYPES[resourceId % len(TYPES)])
+		self.name='instance'+str(resourceId)
+		self.properties={}
+
+def timeIt(operation, keys):
+	start=time.perf_counter()
+	for k in keys:
+		operation(k)
+	return (time.perf_counter()-start)/len(keys)*1e6
+
+def main():
+	instances=[BenchInstance(i) for i in range(INSTANCES)]
+	registry=InstanceRegistry()
+	for i in instances:
+		registry.add(i)
+	plain=list(instances)
+
+	ids=random.sample(range(INSTANCES), OPERATIONS)
+	keys=[(instances[i].location, instances[i].name, instances[i].type.name) for i in ids]
+
+	def listGet(resourceId):
+		for i in plain:
+			if i.resourceId==resourceId:
+				return i
+
+	def listFindOne(key):
+		for i in plain:
+			if i.location==key[0] and i.type.name==key[2] and i.name==key[1]:
+				return i
+
+	def listRemove(resourceId):
+		for index, i in enumerate(plain):
+			if i.resourceId==resourceId:
+				del plain[index]
+				return
+
+	print('%d instances, %d operations each' % (INSTANCES, OPERATIONS))
+	print('%24s %14s %14s' % ('operation', 'list (us)', 'registry (us)'))
+	print('%24s %14.2f %14.2f' % ('find by resourceId', timeIt(listGet, ids), timeIt(registry.get, ids)))
+	print('%24s %14.2f %14.2f' % ('find by loc/type/name', timeIt(listFindOne, keys), timeIt(lambda k: registry.findOne(*k), keys)))
+	print('%24s %14.2f %14.2f' % ('remove', timeIt(listRemove, ids), timeIt(registry.remove, ids)))
+
+if __name__ == '__main__':
+	main()
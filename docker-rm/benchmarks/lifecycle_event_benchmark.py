@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Cost of building the kafka lifecycle event as a resource's transition history grows,
+# comparing the old install lookup over the resource's transitions with the timestamps
+# now carried on the resource instance.
+# Run from the docker-rm directory: python3 benchmarks/lifecycle_event_benchmark.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.util.TransitionIndex import TransitionIndex
+from controllers.transition.LifecycleEvent import buildLifecycleEvent
+
+HISTORY=[10, 100, 1000, 10000]
+EVENTS=2000
+
+class BenchType:
+	name='resource::example::1.0'
+
+class BenchInstance:
+	# the attributes buildLifecycleEvent reads from a ResourceInstance
+	def __init__(self):
+		self.resourceId=1
+		self.name='example'
+		self.type=BenchType()
+		self.properties={'docker_network':'bridge','docker_ipaddr':'172.17.0.2','dummy':''}
+		self.createdAt=1514764800.0
+		self.lastModifiedAt=1514764801.0
+
+	def getID(self):
+		return 'c'*64
+
+class BenchTransition:
+	# the attributes buildLifecycleEvent reads from a Transition
+	def __init__(self):
+		self.requestId=1
+		self.metricKey='key'
+		self.resourceManagerId='docker-rm::dev'
+		self.deploymentLocation='dev'
+		self.transitionName='Start'
+
+	def getTransitionRequestStatus(self):
+		return {'requestId':self.requestId,'requestState':'COMPLETED','requestStateReason':'','resourceId':'1',
+				'startedAt':'2018-01-01T00:00:00+00:00','finishedAt':'2018-01-01T00:00:01+00:00','transitionName':self.transitionName}
+
+def historyLookup(index):
+	# what TransitionTask.run did before the timestamps were kept on the instance
+	createdAt=None
+	for t in index.findByResourceId(1):
+		if t['transitionName'].lower()=='install':
+			createdAt=t['finishedAt']
+	return createdAt
+
+def main():
+	instance=BenchInstance()
+	transition=BenchTransition()
+	print('%10s %22s %22s' % ('history', 'with lookup (us)', 'from instance (us)'))
+	for size in HISTORY:
+		index=TransitionIndex()
+		for eid in range(1, size+1):
+			index.add(eid, {'requestId':eid,'resourceId':'1','requestState':'COMPLETED','finishedAt':'2018-01-01T00:00:00+00:00',
+							'transitionName':'Install' if eid==1 else 'Start'})
+
+		start=time.perf_counter()
+		for _ in range(EVENTS):
+			historyLookup(index)
+			buildLifecycleEvent(transition, instance)
+		old=(time.perf_counter()-start)/EVENTS*1e6
+
+		start=time.perf_counter()
+		for _ in range(EVENTS):
+			buildLifecycleEvent(transition, instance)
+		new=(time.perf_counter()-start)/EVENTS*1e6
+		print('%10d %22.2f %22.2f' % (size, old, new))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Installs of one location spread over several fake docker daemons, each answering only a
+# few requests at a time, through the async engine. Compares one endpoint in the location
+# with three, reports how the installs were placed, checks that an endpoint without the
+# image gets none of them and that a network is created on every endpoint of its location.
+# Run from the docker-rm directory: python3 benchmarks/multi_endpoint_benchmark.py
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine
+from controllers.resource.DockerEndpoint import DockerEndpoints
+from controllers.resource.Placement import PlacementEngine
+from async_engine_benchmark import BenchType, BenchInstance
+from tests.fake_docker_api import FakeDockerAPI
+
+TRANSITIONS=600
+REQUEST_DELAY=0.01
+CONCURRENCY=4
+EXEC_DELAY=0.01
+DAEMONS=3
+
+class PlacedType(BenchType):
+	internal=False
+	resourceDescriptor=None
+
+class NetworkType:
+	name='resource::docker-network::1.0'
+	internal=True
+
+class NetworkInstance:
+	def __init__(self, location):
+		self.resourceId=0
+		self.name='backend'
+		self.location=location
+		self.endpoint=None
+		self.type=NetworkType()
+		self.properties={'networkname':'backend', 'subnet':'10.10.0.0/16', 'gateway':'10.10.0.1'}
+		self.readonly=False
+
+def startFakeDocker(socketPath, images):
+	fake=FakeDockerAPI(EXEC_DELAY, images=images, requestDelay=REQUEST_DELAY, concurrency=CONCURRENCY)
+	ready=threading.Event()
+	def serve():
+		loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(fake.serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+	return fake
+
+def location(name, daemons):
+	# a location with an endpoint per daemon, the image cache of each filled as loadImages would
+	directory=tempfile.mkdtemp()
+	config=[]
+	fakes={}
+	for i, images in enumerate(daemons):
+		endpointName='%s-%d' % (name, i)
+		socketPath=os.path.join(directory, 'docker%d.sock' % i)
+		fakes[endpointName]=startFakeDocker(socketPath, images)
+		config.append({'name':endpointName, 'url':'unix://'+socketPath})
+	endpoints=DockerEndpoints([{'name':name, 'endpoints':config}])
+	for endpoint in endpoints.all():
+		images=daemons[int(endpoint.name.rsplit('-', 1)[1])]
+		endpoint.images.lookup=lambda imageName, images=images: {'Id':'sha256:'+imageName} if imageName in images else None
+		endpoint.images.refresh([BenchType.imageName])
+	return endpoints, fakes
+
+def installs(name, daemons):
+	endpoints, fakes=location(name, daemons)
+	engine=AsyncTransitionEngine(endpoints=endpoints)
+	engine.start()
+	placement=PlacementEngine(endpoints)
+	instances=[]
+	for i in range(TRANSITIONS):
+		instance=BenchInstance(i)
+		instance.type=PlacedType()
+		instance.location=name
+		placement.place(instance)
+		instances.append(instance)
+	start=time.perf_counter()
+	futures=[engine.submit(engine.runStandardTransition(instance, 'install', None)) for instance in instances]
+	for f in futures:
+		f.result()
+	elapsed=time.perf_counter()-start
+	placed=dict((endpointName, sum(1 for i in instances if i.endpoint==endpointName)) for endpointName in sorted(fakes))
+	return engine, fakes, elapsed, placed
+
+def main():
+	logging.disable(logging.ERROR)
+	image=[BenchType.imageName]
+
+	print('%d installs, daemons answer %d requests at a time taking %.0f ms each' % (TRANSITIONS, CONCURRENCY, REQUEST_DELAY*1e3))
+	print('%10s %12s %16s   %s' % ('endpoints', 'total (s)', 'installs/s', 'placed'))
+	engine, fakes, elapsed, placed=installs('one', [image])
+	print('%10d %12.2f %16.0f   %s' % (1, elapsed, TRANSITIONS/elapsed, placed))
+	engine, fakes, elapsed, placed=installs('three', [image]*DAEMONS)
+	print('%10d %12.2f %16.0f   %s' % (DAEMONS, elapsed, TRANSITIONS/elapsed, placed))
+
+	# an endpoint without the image is left out
+	engine, fakes, elapsed, placed=installs('partial', [image, [], image])
+	print('%10s %12.2f %16.0f   %s' % ('no image', elapsed, TRANSITIONS/elapsed, placed))
+
+	# a network of the location is created on each of its endpoints
+	network=NetworkInstance('three')
+	engine, fakes, elapsed, placed=installs('three', [image]*DAEMONS)
+	engine.submit(engine.runStandardTransition(network, 'install', None)).result()
+	print('network on endpoints: %s, recorded on %s' % ([n for n, f in sorted(fakes.items()) if len(f.networks)>0], network.endpoint))
+	engine.submit(engine.runStandardTransition(network, 'uninstall', None)).result()
+	print('network left after uninstall: %s' % [n for n, f in sorted(fakes.items()) if len(f.networks)>0])
+
+	# tcp endpoints are left to the docker SDK
+	tcp=DockerEndpoints([{'name':'remote', 'endpoints':[{'name':'remote-0', 'url':'tcp://10.0.0.2:2376'}]}])
+	instance=BenchInstance(0)
+	instance.location='remote'
+	print('engine handles tcp endpoint: %s' % AsyncTransitionEngine(endpoints=tcp).handles(instance))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Starts multi-homed containers through the async engine against the fake Docker API with a
+# fixed daemon latency per request, counting the requests each start makes as the number of
+# docker_networkN properties grows. Compares connecting and inspecting once per extra network
+# after the start, as before, with all networks joined at create (api 1.44 and later) and
+# connected before the start (earlier api versions), then checks every docker_ipaddrN is set.
+# Run from the docker-rm directory: python3 benchmarks/multi_network_benchmark.py
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine
+from controllers.transition.TransitionTimings import TransitionTimings
+from controllers.resource.DockerEndpoint import DockerEndpoints
+from async_engine_benchmark import BenchInstance
+from tests.fake_docker_api import FakeDockerAPI
+
+STARTS=200
+REQUEST_DELAY=0.002
+EXTRA_NETWORKS=[0, 1, 2, 4]
+
+def startFakeDocker(socketPath):
+	fake=FakeDockerAPI(0, requestDelay=REQUEST_DELAY)
+	ready=threading.Event()
+	def serve():
+		loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(fake.serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+	return fake
+
+def multiHomed(i, extra):
+	instance=BenchInstance(i)
+	for n in range(1, extra+1):
+		instance.properties['docker_network%d' % n]='backend%d' % n
+		instance.properties['docker_ipaddr%d' % n]=''
+	return instance
+
+async def startOneByOne(api, instance, extra):
+	# the start as it was: run on the first network, then connect and inspect for each other one
+	containerId=await api.createContainer(instance.type.imageName+str(instance.resourceId), {'HostConfig':{'NetworkMode':'bridge'}})
+	await api.startContainer(containerId)
+	details=await api.inspectContainer(containerId)
+	instance.properties['docker_ipaddr']=details['NetworkSettings']['Networks']['bridge']['IPAddress']
+	for n in range(1, extra+1):
+		await api.connectNetwork('backend%d' % n, containerId)
+		details=await api.inspectContainer(containerId)
+		instance.properties['docker_ipaddr%d' % n]=details['NetworkSettings']['Networks']['backend%d' % n]['IPAddress']
+
+def measure(engine, fake, extra, start):
+	requests=fake.requests
+	began=time.perf_counter()
+	instances=[multiHomed(i, extra) for i in range(STARTS)]
+	futures=[engine.submit(start(instance)) for instance in instances]
+	for f in futures:
+		f.result()
+	elapsed=time.perf_counter()-began
+	filled=all(all(instance.properties[key] for key in instance.properties if key.startswith('docker_ipaddr')) for instance in instances)
+	return (fake.requests-requests)/STARTS, elapsed*1e3/STARTS, filled
+
+def main():
+	logging.disable(logging.ERROR)
+	socketPath=os.path.join(tempfile.mkdtemp(), 'docker.sock')
+	fake=startFakeDocker(socketPath)
+	engines=[]
+	for apiVersion in ('1.44', '1.41'):
+		endpoints=DockerEndpoints([{'name':'dev', 'endpoints':[{'name':'dev-0', 'url':'unix://'+socketPath, 'apiVersion':apiVersion}]}])
+		engine=AsyncTransitionEngine(endpoints=endpoints)
+		engine.start()
+		engines.append(engine)
+	modern, older=engines
+	api=modern.apis['dev-0']
+	for n in range(1, max(EXTRA_NETWORKS)+1):
+		modern.submit(api.createNetwork({'Name':'backend%d' % n})).result()
+	# the image is in the endpoint's cache once types are loaded
+	for engine in engines:
+		engine.submit(engine.startContainer(multiHomed(STARTS, 0), TransitionTimings())).result()
+
+	print('%d container starts, %.0f ms per docker request' % (STARTS, REQUEST_DELAY*1e3))
+	print('%8s %28s %28s %28s' % ('extra', 'one by one (requests, ms)', 'at create (requests, ms)', 'before start (requests, ms)'))
+	allFilled=True
+	for extra in EXTRA_NETWORKS:
+		row=[]
+		for engine, start in [(modern, lambda instance: startOneByOne(api, instance, extra)),
+								(modern, lambda instance: modern.startContainer(instance, TransitionTimings())),
+								(older, lambda instance: older.startContainer(instance, TransitionTimings()))]:
+			requests, ms, filled=measure(engine, fake, extra, start)
+			allFilled=allFilled and filled
+			row.append('%18.1f %9.2f' % (requests, ms))
+		print('%8d %28s %28s %28s' % tuple([extra]+row))
+	print('every docker_ipaddrN filled: %s' % allFilled)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Replays thousands of installs and uninstalls of a location onto simulated docker hosts of
+# different sizes and speeds, with the install time of a host growing with the containers it
+# runs. Compares the round robin used before placement with the spread and binpack
+# strategies and hard anti-affinity: installs refused, hosts taken past their capacity,
+# how evenly cpu is reserved, the simulated install time, instances of the same name
+# sharing a host and the time each placement decision takes.
+# Run from the docker-rm directory: python3 benchmarks/placement_benchmark.py
+
+import itertools
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.resource.DockerEndpoint import DockerEndpoints
+from controllers.resource.Placement import PlacementEngine, NoPlacementException, getReservation
+
+INSTALLS=5000
+LIVE=90
+REPLICAS=3
+SEED=7
+
+# name, cpus, memory, containers and seconds an install takes on an idle host
+HOSTS=[('big-0', 64, '128g', 60, 1.0), ('big-1', 64, '128g', 60, 1.0), ('small-0', 32, '64g', 30, 1.5), ('slow-0', 32, '64g', 30, 4.0)]
+# seconds added to an install for every container already running on the host
+CONTAINER_SECONDS=0.02
+
+class SimType:
+	internal=False
+	def __init__(self, name, cpu, memory):
+		self.name='resource::'+name+'::1.0'
+		self.imageName='dockerrm_'+name
+		self.resourceDescriptor={'resources':{'cpu':cpu, 'memory':memory}}
+
+TYPES=[SimType('small', 0.25, '256m'), SimType('medium', 1, '2g'), SimType('large', 4, '8g')]
+
+class SimInstance:
+	def __init__(self, resourceId, name, resourceType):
+		self.resourceId=resourceId
+		self.name=name
+		self.location='sim'
+		self.type=resourceType
+		self.endpoint=None
+		self.placement=None
+
+class RoundRobin:
+	# the placement used before, the next endpoint of the location with the image
+	def __init__(self, endpoints):
+		self.endpoints=endpoints
+		self.turns=itertools.count()
+
+	def place(self, instance):
+		endpoints=self.endpoints.forLocation(instance.location)
+		endpoint=endpoints[next(self.turns)%len(endpoints)]
+		instance.endpoint=endpoint.name
+		return endpoint
+
+	def release(self, instance):
+		pass
+
+	def recordInstall(self, instance, seconds):
+		pass
+
+def simulatedHosts():
+	endpoints=DockerEndpoints([{'name':'sim', 'endpoints':[{'name':name, 'capacity':{'cpus':cpus, 'memory':memory, 'containers':containers}}
+																for name, cpus, memory, containers, seconds in HOSTS]}])
+	for endpoint in endpoints.all():
+		for resourceType in TYPES:
+			endpoint.images.put(resourceType.imageName, {'Id':'sha256:'+resourceType.imageName})
+	return endpoints
+
+def replay(placement):
+	random.seed(SEED)
+	hosts=dict((name, {'cpus':cpus, 'containers':containers, 'seconds':seconds, 'usedCpus':0.0, 'running':0})
+				for name, cpus, memory, containers, seconds in HOSTS)
+	live=[]
+	refused=0
+	overcommitted=set()
+	installSeconds=[]
+	decisionSeconds=0.0
+	for i in range(INSTALLS):
+		if len(live)>=LIVE:
+			# churn keeps the location about as full as it is
+			instance=live.pop(random.randrange(len(live)))
+			host=hosts[instance.endpoint]
+			host['usedCpus']=host['usedCpus']-getReservation(instance.type)[0]
+			host['running']=host['running']-1
+			placement.release(instance)
+
+		resourceType=random.choice(TYPES)
+		instance=SimInstance(i, 'svc%d' % (i//REPLICAS), resourceType)
+		start=time.perf_counter()
+		try:
+			placement.place(instance)
+		except NoPlacementException:
+			refused=refused+1
+			continue
+		finally:
+			decisionSeconds=decisionSeconds+time.perf_counter()-start
+		host=hosts[instance.endpoint]
+		seconds=host['seconds']+CONTAINER_SECONDS*host['running']
+		host['usedCpus']=host['usedCpus']+getReservation(resourceType)[0]
+		host['running']=host['running']+1
+		if host['usedCpus']>host['cpus'] or host['running']>host['containers']:
+			overcommitted.add(instance.endpoint)
+		installSeconds.append(seconds)
+		placement.recordInstall(instance, seconds)
+		live.append(instance)
+
+	shared=len(live)-len(set((i.name, i.endpoint) for i in live))
+	utilisation=[host['usedCpus']/host['cpus'] for host in hosts.values()]
+	return {
+		'refused':refused,
+		'overcommitted':len(overcommitted),
+		'cpuSpread':max(utilisation)-min(utilisation),
+		'installSeconds':statistics.mean(installSeconds),
+		'shared':shared,
+		'decisionMicros':decisionSeconds*1e6/INSTALLS,
+		'running':dict((name, host['running']) for name, host in hosts.items()),
+		'decision':live[-1].placement
+	}
+
+def main():
+	logging.disable(logging.ERROR)
+	print('%d installs of %d types, about %d live at once in replicas of %d, hosts %s' % (INSTALLS, len(TYPES), LIVE, REPLICAS, ', '.join(h[0] for h in HOSTS)))
+	print('%16s %8s %14s %11s %13s %8s %12s   %s' % ('placement', 'refused', 'overcommitted', 'cpu spread', 'install (s)', 'shared', 'decision us', 'running'))
+	decisions=[]
+	for name, placement in [('round robin', RoundRobin(simulatedHosts())),
+							('spread', PlacementEngine(simulatedHosts(), strategy='spread')),
+							('spread hard aa', PlacementEngine(simulatedHosts(), strategy='spread', antiAffinity='hard')),
+							('binpack', PlacementEngine(simulatedHosts(), strategy='binpack'))]:
+		result=replay(placement)
+		print('%16s %8d %14d %11.2f %13.2f %8d %12.1f   %s' % (name, result['refused'], result['overcommitted'], result['cpuSpread'],
+																result['installSeconds'], result['shared'], result['decisionMicros'], result['running']))
+		if result['decision']!=None:
+			decisions.append((name, result['decision']))
+	for name, decision in decisions:
+		print('last %s decision: %s' % (name, decision))
+
+if __name__ == '__main__':
+	main()
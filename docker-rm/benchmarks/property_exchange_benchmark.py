@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Lifecycle commands run against the fake Docker API with a fixed daemon latency per
+# request, comparing the properties sent with an echo exec and read back with a cat exec
+# (three execs of create, start and inspect per transition) against the engine sending
+# and reading them with the archive api around the single command exec. Then checks a
+# property value containing a quote, which the echo breaks on.
+# Run from the docker-rm directory: python3 benchmarks/property_exchange_benchmark.py
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine
+from controllers.resource.DockerEndpoint import DEFAULT_ENDPOINT
+from async_engine_benchmark import BenchInstance
+from tests.fake_docker_api import FakeDockerAPI
+
+TRANSITIONS=200
+REQUEST_DELAY=0.002
+EXEC_DELAY=0.01
+
+def startFakeDocker(socketPath):
+	fake=FakeDockerAPI(EXEC_DELAY, requestDelay=REQUEST_DELAY)
+	ready=threading.Event()
+	def serve():
+		loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(fake.serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+	return fake
+
+async def execExchange(api, instance, cmd):
+	# how properties were exchanged before the archive api
+	propString=yaml.dump(dict(instance.properties), default_flow_style=False, default_style='')
+	await api.execRun(instance.containerId, ['/bin/sh', '-c', "echo '"+propString+"' > /etc/rmparams"])
+	await api.execRun(instance.containerId, [cmd])
+	exitCode, output=await api.execRun(instance.containerId, ['cat', '/etc/rmparams'])
+	propYaml=yaml.safe_load(output.decode('utf-8', 'replace')) if output else None
+	if isinstance(propYaml, dict):
+		for p in list(instance.properties):
+			if p in propYaml:
+				instance.properties[p]=propYaml[p]
+
+async def archiveExchange(engine, instance, cmd):
+	await engine.runCommand(instance, cmd)
+
+def createInstances(engine, count, properties):
+	instances=[]
+	for i in range(count):
+		instance=BenchInstance(i)
+		instance.properties.update(properties)
+		instance.containerId=engine.submit(engine.apis[DEFAULT_ENDPOINT].createContainer(instance.name, {'HostConfig':{'NetworkMode':'bridge'}})).result()
+		instances.append(instance)
+	return instances
+
+def run(fake, instances, exchange):
+	# one transition at a time, so the time is the latency of each transition's round trips
+	requests=fake.requests
+	start=time.perf_counter()
+	for instance in instances:
+		exchange(instance).result()
+	elapsed=time.perf_counter()-start
+	return elapsed, (fake.requests-requests)/len(instances)
+
+def main():
+	logging.disable(logging.ERROR)
+	socketPath=os.path.join(tempfile.mkdtemp(), 'docker.sock')
+	fake=startFakeDocker(socketPath)
+	engine=AsyncTransitionEngine(socketPath=socketPath)
+	engine.start()
+	cmd='/lifecycle/configure.sh'
+
+	print('%d transitions, %.0f ms per docker request, %.0f ms per lifecycle command' % (TRANSITIONS, REQUEST_DELAY*1e3, EXEC_DELAY*1e3))
+	print('%10s %20s %12s %18s' % ('exchange', 'requests/transition', 'total (s)', 'per transition (ms)'))
+	instances=createInstances(engine, TRANSITIONS, {})
+	for name, exchange in [('exec', lambda i: engine.submit(execExchange(engine.apis[DEFAULT_ENDPOINT], i, cmd))),
+						   ('archive', lambda i: engine.submit(archiveExchange(engine, i, cmd)))]:
+		elapsed, requests=run(fake, instances, exchange)
+		print('%10s %20.1f %12.2f %18.2f' % (name, requests, elapsed, elapsed*1e3/TRANSITIONS))
+
+	quoted={'hostname':"it's quoted", 'motd':'say "hello"'}
+	for name, exchange in [('exec', lambda i: engine.submit(execExchange(engine.apis[DEFAULT_ENDPOINT], i, cmd))),
+						   ('archive', lambda i: engine.submit(archiveExchange(engine, i, cmd)))]:
+		instance=createInstances(engine, 1, quoted)[0]
+		exchange(instance).result()
+		files=fake.findContainer(instance.containerId)[1]['files']
+		written=yaml.safe_load(files['/etc/rmparams'].decode('utf-8')) if '/etc/rmparams' in files else None
+		print('%10s quoted values written to the container: %s' % (name, written!=None and all(written.get(k)==v for k, v in quoted.items())))
+
+if __name__ == '__main__':
+	main()
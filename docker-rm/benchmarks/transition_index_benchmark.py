@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# Lookup latency of the in memory transition index as the transitions table grows.
+# Run from the docker-rm directory: python3 benchmarks/transition_index_benchmark.py
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.util.TransitionIndex import TransitionIndex
+
+SIZES=[1000, 10000, 100000, 1000000]
+LOOKUPS=10000
+TRANSITIONS_PER_RESOURCE=5
+STATES=['IN_PROGRESS','COMPLETED','FAILED']
+
+def buildIndex(size):
+	index=TransitionIndex()
+	for eid in range(1, size+1):
+		index.add(eid, {
+			'requestId': eid,
+			'requestState': STATES[eid % len(STATES)],
+			'requestStateReason': '',
+			'resourceId': str(eid // TRANSITIONS_PER_RESOURCE),
+			'startedAt': '2018-01-01T00:00:00+00:00',
+			'finishedAt': '2018-01-01T00:00:01+00:00',
+			'transitionName': 'Start'
+		})
+	return index
+
+def timeLookups(lookup, keys):
+	start=time.perf_counter()
+	for k in keys:
+		lookup(k)
+	return (time.perf_counter()-start)/len(keys)*1e6
+
+def main():
+	print('%10s %18s %18s %18s' % ('rows', 'byRequestId (us)', 'byResourceId (us)', 'update (us)'))
+	for size in SIZES:
+		index=buildIndex(size)
+		requestIds=[random.randint(1, size) for _ in range(LOOKUPS)]
+		resourceIds=[random.randint(0, size // TRANSITIONS_PER_RESOURCE) for _ in range(LOOKUPS)]
+		byRequest=timeLookups(index.findByRequestId, requestIds)
+		byResource=timeLookups(index.findByResourceId, resourceIds)
+		update=timeLookups(lambda eid: index.update(eid, {'requestState': 'COMPLETED'}), requestIds)
+		print('%10d %18.2f %18.2f %18.2f' % (size, byRequest, byResource, update))
+
+if __name__ == '__main__':
+	main()
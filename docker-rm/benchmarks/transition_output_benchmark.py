@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Lifecycle script output. Compares logging every line of a chatty script at info, as
+# before, with keeping it in the transition's output and logging one summary line, both
+# to the file and console handlers of logging.yaml. Then runs installs on the async engine
+# against the fake Docker API: a script that exits non-zero fails the transition with its
+# stderr, a chatty script is tailed as server-sent events while it runs, and the output
+# of many chatty transitions stays within its bounds.
+# Run from the docker-rm directory: python3 benchmarks/transition_output_benchmark.py
+
+import asyncio
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine
+from controllers.transition.TransitionOutput import transitionOutputs, CommandFailedException
+from async_engine_benchmark import BenchInstance
+from tests.fake_docker_api import FakeDockerAPI
+
+LINES=20000
+LINE=b'unpacking component 42 of the install into /opt/app/lib, checking dependencies\n'
+EXEC_DELAY=0.5
+TRANSITIONS=1000
+
+class ScriptType:
+	name='resource::example::1.0'
+	imageName='dockerrm_example'
+	operationsPath=None
+	def __init__(self, script):
+		self.lifecyclePath={'lifecycle':{'install':script}}
+
+def fileLogger(directory):
+	# the handlers of logging.yaml, at info as the controllers logger is
+	formatter=logging.Formatter('%(asctime)s - %(thread)d - %(name)s - %(levelname)s - %(message)s')
+	logger=logging.getLogger('controllers.transition.TransitionOutput')
+	logger.handlers=[]
+	logger.propagate=False
+	logger.setLevel(logging.INFO)
+	for handler in [logging.handlers.RotatingFileHandler(os.path.join(directory, 'info.log'), maxBytes=10485760, backupCount=20),
+					logging.StreamHandler(open(os.devnull, 'w'))]:
+		handler.setFormatter(formatter)
+		logger.addHandler(handler)
+	return logger
+
+def logged(logger):
+	# every line of output logged as it arrives
+	start=time.perf_counter()
+	for i in range(LINES):
+		logger.info('*** >>>>>>'+str(LINE))
+	return time.perf_counter()-start
+
+def buffered(outputs):
+	start=time.perf_counter()
+	output=outputs.open(0)
+	for i in range(LINES):
+		output.write('stdout', LINE)
+	output.exited(0)
+	outputs.recordExit(output, '/lifecycle/install.sh', 'example0')
+	outputs.close(0)
+	return time.perf_counter()-start
+
+def startFakeDocker(socketPath):
+	ready=threading.Event()
+	def serve():
+		loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(FakeDockerAPI(EXEC_DELAY).serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+
+def install(engine, outputs, resourceId, script):
+	instance=BenchInstance(resourceId)
+	instance.type=ScriptType(script)
+	output=outputs.open(resourceId)
+	future=engine.submit(engine.runStandardTransition(instance, 'install', None, output=output))
+	return output, future
+
+def outcome(future):
+	try:
+		future.result()
+		return 'COMPLETED'
+	except CommandFailedException as ex:
+		return 'FAILED, '+ex.message
+
+def tail(output, started, events):
+	for event in output.events(0, True, lambda seconds: time.sleep(0.01)):
+		events.append((time.perf_counter()-started, event))
+
+def main():
+	directory=tempfile.mkdtemp()
+	logger=fileLogger(directory)
+	# the defaults of the output section of config.yaml
+	outputs=transitionOutputs
+
+	print('%d lines of lifecycle script output' % LINES)
+	print('%12s %12s %14s' % ('', 'us per line', 'log lines'))
+	for name, run in [('logged', lambda: logged(logger)), ('buffered', lambda: buffered(outputs))]:
+		before=sum(1 for line in open(os.path.join(directory, 'info.log')))
+		elapsed=run()
+		after=sum(1 for line in open(os.path.join(directory, 'info.log')))
+		print('%12s %12.2f %14d' % (name, elapsed*1e6/LINES, after-before))
+
+	logging.disable(logging.ERROR)
+	socketPath=os.path.join(tempfile.mkdtemp(), 'docker.sock')
+	startFakeDocker(socketPath)
+	engine=AsyncTransitionEngine(socketPath=socketPath)
+	engine.start()
+
+	output, future=install(engine, outputs, 1, '/lifecycle/install.sh')
+	print('install.sh exits 0: %s' % outcome(future))
+	outputs.close(1)
+	output, future=install(engine, outputs, 2, '/lifecycle/fail.sh')
+	print('fail.sh exits 1:    %s' % outcome(future))
+	outputs.close(2)
+	print('fail.sh output:     %s' % output.getSummary())
+
+	# a follower sees each line as the script writes it, not when it ends
+	started=time.perf_counter()
+	output, future=install(engine, outputs, 3, '/lifecycle/chatty.sh')
+	events=[]
+	follower=threading.Thread(target=tail, args=(output, started, events))
+	follower.start()
+	print('chatty.sh:          %s after %.0f ms' % (outcome(future), (time.perf_counter()-started)*1e3))
+	outputs.close(3)
+	follower.join()
+	lines=[seconds for seconds, event in events if event.startswith('id: ')]
+	print('tailed %d events, first after %.0f ms, last after %.0f ms, then %s' % (len(lines), lines[0]*1e3, lines[-1]*1e3, events[-1][1].split('\n')[0]))
+
+	# many chatty transitions keep no more than keep finished ones of at most maxBytes a stream
+	written=0
+	for i in range(TRANSITIONS):
+		output=outputs.open(100+i)
+		for j in range(200):
+			output.write('stdout', LINE*8)
+			written=written+len(LINE)*8
+		output.write('stderr', b'warning: retrying\n')
+		outputs.close(100+i)
+	metrics=outputs.getMetrics()
+	print('%d transitions wrote %.0f MB, the output of %d is kept in %.1f MB' % (TRANSITIONS, written/1e6, metrics['transitions'], metrics['bytes']/1e6))
+	print(metrics)
+
+if __name__ == '__main__':
+	main()
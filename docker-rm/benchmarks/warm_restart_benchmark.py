@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Time to load and compact the resource instance snapshot at startup.
+# Run from the docker-rm directory: python3 benchmarks/warm_restart_benchmark.py
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from controllers.util.InstanceSnapshot import InstanceSnapshot
+
+SIZES=[10000, 100000]
+# fraction of extra journal lines from instances updated or removed since the last compaction
+CHURN=0.5
+
+def record(resourceId):
+	return {
+		'resourceId': resourceId,
+		'resourceType': 'resource::example::1.0',
+		'resourceName': 'example-'+str(resourceId),
+		'deploymentLocation': 'dev',
+		'properties': {
+			'docker_network': 'bridge',
+			'docker_hostname': 'example-'+str(resourceId),
+			'docker_ipaddr': '172.17.0.'+str(resourceId % 250),
+			'docker_gateway': '172.17.0.1',
+			'ipaddr': '172.17.0.'+str(resourceId % 250),
+			'dummy': 'value',
+			'metricKey': 'a0b1c2d3-e4f5-4789-abcd-'+str(resourceId).zfill(12)
+		},
+		'createdAt': '2018-01-01T00:00:00+00:00',
+		'lastModifiedAt': '2018-01-01T00:00:01+00:00',
+		'containerId': str(resourceId).zfill(64),
+		'containerName': 'dockerrm_example'+str(resourceId),
+		'readonly': False
+	}
+
+def writeJournal(path, size):
+	with open(path, 'wt') as f:
+		for resourceId in range(size):
+			f.write(json.dumps(record(resourceId))+'\n')
+		# updates to live instances and short lived instances that were installed then uninstalled
+		for n in range(int(size*CHURN)):
+			if n % 2 == 0:
+				f.write(json.dumps(record(n))+'\n')
+			else:
+				f.write(json.dumps(record(size+n))+'\n')
+				f.write(json.dumps({'resourceId': size+n, 'removed': True})+'\n')
+
+def main():
+	print('%10s %12s %12s %14s %12s' % ('instances', 'lines', 'load (s)', 'compact (s)', 'live'))
+	for size in SIZES:
+		with tempfile.TemporaryDirectory() as tmp:
+			path=os.path.join(tmp, 'instances.jsonl')
+			writeJournal(path, size)
+			with open(path) as f:
+				lines=sum(1 for _ in f)
+			snapshot=InstanceSnapshot(path)
+			start=time.perf_counter()
+			records=snapshot.load()
+			loaded=time.perf_counter()
+			snapshot.compact(records)
+			compacted=time.perf_counter()
+			print('%10d %12d %12.3f %14.3f %12d' % (size, lines, loaded-start, compacted-loaded, len(records)))
+
+if __name__ == '__main__':
+	main()
@@ -1,4 +1,7 @@
+import base64
+import binascii
 import logging
+import time
 from pathlib import Path
 from controllers.resource import Resource
 from controllers.resource.DockerNetworkResourceInstance import DockerNetworkResourceInstance
@@ -7,6 +10,11 @@ import controllers.util.DB
 from controllers.transition.Transition import *
 from controllers.util.Config import *
 from controllers.transition.TransitionTasks import MissingPropertiesException
+from controllers.transition.TransitionScheduler import transitionScheduler
+from controllers.transition.AsyncTransitionEngine import transitionEngine
+from controllers.resource.DockerEndpoint import dockerEndpoints
+from controllers.resource.Placement import placementEngine
+from controllers.transition.TransitionGraph import TransitionGraph, resolveDependencies, InvalidDependencyException, DependencyRefusedException
 
 class ResourceManager:
 	# Main helper class for managing resource types, transitions and resource instances
@@ -24,28 +32,70 @@ class ResourceManager:
 
 		# load all internal types
 		self.readResourceDir('internal_csars',True)
-		# search for existing docker network instances and create resource instances
-		self.buildReferencedNetworkInstances()
 		# read user supplied resource type directory
 		if 'csardirs' in globalConfig.configDescriptor:
 			for dir in globalConfig.configDescriptor['csardirs']:
 				self.readResourceDir(dir)
+		self.loadImages()
+		# rebuild instances saved before the last restart
+		self.rehydrateInstances()
+		# search for existing docker network instances and create resource instances
+		self.buildReferencedNetworkInstances()
 
 	def buildReferencedNetworkInstances(self):
 		# load all existing docker networks as referenced external network instances
 
 		self.logger.debug('creating reference docker network resource instances')
 
-		if controllers.resource.ResourceInstance.dockerClient!=None:
-			self.logger.debug('found valid dockerClient - loading networks')
-			netType=self.getResourceType('resource::docker-network::1.0')
-			if netType!=None:
-				networks=controllers.resource.ResourceInstance.dockerClient.networks.list()
-				for n in networks:
-					self.logger.debug('creating resource instance for existing docker network '+n.name)
-					refNet=DockerNetworkResourceInstance(netType,n.name,network=n)
+		netType=self.getResourceType('resource::docker-network::1.0')
+		if netType==None:
+			self.logger.error('no reference network type found')
+			return
+		for location in globalConfig.locationDescriptor.get('locations') or []:
+			for endpoint in dockerEndpoints.forLocation(location['name']):
+				if endpoint.client==None:
+					continue
+				self.logger.debug('loading networks of docker endpoint '+endpoint.name+' in location '+location['name'])
+				for state in endpoint.state.listNetworks():
+					# networks restored from the snapshot keep their resource ids, and a network on
+					# several endpoints of the location is one instance
+					if controllers.resource.ResourceInstance.findInstancesByLocation(location['name'], state['name'], netType.name)!=None:
+						self.logger.debug('docker network '+state['name']+' already has a resource instance')
+						continue
+					self.logger.debug('creating resource instance for existing docker network '+state['name'])
+					n=endpoint.client.networks.prepare_model(state['attrs'])
+					refNet=DockerNetworkResourceInstance(netType,n.name,location['name'],network=n,endpoint=endpoint.name)
+					dbClient.saveInstance(refNet.getSnapshot())
+
+	def rehydrateInstances(self):
+		# rebuild the instance registry and id counters from the persistent db
+		if not dbClient.persistent:
+			return
+
+		start=time.monotonic()
+		records=dbClient.loadInstances()
+		restored=0
+		for record in records.values():
+			resourceType=self.getResourceType(record['resourceType'])
+			if resourceType==None:
+				self.logger.error('cannot restore instance '+str(record['resourceId'])+' of unknown type '+record['resourceType'])
+				continue
+			if resourceType.name=='resource::docker-network::1.0':
+				instance=DockerNetworkResourceInstance(resourceType, record['resourceName'], record['deploymentLocation'], record['properties'], resourceId=record['resourceId'])
 			else:
-				self.logger.error('no reference network type found')
+				instance=ResourceInstance(resourceType, record['resourceName'], record['deploymentLocation'], record['properties'], resourceId=record['resourceId'])
+			instance.restore(record)
+			if not resourceType.internal:
+				placementEngine.reserve(instance)
+			restored=restored+1
+
+		# ids referenced by stored transitions must never be handed out again
+		maxRequestId, maxResourceId=dbClient.findMaxIds()
+		controllers.resource.ResourceInstance.reserveResourceIds(maxResourceId)
+		controllers.transition.Transition.reserveTransitionIds(maxRequestId)
+		dbClient.failInterruptedTransitions()
+
+		self.logger.info('restored '+str(restored)+' resource instances in '+'{0:.3f}'.format(time.monotonic()-start)+' seconds')
 
 	def reloadResourceDir(self):
 		self.resources=[]
@@ -53,6 +103,7 @@ class ResourceManager:
 		if 'csardirs' in globalConfig.configDescriptor:
 			for dir in globalConfig.configDescriptor['csardirs']:
 				self.readResourceDir(dir)
+		self.loadImages()
 		return self.getResourceTypeList()
 	
 	def readResourceDir(self, dirname, internal=False):
@@ -72,7 +123,26 @@ class ResourceManager:
 			else:
 				self.logger.debug('ignoring file '+str(cpath))
 
-	def createNewResourceInstance(self, resourceType, name, location, params):
+	def loadImages(self):
+		# look up the image of every type once on every endpoint, installs of a type are only placed on
+		# endpoints that have its image and warm containers are kept for types with a pool
+		imageNames=[r.imageName for r in self.resources if not r.internal]
+		for endpoint in dockerEndpoints.all():
+			if endpoint.client==None:
+				continue
+			for imageName in endpoint.images.refresh(imageNames):
+				self.logger.error('no image found called '+imageName+' on docker endpoint '+endpoint.name+', installs of its type will not be placed there until it is built')
+			# types whose image is missing get no pool until they are reloaded
+			pooled=[r for r in self.resources if not r.internal and endpoint.images.peek(r.imageName)!=None]
+			if transitionEngine!=None and transitionEngine.handlesEndpoint(endpoint):
+				# the async engine creates the container of every install itself, pooled ones would never be claimed
+				named=[r.name for r in pooled if endpoint.pools.getPoolSize(r)>0]
+				if len(named)>0:
+					self.logger.warning('warm container pools are not used by the async engine, no containers are kept for '+', '.join(named)+' on docker endpoint '+endpoint.name)
+				pooled=[]
+			endpoint.pools.configure(pooled)
+
+	def createNewResourceInstance(self, resourceType, name, location, params, endpoint=None):
 		self.logger.debug(resourceType)
 		self.logger.debug('creating new resource instance of type '+resourceType.name+' in location '+location+' with name '+name)
 		self.logger.debug(params)
@@ -94,7 +164,8 @@ class ResourceManager:
 															resourceType,
 															name,
 															location,
-															params)
+															params,
+															endpoint=endpoint)
 			else:
 				# network exists so return that resourceInstance
 				self.logger.debug('returning existing network')
@@ -103,7 +174,8 @@ class ResourceManager:
 			resourceInstance=ResourceInstance(	resourceType,
 												name,
 												location,
-												params )
+												params,
+												endpoint=endpoint )
 
 		return resourceInstance
 
@@ -116,14 +188,53 @@ class ResourceManager:
 		except Exception:
 			return None
 	
-	def searchForInstances(self, location, typename):
+	def searchForInstances(self, location, typename, instanceName=None, relatedInstanceId=None, limit=None, continuationToken=None, fields=None):
+		"""
+			returns one page of instance details and the continuation token for the next page,
+			which is None on the last page
+		"""
 		self.logger.debug('searching for instances in '+location)
 		if typename!=None:
 			self.logger.debug('with typename '+typename)
-		
-		instances=findInstances(location,typename)
-			
-		return instances
+
+		if limit!=None and limit<1:
+			raise InvalidSearchException('limit must be at least 1')
+
+		after=None
+		if continuationToken!=None:
+			after=self.decodeContinuationToken(continuationToken)
+
+		if relatedInstanceId!=None:
+			try:
+				relatedInstanceId=int(relatedInstanceId)
+			except ValueError:
+				raise InvalidSearchException('invalid related instance id '+str(relatedInstanceId))
+
+		if fields!=None:
+			fields=[f.strip() for f in fields.split(',') if f.strip()!='']
+			unknown=[f for f in fields if f not in INSTANCE_DETAIL_FIELDS]
+			if len(unknown)>0:
+				raise InvalidSearchException('unknown instance fields '+', '.join(unknown))
+
+		instances, lastId=findInstances(location, typename, instanceName, relatedInstanceId, after, limit, fields)
+
+		nextToken=None
+		if lastId!=None:
+			nextToken=self.encodeContinuationToken(lastId)
+		return instances, nextToken
+
+	def encodeContinuationToken(self, resourceId):
+		# the token is opaque to callers, it only carries the last resourceId returned
+		return base64.urlsafe_b64encode(('after:'+str(resourceId)).encode('utf-8')).decode('ascii')
+
+	def decodeContinuationToken(self, continuationToken):
+		try:
+			value=base64.urlsafe_b64decode(continuationToken.encode('ascii')).decode('utf-8')
+			if not value.startswith('after:'):
+				raise ValueError(value)
+			return int(value[len('after:'):])
+		except (ValueError, UnicodeError, binascii.Error):
+			raise InvalidSearchException('invalid continuation token '+str(continuationToken))
 	
 	def rejectIfResourceBusy(self, transitionRequest):
 		self.logger.debug('Checking that resource is not currently processing a transition ' + str(transitionRequest))
@@ -150,10 +261,8 @@ class ResourceManager:
 		""" run transition on new or existing instance """
 		self.logger.debug('Resource Manager runTransition called with request\n\n '+str(transitionRequest)+'\n\n')
 		
-		# self.rejectIfResourceBusy(transitionRequest)
-			
-			
-		
+		# transitions on a busy resource are queued behind it by the scheduler rather than rejected
+
 		""" run the transition and parse input parameters"""
 		transition=Transition(transitionRequest)
 
@@ -165,6 +274,73 @@ class ResourceManager:
 			transition.delete()
 			raise ex
 
+	def runTransitions(self, transitionRequests):
+		""" 
+		run a batch of transitions, results are in request order and hold either
+		the transition response or the exception that stopped that transition.
+		A request can list the positions of requests in the same batch in dependsOn,
+		it only runs once all of them have completed.
+		"""
+		self.logger.debug('Resource Manager runTransitions called with '+str(len(transitionRequests))+' requests')
+		results=[None]*len(transitionRequests)
+
+		# validate every request before anything is stored
+		transitions={}
+		for index, transitionRequest in enumerate(transitionRequests):
+			try:
+				transitions[index]=Transition(transitionRequest, persist=False)
+			except Exception as ex:
+				self.logger.error(str(ex))
+				results[index]=ex
+
+		parents, errors=resolveDependencies(dict((index, transitionRequests[index].get('dependsOn')) for index in transitions), len(transitionRequests))
+		for index, ex in errors.items():
+			self.logger.error(ex.message)
+			results[index]=ex
+			transitions.pop(index).discard()
+
+		# transitions waiting on others record the request ids they wait on
+		for index, transition in transitions.items():
+			if len(parents[index])>0:
+				transition.dependsOn=[transitions[parent].requestId for parent in parents[index]]
+				transition.requestStateReason='Waiting for requests '+', '.join(str(requestId) for requestId in transition.dependsOn)
+
+		# store the valid ones in one write
+		try:
+			eids=dbClient.createNewTransitionRequests([transition.getTransitionRequestStatus() for index, transition in sorted(transitions.items())])
+		except Exception:
+			for transition in transitions.values():
+				transition.discard()
+			raise
+		for (index, transition), eid in zip(sorted(transitions.items()), eids):
+			transition.eid=eid
+			transition.register()
+
+		# the scheduler runs everything that is ready concurrently, the rest follow as their parents complete
+		for index, result in TransitionGraph(transitions, parents).start().items():
+			if isinstance(result, Exception):
+				transitions[index].delete()
+			results[index]=result
+		return results
+
+	def cancelTransition(self, id):
+		""" cancel a transition that has not finished, returns its status """
+		self.logger.debug('cancel transition for id '+id)
+		try:
+			requestId=int(id)
+		except ValueError:
+			# no transition has a request id that is not a number
+			return {'error':'no transition found'}
+		transition=findLiveTransition(requestId)
+		if transition==None or not transition.cancel():
+			transitionRequest=dbClient.findTransitionByRequestID(requestId)
+			if transitionRequest==None:
+				return {'error':'no transition found'}
+			raise TransitionFinishedException(transitionRequest['requestState'])
+
+		# a running transition is FAILED once its command has been killed
+		return self.getTransitionStatus(id)
+
 	def getTransitionRequest(self,id):
 		self.logger.debug('get transition request for id '+id)
 		# find id for transition in database
@@ -174,7 +350,7 @@ class ResourceManager:
 		if transitionRequest==None:
 			return {'error':'no transition found'}
 
-		return transitionRequest
+		return self.addQueuePosition(transitionRequest)
 
 	def getTransitionStatus(self, id):
 		self.logger.debug('get transition status for id '+id)
@@ -188,6 +364,14 @@ class ResourceManager:
 
 		# return Transition Status
 		self.logger.debug('need to update this to return status not actual db object')
+		return self.addQueuePosition(transitionRequest)
+
+	def addQueuePosition(self, transitionRequest):
+		# pending transitions report how many transitions on their resource are ahead of them
+		if transitionRequest['requestState']=='PENDING':
+			queuePosition=transitionScheduler.queuePosition(int(transitionRequest['requestId']))
+			if queuePosition!=None:
+				transitionRequest['queuePosition']=queuePosition
 		return transitionRequest
 
 
@@ -258,6 +442,24 @@ class ResourceBusyException (Exception):
 	def __init__(self, message):
 		self.message=message
 
+# instance search parameters cannot be used
+class InvalidSearchException (Exception):
+	def __init__(self, message):
+		self.message=message
+
+# a transition cannot be cancelled once it has finished
+class TransitionFinishedException (Exception):
+	def __init__(self, requestState):
+		self.requestState=requestState
+		self.message='Transition has already finished with state '+str(requestState)
+
+# the image a type installs from is not available to docker
+class ImageNotAvailableException (Exception):
+	def __init__(self, type, imageName):
+		self.type=type
+		self.imageName=imageName
+		self.message='no image found called '+imageName+' for type '+type
+
 """ -------------------------------=
     global resource manager variable 
 	================================
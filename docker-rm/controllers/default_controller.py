@@ -1,11 +1,18 @@
 import logging
 import json
+from flask import request, Response
+from gevent import sleep
 from controllers.ResourceManager import *
 from controllers.resource.Resource import Resource
 from controllers.util.Config import *
 from controllers.util.Trace import *
 from controllers.resource.ResourceInstance import InstanceNotFoundException
 from controllers.util.DB import DBException
+from controllers.resource.Placement import NoPlacementException
+from controllers.transition.TransitionScheduler import TransitionQueueFullException
+from controllers.transition.TransitionGraph import InvalidDependencyException, DependencyRefusedException
+from controllers.util.Metrics import metrics
+from controllers.transition.TransitionOutput import transitionOutputs
 
 logger = logging.getLogger(__name__)
 
@@ -37,38 +44,81 @@ def create_transition_using_post(transitionRequest) -> str:
 		traceMessage("POST Transition",transitionRequest,resp)
 		return resp,202
 		
-	except TypeNotFoundException as ex:
+	except Exception as ex:
+		return getTransitionErrorResponse(ex, endpoint)
+
+
+def create_transitions_using_post(transitionRequests) -> str:
+	# request a batch of transitions, each one is accepted or refused on its own
+	logger.info("New batch of "+str(len(transitionRequests))+" transition requests")
+	endpoint = '/api/resource-manager/lifecycle/transitions/batch'
+	try:
+		results=resourceManager.runTransitions(transitionRequests)
+	except Exception as ex:
+		return getTransitionErrorResponse(ex, endpoint)
+
+	resp=[]
+	for result in results:
+		if isinstance(result, Exception):
+			error=getTransitionErrorResponse(result, endpoint)
+			resp.append({'status':error[1], 'error':error[0]})
+		else:
+			item=dict(result)
+			item['status']=202
+			resp.append(item)
+
+	traceMessage("POST Transition Batch",transitionRequests,resp)
+	return resp,202
+
+
+def getTransitionErrorResponse(ex, endpoint):
+	# error body and status for an exception raised while accepting a transition
+	if isinstance(ex, TypeNotFoundException):
 		return getFormattedErrorMessage('type not found '+ex.type, endpoint), 400
 	
-	except NoLocationInRequestException as ex:
+	if isinstance(ex, NoLocationInRequestException):
 		return getFormattedErrorMessage('no location included in the request', endpoint), 400
 	
-	except UnknownLocationInRequestException as ex:
+	if isinstance(ex, UnknownLocationInRequestException):
 		return getFormattedErrorMessage('Unknown location "' + ex.unknownLocation + '" in request', endpoint), 404
 	
-	except TypeMissingFromRequestException:
+	if isinstance(ex, TypeMissingFromRequestException):
 		return getFormattedErrorMessage('type parameter required but not found', endpoint), 400
 		
-	except InstanceNotFoundException as ex:
+	if isinstance(ex, InstanceNotFoundException):
 		return getFormattedErrorMessage('Resource instance '+ str(ex.id) + ' not found', endpoint ), 404
 	
-	except InvalidTransitionException as ex:
+	if isinstance(ex, InvalidTransitionException):
 		return getFormattedErrorMessage('Invalid transition '+ str(ex.transition), endpoint ), 400
 	
-	except MissingPropertiesException as ex:
+	if isinstance(ex, ImageNotAvailableException):
+		return getFormattedErrorMessage(str(ex.message), endpoint), 400
+	
+	if isinstance(ex, NoPlacementException):
+		return getFormattedErrorMessage(str(ex.message), endpoint), 400
+	
+	if isinstance(ex, MissingPropertiesException):
 		return getFormattedErrorMessage('Missing mandatory property: ' + str(ex.missingProperty), endpoint), 400
 	
-	except ResourceBusyException as ex:
+	if isinstance(ex, ResourceBusyException):
+		return getFormattedErrorMessage(str(ex.message), endpoint), 400
+	
+	if isinstance(ex, InvalidDependencyException):
 		return getFormattedErrorMessage(str(ex.message), endpoint), 400
 	
-	except DBException as ex:
+	if isinstance(ex, DependencyRefusedException):
+		return getFormattedErrorMessage(str(ex.message), endpoint), 424
+	
+	if isinstance(ex, TransitionQueueFullException):
+		return getFormattedErrorMessage(str(ex.message), endpoint), 503, {'Retry-After': str(ex.retryAfter)}
+
+	if isinstance(ex, DBException):
 		return getFormattedErrorMessage(str(ex.message), endpoint), 500
 	
-	except Exception as ex:
-		template = 'An exception of type {0} occurred. Arguments:{1!r}'
-		message = template.format(type(ex).__name__, ex.args)
-		logger.error(message)
-		return getFormattedErrorMessage(message, endpoint), 500
+	template = 'An exception of type {0} occurred. Arguments:{1!r}'
+	message = template.format(type(ex).__name__, ex.args)
+	logger.error(message)
+	return getFormattedErrorMessage(message, endpoint), 500
 		
 		
 def get_transition_status_using_get(id) -> str:
@@ -87,6 +137,20 @@ def get_transition_status_using_get(id) -> str:
 		responseCode = 404
 	return resp, responseCode
 
+def delete_transition_using_delete(id) -> str:
+	# cancel a transition that has not finished, killing its command if it is running
+	logger.info('cancel transition for id '+id)
+	endpoint = '/api/resource-manager/lifecycle/transitions/'+id
+	try:
+		resp=resourceManager.cancelTransition(id)
+	except TransitionFinishedException as ex:
+		return getFormattedErrorMessage(str(ex.message), endpoint), 409
+
+	traceMessage("DELETE Transition",id, resp)
+	if 'error' in resp:
+		return resp, 404
+	return resp, 202
+
 def get_transition_using_get(id) -> str:
 	# get a transition request status by its request ID
 	logger.debug('get transition request for id '+id)
@@ -104,6 +168,23 @@ def get_transition_using_get(id) -> str:
 	return resp, responseCode
 	
 
+def get_transition_output_using_get(id, follow = True, after = None) -> str:
+	""" stream the stdout and stderr of a transition's commands as server-sent events """
+	logger.debug('get transition output for id '+id)
+	endpoint = '/api/resource-manager/lifecycle/transitions/'+id+'/output'
+	output=transitionOutputs.get(int(id)) if id.isdigit() else None
+	if output==None:
+		return getFormattedErrorMessage('no output kept for transition '+id, endpoint), 404
+
+	# an event source that reconnects carries on after the last event it received
+	lastEventId=request.headers.get('Last-Event-ID', '')
+	if lastEventId.isdigit():
+		after=int(lastEventId)
+
+	# followers wait with the server's greenlet sleep so they do not hold up other requests
+	events=output.events(after or 0, follow, sleep)
+	return Response(events, mimetype='text/event-stream', headers={'Cache-Control':'no-cache', 'X-Accel-Buffering':'no'})
+
 def get_deployment_location_using_get(name) -> str:
 	# get specific deployment location and return details
 	logger.debug('get deployment location for '+name)
@@ -157,17 +238,23 @@ def get_instance_using_get(id) -> str:
 	traceMessage("GET instance by id",id, resp)
 	return resp
 
-def get_instances_using_get(name, instanceType = None, relatedInstanceId = None, instanceName = None) -> str:
-	""" search for running instances """
+def get_instances_using_get(name, instanceType = None, relatedInstanceId = None, instanceName = None, limit = None, continuationToken = None, fields = None) -> str:
+	""" search for running instances, a page at a time when a limit is given """
 	logger.debug('search for instances')
+	endpoint = '/api/resource-manager/topology/deployment-locations/' + str(name) + '/instances'
 
 	# check that the location name is valid
 	for i in globalConfig.locationDescriptor['locations']:
 		if i['name']==name:
-			#filter by location, type, and related instance id
-			resp=resourceManager.searchForInstances(name, instanceType)
-			
+			#filter by location, type, instance name and related instance id
+			try:
+				resp, nextToken=resourceManager.searchForInstances(name, instanceType, instanceName, relatedInstanceId, limit, continuationToken, fields)
+			except InvalidSearchException as ex:
+				return getFormattedErrorMessage(str(ex.message), endpoint), 400
+
 			traceMessage("GET instance",name, resp)
+			if nextToken!=None:
+				return resp,200,{'X-Continuation-Token':nextToken}
 			return resp,200
 	traceMessage("GET instance by name",name, {'error':'no location found'})
 	return getFormattedErrorMessage('no location found', endpoint), 404
@@ -205,3 +292,12 @@ def reload_resource_descriptors_using_put() -> str:
 	resourceTypes = resourceManager.reloadResourceDir()
 	
 	return resourceTypes, 200
+
+def get_metrics_using_get() -> str:
+	""" return internal counters of the resource manager """
+	logger.debug('get metrics')
+
+	resp=metrics.collect()
+
+	traceMessage("GET metrics","None", resp)
+	return resp, 200
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+# label on every pooled container, holding the resource type it was created for
+POOL_LABEL='com.ibm.rm.pool'
+
+# network pooled containers are started on, a claim moves them to the instance's network
+POOL_NETWORK='bridge'
+
+def poolPrefix(resourceType):
+	# names of unclaimed containers, a claim renames them after the instance
+	return resourceType.imageName+'_pool_'
+
+class ContainerPool:
+	""" started containers of one resource type waiting to be claimed by an install """
+	def __init__(self, resourceType, size):
+		self.resourceType=resourceType
+		self.size=size
+		self.containers=deque()
+		self.hits=0
+		self.misses=0
+		self.created=0
+		self.failed=0
+		self.claimSeconds=0.0
+		self.maxClaimSeconds=0.0
+
+	def getMetrics(self):
+		claimed=self.hits
+		return {
+			'target':self.size,
+			'ready':len(self.containers),
+			'hits':self.hits,
+			'misses':self.misses,
+			'created':self.created,
+			'failed':self.failed,
+			'averageClaimSeconds':self.claimSeconds/claimed if claimed>0 else 0.0,
+			'maxClaimSeconds':self.maxClaimSeconds
+		}
+
+class ContainerPools:
+	"""
+		Warm containers per resource type
+		---------------------------------
+		Types with a pool size, from pool size in their resource descriptor or
+		pool size in the config, keep that many containers created and started
+		ahead of time. An install claims one instead of creating its container,
+		prepare makes it the instance's container, and a background thread
+		creates a replacement. backend makes the calls to docker: it creates a
+		pooled container, removes one and lists the unclaimed containers left
+		by an earlier run so they are used again.
+	"""
+	def __init__(self, backend=None, size=0, refillInterval=30.0):
+		self.logger = logging.getLogger(__name__)
+		self.backend=backend
+		# pool size of types that do not set their own
+		self.size=size
+		self.refillInterval=refillInterval
+		self.lock=threading.Lock()
+		self.pools={}
+		self.wanted=threading.Event()
+		self.refiller=None
+
+	def getPoolSize(self, resourceType):
+		pool=(resourceType.resourceDescriptor or {}).get('pool') or {}
+		return pool.get('size', self.size) or 0
+
+	def configure(self, resourceTypes):
+		""" set up the pools of the loaded resource types, dropping the containers of types no longer pooled """
+		pools={}
+		for resourceType in resourceTypes:
+			size=self.getPoolSize(resourceType)
+			if size>0:
+				pools[resourceType.name]=ContainerPool(resourceType, size)
+		with self.lock:
+			previous=self.pools
+		for name, pool in pools.items():
+			if name in previous:
+				pool.containers=previous[name].containers
+			else:
+				pool.containers=deque(self.adopt(pool.resourceType))
+		with self.lock:
+			self.pools=pools
+		for name, pool in previous.items():
+			if name not in pools:
+				self.drain(pool.containers)
+		for pool in pools.values():
+			# a smaller pool gives up the containers it no longer needs
+			extra=deque()
+			while len(pool.containers)>pool.size:
+				extra.append(pool.containers.pop())
+			self.drain(extra)
+		if len(pools)>0 and self.refiller==None:
+			self.refiller=threading.Thread(target=self.run, name='container-pool', daemon=True)
+			self.refiller.start()
+		self.wanted.set()
+
+	def adopt(self, resourceType):
+		# unclaimed containers left by an earlier run
+		try:
+			containers=self.backend.listPooled(resourceType)
+		except Exception as ex:
+			self.logger.error('could not list pooled containers of '+resourceType.name+' '+str(type(ex).__name__)+' '+str(ex))
+			return []
+		if len(containers)>0:
+			self.logger.info('reusing '+str(len(containers))+' pooled containers of '+resourceType.name)
+		return containers
+
+	def drain(self, containers):
+		while len(containers)>0:
+			containerId=containers.popleft()
+			try:
+				self.backend.remove(containerId)
+			except Exception as ex:
+				self.logger.error('could not remove pooled container '+containerId+' '+str(type(ex).__name__)+' '+str(ex))
+
+	def claim(self, resourceType, prepare):
+		"""
+		hand a pooled container of the type to prepare, which makes it the instance's
+		container, returns False when there is none ready or it could not be prepared
+		"""
+		with self.lock:
+			pool=self.pools.get(resourceType.name)
+			if pool==None:
+				return False
+			if len(pool.containers)==0:
+				pool.misses=pool.misses+1
+				self.wanted.set()
+				return False
+			containerId=pool.containers.popleft()
+		self.wanted.set()
+
+		start=time.monotonic()
+		try:
+			prepare(containerId)
+		except Exception as ex:
+			self.logger.error('could not claim pooled container '+containerId+' '+str(type(ex).__name__)+' '+str(ex))
+			self.drain(deque([containerId]))
+			with self.lock:
+				pool.misses=pool.misses+1
+			return False
+		seconds=time.monotonic()-start
+		with self.lock:
+			pool.hits=pool.hits+1
+			pool.claimSeconds=pool.claimSeconds+seconds
+			pool.maxClaimSeconds=max(pool.maxClaimSeconds, seconds)
+		return True
+
+	def refill(self):
+		""" create containers until every pool is full, returns False if one could not be created """
+		with self.lock:
+			pools=list(self.pools.values())
+		for pool in pools:
+			while len(pool.containers)<pool.size:
+				with self.lock:
+					if self.pools.get(pool.resourceType.name) is not pool:
+						break
+				try:
+					containerId=self.backend.create(pool.resourceType, poolPrefix(pool.resourceType)+uuid.uuid4().hex[:12])
+				except Exception as ex:
+					self.logger.error('could not create pooled container of '+pool.resourceType.name+' '+str(type(ex).__name__)+' '+str(ex))
+					with self.lock:
+						pool.failed=pool.failed+1
+					return False
+				with self.lock:
+					pool.containers.append(containerId)
+					pool.created=pool.created+1
+		return True
+
+	def run(self):
+		while True:
+			self.wanted.wait(self.refillInterval)
+			self.wanted.clear()
+			self.refill()
+
+	def getMetrics(self):
+		with self.lock:
+			return dict((name, pool.getMetrics()) for name, pool in self.pools.items())
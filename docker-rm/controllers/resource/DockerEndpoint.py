@@ -0,0 +1,107 @@
+import logging
+from controllers.util.Config import *
+from controllers.util.Metrics import metrics
+from controllers.resource.ImageCache import ImageCache
+from controllers.resource.DockerStateCache import DockerStateCache
+from controllers.resource.ContainerPool import ContainerPools
+
+# endpoint of locations that list none, the docker daemon given by the docker environment
+DEFAULT_ENDPOINT='default'
+
+stateConfig=globalConfig.configDescriptor.get('dockerState') or {}
+engineConfig=globalConfig.configDescriptor.get('engine') or {}
+poolConfig=globalConfig.configDescriptor.get('pool') or {}
+
+class DockerEndpoint:
+	"""
+		One docker daemon instances run on
+		----------------------------------
+		url is a unix:// or tcp:// docker host, None for the docker environment.
+		Each endpoint has its own client, set by ResourceInstance when it
+		connects, and its own image cache, container and network state and
+		warm container pools, as each daemon has its own images and containers.
+		capacity holds the cpus, memory and containers placement may reserve on
+		it, each unlimited when not set. apiVersion is the Docker Engine API
+		version to request, auto for the daemon's own, the client default when
+		not set.
+	"""
+	def __init__(self, name, url=None, tls=None, capacity=None, apiVersion=None):
+		self.name=name
+		self.url=url
+		# ca, cert and key file paths for a tcp endpoint
+		self.tls=tls
+		self.capacity=capacity or {}
+		self.apiVersion=apiVersion
+		self.locations=[]
+		self.client=None
+		self.images=ImageCache()
+		self.state=DockerStateCache(waitTimeout=stateConfig.get('waitTimeout', 2.0))
+		self.pools=ContainerPools(size=poolConfig.get('size', 0), refillInterval=poolConfig.get('refillInterval', 30.0))
+
+	def getSocketPath(self):
+		# unix socket of the daemon, None for a tcp endpoint or the docker environment
+		if self.url!=None and self.url.startswith('unix://'):
+			return self.url[len('unix://'):]
+		return None
+
+	def getMetrics(self):
+		return {
+			'locations':list(self.locations),
+			'capacity':dict(self.capacity),
+			'images':self.images.getMetrics(),
+			'state':self.state.getMetrics(),
+			'pools':self.pools.getMetrics()
+		}
+
+class DockerEndpoints:
+	"""
+		Docker endpoints of each deployment location
+		--------------------------------------------
+		Read from the endpoints list of each location in locations.yaml. A
+		location without one uses the default endpoint. Every instance
+		remembers the endpoint it was placed on.
+	"""
+	def __init__(self, locations):
+		self.logger = logging.getLogger(__name__)
+		self.endpoints={}
+		self.byLocation={}
+		for location in locations:
+			endpoints=[]
+			for config in location.get('endpoints') or []:
+				if config['name'] in self.endpoints:
+					raise ValueError('docker endpoint '+config['name']+' is listed more than once in locations.yaml')
+				endpoints.append(DockerEndpoint(config['name'], config.get('url'), config.get('tls'), config.get('capacity'), config.get('apiVersion')))
+			if len(endpoints)==0:
+				endpoints.append(self.endpoints.get(DEFAULT_ENDPOINT) or DockerEndpoint(DEFAULT_ENDPOINT, apiVersion=engineConfig.get('apiVersion')))
+			for endpoint in endpoints:
+				endpoint.locations.append(location['name'])
+				self.endpoints[endpoint.name]=endpoint
+			self.byLocation[location['name']]=endpoints
+		if len(self.endpoints)==0:
+			self.endpoints[DEFAULT_ENDPOINT]=DockerEndpoint(DEFAULT_ENDPOINT, apiVersion=engineConfig.get('apiVersion'))
+
+	def all(self):
+		return list(self.endpoints.values())
+
+	def get(self, name):
+		return self.endpoints.get(name)
+
+	def forLocation(self, location):
+		return self.byLocation.get(location) or []
+
+	def forInstance(self, instance):
+		""" the endpoint an instance runs on, instances saved before endpoints were recorded use the first of their location """
+		endpoint=self.endpoints.get(getattr(instance, 'endpoint', None))
+		if endpoint!=None:
+			return endpoint
+		endpoints=self.forLocation(getattr(instance, 'location', None))
+		if len(endpoints)>0:
+			return endpoints[0]
+		return self.endpoints.get(DEFAULT_ENDPOINT) or self.all()[0]
+
+	def getMetrics(self):
+		return dict((name, endpoint.getMetrics()) for name, endpoint in self.endpoints.items())
+
+# endpoints shared by every resource instance, ResourceInstance connects their clients
+dockerEndpoints=DockerEndpoints(globalConfig.locationDescriptor.get('locations') or [])
+metrics.register('dockerEndpoints', dockerEndpoints.getMetrics)
@@ -5,9 +5,12 @@ import docker
 
 class DockerNetworkResourceInstance(ResourceInstance):
 	""" Reponsible for running docker-network resource instance lifecycles"""
-	
-	def __init__(self,networkType,name,location='',properties={},network=None):
-		self.logger = logging.getLogger(__name__)
+
+	__slots__=('network',)
+
+	logger=logging.getLogger(__name__)
+
+	def __init__(self,networkType,name,location='',properties={},network=None,resourceId=None,endpoint=None):
 		self.logger.debug('creating new docker network resource instance '+name)
 
 		self.network=network
@@ -17,17 +20,17 @@ class DockerNetworkResourceInstance(ResourceInstance):
 			self.logger.debug(network.attrs)
 
 			# call parent with type and default properties
-			super().__init__(networkType, network.name,globalConfig.locationDescriptor['locations'][0]['name'],properties)
+			super().__init__(networkType, network.name,location,properties,resourceId,endpoint)
 
 			# means this network is managed outside RM
 			self.readonly=True
 
-			self.properties={
+			self.properties=PropertyMap.fromDict({
 				'networkname': network.name,
 				'subnet':'',
 				'gateway':'',
 				'networkid':network.attrs['Id']
-			}
+			})
 
 			config=network.attrs['IPAM']['Config']
 			if len(config) > 0:
@@ -47,7 +50,7 @@ class DockerNetworkResourceInstance(ResourceInstance):
 			self.readonly=False
 
 			# call parent with type and default properties
-			super().__init__(networkType, name,globalConfig.locationDescriptor['locations'][0]['name'],properties)
+			super().__init__(networkType, name,location,properties,resourceId,endpoint)
 
 
 	def createNetwork(self):
@@ -66,35 +69,80 @@ class DockerNetworkResourceInstance(ResourceInstance):
 			"com.docker.network.bridge.name":self.properties['bridgename']
 		}
 
-		self.logger.debug('about to call create network')
-		self.logger.debug(controllers.resource.ResourceInstance.dockerClient)
-		self.network=controllers.resource.ResourceInstance.dockerClient.networks.create(self.properties['networkname'],
-																					driver="bridge",
-																					options=dockerOptions,
-																					ipam=ipam_config)
-		self.logger.debug('created network '+str(self.network))
-		
+		# containers of the location may run on any of its endpoints, each gets the network
+		created=[]
+		try:
+			for endpoint in self.getEndpoints():
+				self.logger.debug('about to call create network on docker endpoint '+endpoint.name)
+				network=endpoint.client.networks.create(self.properties['networkname'],
+														driver="bridge",
+														options=dockerOptions,
+														ipam=ipam_config)
+				self.logger.debug('created network '+str(network))
+				created.append((endpoint, network))
+		except Exception:
+			# a network left on some endpoints would block installing it again
+			self.removeCreated(created)
+			raise
+
+		# the id reported is the one on the first endpoint
+		self.network=created[0][1]
+		self.endpoint=created[0][0].name
 		self.properties['networkid']=self.network.id
 		self.logger.debug(self.network.attrs)
 
+	def removeCreated(self, created):
+		for endpoint, network in created:
+			self.logger.debug('removing network '+self.properties['networkname']+' from docker endpoint '+endpoint.name)
+			try:
+				network.remove()
+			except docker.errors.APIError as ex:
+				self.logger.error('could not remove network '+self.properties['networkname']+' from docker endpoint '+endpoint.name+': '+str(ex))
+
+	def getEndpoints(self):
+		# the endpoint the network was first created on, then the others of its location
+		first=self.getEndpoint()
+		return [first]+[e for e in dockerEndpoints.forLocation(self.location) if e is not first]
+
 
 	def getID(self):
 		self.logger.debug('getting network instance id')
+		if self.network==None:
+			return self.properties.get('networkid')
 		return self.network.id
 
 	def removeNetwork(self):
-		self.logger.debug('destroying network '+self.network.name)
-		self.network.remove()
+		removed=0
+		failed=None
+		for endpoint in self.getEndpoints():
+			# the id is only known on the first endpoint, the others have a network of the same name
+			state=endpoint.state.findNetwork(self.properties['networkid']) or endpoint.state.findNetwork(self.properties['networkname'])
+			if state==None:
+				continue
+			self.logger.debug('destroying network '+state['name']+' on docker endpoint '+endpoint.name)
+			try:
+				endpoint.client.networks.prepare_model(state['attrs']).remove()
+				removed=removed+1
+			except docker.errors.APIError as ex:
+				# the other endpoints are still tried, so a retry only has the failed ones left to remove
+				self.logger.error('cannot remove network '+state['name']+' on docker endpoint '+endpoint.name+': '+str(ex))
+				failed=failed or ex
+		if failed!=None:
+			raise failed
+		if removed==0:
+			raise docker.errors.NotFound('No such network: '+str(self.properties['networkid']))
 			
 	# replace standard transition with create network instead of create container
-	def runStandardTransition(self, transitionName, properties):
+	def runStandardTransition(self, transitionName, properties, deadline=None, timings=None, output=None):
 		self.logger.debug('running standard transition for docker network')
+		timings=timings or TransitionTimings()
 
 		if transitionName=='uninstall':
 			if self.readonly==False:
 				self.logger.debug('killing docker-network')
 				try:
-					self.removeNetwork()
+					with timings.phase('networkRemove'):
+						self.removeNetwork()
 
 					#remove resource instance from the list
 					removeResourceInstance(self.resourceId)
@@ -110,11 +158,12 @@ class DockerNetworkResourceInstance(ResourceInstance):
 
 		if transitionName=='install':
 			self.logger.debug('creating network for install transition')
-			self.createNetwork()
+			with timings.phase('networkCreate'):
+				self.createNetwork()
 			return {'status':'OK'}
 
 
 	# no operations on a network
-	def runOperation(self, transitionName,properties):
+	def runOperation(self, transitionName,properties,deadline=None,timings=None,output=None):
 		self.logger.error('should not try to run operations on a docker-network')
 
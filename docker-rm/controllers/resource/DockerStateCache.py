@@ -0,0 +1,261 @@
+import logging
+import threading
+import time
+
+# container events that change its state, name or networks, exec and archive events do not
+CONTAINER_EVENTS=('create', 'start', 'restart', 'die', 'stop', 'pause', 'unpause', 'rename', 'update', 'oom')
+
+# seconds to wait before resubscribing to docker events after the stream ends
+RESUBSCRIBE_DELAY=5.0
+
+def containerEntry(attrs):
+	# attrs from the container list or from an inspect, which name their fields differently
+	name=attrs.get('Name') or (attrs.get('Names') or [''])[0]
+	state=attrs.get('State')
+	if isinstance(state, dict):
+		state=state.get('Status')
+	labels=attrs.get('Labels')
+	if labels==None:
+		labels=(attrs.get('Config') or {}).get('Labels')
+	networks={}
+	for networkName, endpoint in ((attrs.get('NetworkSettings') or {}).get('Networks') or {}).items():
+		networks[networkName]={'id':endpoint.get('NetworkID'), 'ipaddr':endpoint.get('IPAddress')}
+	return {'id':attrs['Id'], 'name':name.lstrip('/'), 'state':state, 'labels':labels or {}, 'networks':networks}
+
+def networkEntry(attrs):
+	return {'id':attrs['Id'], 'name':attrs['Name'], 'labels':attrs.get('Labels') or {}, 'attrs':attrs}
+
+class DockerStateCache:
+	"""
+		Containers and networks as docker last reported them
+		----------------------------------------------------
+		Kept up to date from the docker events stream in a background thread,
+		so transitions read container state, addresses per network and labels
+		without asking the daemon. source makes the calls to docker: it lists
+		and inspects containers and networks, inspects return None when there
+		is nothing to inspect, and events opens a new container and network
+		event stream. Each time the stream opens the cache is rebuilt from the
+		lists. While the stream is down every read goes to docker.
+	"""
+	def __init__(self, source=None, waitTimeout=2.0):
+		self.logger = logging.getLogger(__name__)
+		self.source=source
+		# seconds to wait for an event before inspecting the container instead
+		self.waitTimeout=waitTimeout
+		self.changed=threading.Condition()
+		self.containers={}
+		self.containerNames={}
+		self.networks={}
+		self.live=False
+		self.hits=0
+		self.misses=0
+		self.events=0
+		self.resyncs=0
+		self.watcher=None
+
+	# containers
+
+	def storeContainer(self, entry):
+		with self.changed:
+			previous=self.containers.get(entry['id'])
+			if previous!=None and self.containerNames.get(previous['name'])==entry['id']:
+				del self.containerNames[previous['name']]
+			self.containers[entry['id']]=entry
+			self.containerNames[entry['name']]=entry['id']
+			self.changed.notify_all()
+		return entry
+
+	def dropContainer(self, containerId):
+		with self.changed:
+			entry=self.containers.pop(containerId, None)
+			if entry!=None and self.containerNames.get(entry['name'])==containerId:
+				del self.containerNames[entry['name']]
+			self.changed.notify_all()
+
+	def findContainer(self, key):
+		# by id or name, the lock must be held
+		entry=self.containers.get(key)
+		if entry==None and key in self.containerNames:
+			entry=self.containers.get(self.containerNames[key])
+		return entry
+
+	def refreshContainer(self, key):
+		""" inspect a container and store what docker reports, None if there is no such container """
+		attrs=self.source.inspectContainer(key)
+		if attrs==None:
+			with self.changed:
+				entry=self.findContainer(key)
+			if entry!=None:
+				self.dropContainer(entry['id'])
+			return None
+		return self.storeContainer(containerEntry(attrs))
+
+	def getContainer(self, key):
+		""" the container with this id or name, None if docker has no such container """
+		return self.waitForContainer(key, lambda entry: True, 0)
+
+	def waitForContainer(self, key, ready, timeout=None):
+		"""
+		the container with this id or name once ready returns True for it, waiting
+		up to timeout seconds for events, then inspecting it if it is still not ready
+		"""
+		if timeout==None:
+			timeout=self.waitTimeout
+		deadline=time.monotonic()+timeout
+		with self.changed:
+			while self.live:
+				entry=self.findContainer(key)
+				if entry!=None and ready(entry):
+					self.hits=self.hits+1
+					return entry
+				remaining=deadline-time.monotonic()
+				if remaining<=0:
+					break
+				self.changed.wait(remaining)
+			self.misses=self.misses+1
+		return self.refreshContainer(key)
+
+	def getContainerState(self, key):
+		# only what the cache already holds, for reporting without a docker call
+		with self.changed:
+			entry=self.findContainer(key) if self.live else None
+		return entry['state'] if entry!=None else None
+
+	def countContainers(self, state='running'):
+		# only what the cache already holds, None while it is not live rather than listing every container
+		with self.changed:
+			if not self.live:
+				return None
+			return sum(1 for entry in self.containers.values() if entry['state']==state)
+
+	# networks
+
+	def storeNetwork(self, entry):
+		with self.changed:
+			self.networks[entry['id']]=entry
+			self.changed.notify_all()
+		return entry
+
+	def dropNetwork(self, networkId):
+		with self.changed:
+			self.networks.pop(networkId, None)
+
+	def findNetwork(self, key):
+		""" the network with this id or name, None if docker has no such network """
+		with self.changed:
+			if self.live:
+				self.hits=self.hits+1
+				if key in self.networks:
+					return self.networks[key]
+				for entry in self.networks.values():
+					if entry['name']==key:
+						return entry
+				return None
+			self.misses=self.misses+1
+		attrs=self.source.inspectNetwork(key)
+		return self.storeNetwork(networkEntry(attrs)) if attrs!=None else None
+
+	def findNetworks(self, keys):
+		""" the networks with these ids or names in one lookup, keys without a network are left out """
+		with self.changed:
+			entries=None
+			if self.live:
+				self.hits=self.hits+1
+				entries=list(self.networks.values())
+			else:
+				self.misses=self.misses+1
+		if entries==None:
+			entries=[networkEntry(attrs) for attrs in self.source.listNetworks()]
+		found={}
+		for entry in entries:
+			for key in (entry['id'], entry['name']):
+				if key in keys:
+					found[key]=entry
+		return found
+
+	def listNetworks(self):
+		""" every network docker has """
+		with self.changed:
+			if self.live:
+				self.hits=self.hits+1
+				return list(self.networks.values())
+			self.misses=self.misses+1
+		return [networkEntry(attrs) for attrs in self.source.listNetworks()]
+
+	# events
+
+	def resync(self):
+		""" rebuild the cache from the container and network lists """
+		containers=[containerEntry(attrs) for attrs in self.source.listContainers()]
+		networks=[networkEntry(attrs) for attrs in self.source.listNetworks()]
+		with self.changed:
+			self.containers=dict((entry['id'], entry) for entry in containers)
+			self.containerNames=dict((entry['name'], entry['id']) for entry in containers)
+			self.networks=dict((entry['id'], entry) for entry in networks)
+			self.resyncs=self.resyncs+1
+			self.changed.notify_all()
+
+	def handleEvent(self, event):
+		eventType=event.get('Type')
+		action=event.get('Action') or ''
+		actor=event.get('Actor') or {}
+		if eventType=='container':
+			if action=='destroy':
+				self.dropContainer(actor.get('ID'))
+			elif action in CONTAINER_EVENTS:
+				self.refreshContainer(actor.get('ID'))
+			else:
+				return
+		elif eventType=='network':
+			if action=='destroy':
+				self.dropNetwork(actor.get('ID'))
+			elif action=='create':
+				attrs=self.source.inspectNetwork(actor.get('ID'))
+				if attrs!=None:
+					self.storeNetwork(networkEntry(attrs))
+			elif action in ('connect', 'disconnect'):
+				# the address a container has on the network
+				self.refreshContainer((actor.get('Attributes') or {}).get('container'))
+			else:
+				return
+		else:
+			return
+		with self.changed:
+			self.events=self.events+1
+
+	def watch(self):
+		""" follow docker events in a background thread, resyncing each time the stream opens """
+		def run():
+			while True:
+				try:
+					stream=self.source.events()
+					# events during the resync are read after it, applying them again is harmless
+					self.resync()
+					with self.changed:
+						self.live=True
+					for event in stream:
+						try:
+							self.handleEvent(event)
+						except Exception as ex:
+							self.logger.error('could not apply docker event '+str(event)+' '+str(type(ex).__name__)+' '+str(ex))
+					self.logger.warning('docker event stream ended, resubscribing')
+				except Exception as ex:
+					self.logger.error('docker event stream failed '+str(type(ex).__name__)+' '+str(ex))
+				with self.changed:
+					self.live=False
+					self.changed.notify_all()
+				time.sleep(RESUBSCRIBE_DELAY)
+		self.watcher=threading.Thread(target=run, name='docker-events', daemon=True)
+		self.watcher.start()
+
+	def getMetrics(self):
+		with self.changed:
+			return {
+				'live':self.live,
+				'containers':len(self.containers),
+				'networks':len(self.networks),
+				'hits':self.hits,
+				'misses':self.misses,
+				'events':self.events,
+				'resyncs':self.resyncs
+			}
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+
+# image events that may change which image a name refers to
+IMAGE_EVENTS=('tag', 'untag', 'delete', 'pull', 'load', 'import')
+
+# seconds to wait before resubscribing to docker events after the stream ends
+RESUBSCRIBE_DELAY=5.0
+
+def imageKey(name):
+	# types name their images without a tag, docker reports them with one
+	if name.endswith(':latest'):
+		return name[:-len(':latest')]
+	return name
+
+class ImageCache:
+	"""
+		Images of the resource types
+		----------------------------
+		The id and digest of the image each resource type installs from, looked
+		up when the types load so installs do not ask docker again, and so a
+		type whose image is missing is refused when the install is requested
+		rather than after its instance is created. lookup returns the image
+		attributes docker reports for a name, None if there is no such image.
+		Docker image events invalidate the entries they affect, the next use
+		looks the image up again. After the event stream drops every entry is
+		invalidated, as images may have changed while it was down.
+	"""
+	def __init__(self, lookup=None):
+		self.logger = logging.getLogger(__name__)
+		self.lookup=lookup
+		self.lock=threading.Lock()
+		# image name to {'id', 'digest'}, None for an image docker does not have
+		self.images={}
+		self.hits=0
+		self.misses=0
+		self.invalidations=0
+		self.resyncs=0
+		# counts invalidations, a lookup that raced one is not cached
+		self.generation=0
+		self.watcher=None
+
+	def load(self, imageName):
+		""" look the image up in docker, returns its entry or None if it does not exist """
+		generation=self.generation
+		attrs=self.lookup(imageName)
+		return self.put(imageName, attrs, generation)
+
+	def put(self, imageName, attrs, generation=None):
+		# attrs as returned by docker for the image, None if it does not exist
+		entry=None
+		if attrs!=None:
+			digests=attrs.get('RepoDigests') or []
+			entry={'id':attrs.get('Id'), 'digest':digests[0] if len(digests)>0 else None}
+		with self.lock:
+			if generation==None or generation==self.generation:
+				self.images[imageKey(imageName)]=entry
+		return entry
+
+	def get(self, imageName):
+		""" the cached entry for an image, looked up on a miss, None if docker does not have it """
+		with self.lock:
+			cached=imageKey(imageName) in self.images
+			entry=self.images.get(imageKey(imageName))
+			if cached:
+				self.hits=self.hits+1
+			else:
+				self.misses=self.misses+1
+		if cached:
+			return entry
+		return self.load(imageName)
+
+	def peek(self, imageName):
+		""" the cached entry for an image that is known to exist, None without looking it up otherwise """
+		with self.lock:
+			entry=self.images.get(imageKey(imageName))
+			if entry!=None:
+				self.hits=self.hits+1
+			else:
+				self.misses=self.misses+1
+		return entry
+
+	def refresh(self, imageNames):
+		""" forget every image and look up the given ones again, returns the names docker does not have """
+		self.invalidateAll()
+		missing=[]
+		for imageName in imageNames:
+			try:
+				if self.load(imageName)==None:
+					missing.append(imageName)
+			except Exception as ex:
+				# left uncached, the first install looks it up again
+				self.logger.error('could not look up image '+imageName+' '+str(type(ex).__name__)+' '+str(ex))
+		return missing
+
+	def invalidate(self, name=None, imageId=None):
+		# drop entries for the image name, or holding the image id
+		with self.lock:
+			keys=[key for key, entry in self.images.items()
+					if key==imageKey(name or '') or (imageId!=None and entry!=None and entry['id']==imageId)]
+			for key in keys:
+				del self.images[key]
+			self.invalidations=self.invalidations+len(keys)
+			self.generation=self.generation+1
+		for key in keys:
+			self.logger.debug('image '+key+' changed, dropped from the image cache')
+
+	def invalidateAll(self):
+		with self.lock:
+			self.invalidations=self.invalidations+len(self.images)
+			self.images={}
+			self.generation=self.generation+1
+
+	def handleEvent(self, event):
+		if event.get('Type')!='image' or event.get('Action') not in IMAGE_EVENTS:
+			return
+		actor=event.get('Actor') or {}
+		# the name is the tag for tag and untag, and the id for a delete
+		self.invalidate((actor.get('Attributes') or {}).get('name'), actor.get('ID'))
+
+	def watch(self, events):
+		""" invalidate entries from docker image events in a background thread, events opens a new event stream """
+		def run():
+			first=True
+			while True:
+				try:
+					stream=events()
+					if not first:
+						self.invalidateAll()
+						with self.lock:
+							self.resyncs=self.resyncs+1
+					for event in stream:
+						self.handleEvent(event)
+					self.logger.warning('docker event stream ended, resubscribing')
+				except Exception as ex:
+					self.logger.error('docker event stream failed '+str(type(ex).__name__)+' '+str(ex))
+				first=False
+				time.sleep(RESUBSCRIBE_DELAY)
+		self.watcher=threading.Thread(target=run, name='image-events', daemon=True)
+		self.watcher.start()
+
+	def getMetrics(self):
+		with self.lock:
+			return {
+				'images':len(self.images),
+				'missing':sum(1 for entry in self.images.values() if entry==None),
+				'hits':self.hits,
+				'misses':self.misses,
+				'invalidations':self.invalidations,
+				'resyncs':self.resyncs
+			}
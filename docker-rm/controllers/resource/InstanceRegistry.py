@@ -0,0 +1,212 @@
+import bisect
+import logging
+import threading
+
+NETWORK_TYPE='resource::docker-network::1.0'
+
+class InstanceRegistry:
+	"""
+		Registry of live resource instances
+		-----------------------------------
+		Instances are keyed by resourceId, with secondary indexes on location,
+		type name and (location, type name, name), so lookups and removals do
+		not have to walk every instance. All access is guarded by one lock.
+
+		For paged searches each location, and each type within a location, also
+		keeps its resourceIds in a sorted list. Removals leave stale ids in
+		these lists, which are skipped when read and dropped once they make up
+		half of a list.
+
+		Instances are indexed by the docker networks named in their
+		docker_network properties when they are added. The names indexed are
+		kept per resourceId, so removing an instance takes out exactly those
+		even if its properties have changed since, and refresh indexes it
+		again under its current networks.
+	"""
+	def __init__(self):
+		self.logger = logging.getLogger(__name__)
+		self.lock=threading.RLock()
+		# resourceId -> instance
+		self.byId={}
+		# location -> {resourceId: instance}
+		self.byLocation={}
+		# type name -> {resourceId: instance}
+		self.byType={}
+		# (location, type name, name) -> {resourceId: instance}
+		self.byKey={}
+		# (location, network name) -> {resourceId: instance} for instances attached to a docker network
+		self.byNetwork={}
+		# resourceId -> the (location, network name) keys it is indexed under in byNetwork
+		self.networkKeys={}
+		# location or (location, type name) -> sorted resourceIds, possibly stale
+		self.ordered={}
+		self.stale={}
+
+	def add(self, instance):
+		with self.lock:
+			if instance.resourceId in self.byId:
+				self.unindex(self.byId[instance.resourceId])
+			self.byId[instance.resourceId]=instance
+			self.index(instance)
+
+	def remove(self, resourceId):
+		with self.lock:
+			instance=self.byId.pop(resourceId, None)
+			if instance!=None:
+				self.unindex(instance)
+			return instance
+
+	def refresh(self, instance):
+		""" index a registered instance again under the networks its properties now name """
+		with self.lock:
+			if self.byId.get(instance.resourceId) is instance:
+				self.unindexNetworks(instance.resourceId)
+				self.indexNetworks(instance)
+
+	def get(self, resourceId):
+		with self.lock:
+			return self.byId.get(resourceId)
+
+	def findByLocation(self, location, typename=None):
+		# instances in a location, optionally of one type, in resourceId order
+		with self.lock:
+			instances=self.byLocation.get(location, {})
+			if typename!=None:
+				ofType=self.byType.get(typename, {})
+				if len(ofType)<len(instances):
+					instances=dict((i, inst) for i, inst in ofType.items() if inst.location==location)
+				else:
+					instances=dict((i, inst) for i, inst in instances.items() if inst.type.name==typename)
+			return [instances[i] for i in sorted(instances)]
+
+	def findByType(self, typename):
+		with self.lock:
+			instances=self.byType.get(typename, {})
+			return [instances[i] for i in sorted(instances)]
+
+	def findOne(self, location, name, typename):
+		# exact match on location, name and type, None if there is no such instance
+		with self.lock:
+			instances=self.byKey.get((location, typename, name))
+			if not instances:
+				return None
+			return instances[min(instances)]
+
+	def search(self, location, typename=None, instanceName=None, relatedInstanceId=None, after=None, limit=None):
+		"""
+			page through the instances of a location in resourceId order, starting after
+			resourceId after, returns the page and the last resourceId if there are more
+		"""
+		with self.lock:
+			if relatedInstanceId!=None:
+				candidates=sorted(self.findRelatedIds(relatedInstanceId))
+			elif typename!=None:
+				candidates=self.ordered.get((location, typename), [])
+			else:
+				candidates=self.ordered.get(location, [])
+
+			start=0
+			if after!=None:
+				start=bisect.bisect_right(candidates, after)
+
+			page=[]
+			for position in range(start, len(candidates)):
+				if not self.isLive(candidates[position], location, typename):
+					continue
+				instance=self.byId[candidates[position]]
+				if instanceName!=None and instanceName not in instance.name:
+					continue
+				if limit!=None and len(page)==limit:
+					return page, page[-1].resourceId
+				page.append(instance)
+			return page, None
+
+	def findRelatedIds(self, resourceId):
+		# containers are related to the docker networks they are attached to, and the other way round
+		instance=self.byId.get(resourceId)
+		if instance==None:
+			return set()
+		if instance.type.name==NETWORK_TYPE:
+			networkName=instance.properties.get('networkname', instance.name)
+			return set(self.byNetwork.get((instance.location, networkName), {}))
+		related=set()
+		for networkName in self.networkNames(instance):
+			for i in self.byKey.get((instance.location, NETWORK_TYPE, networkName), {}):
+				related.add(i)
+		return related
+
+	def networkNames(self, instance):
+		if instance.type.name==NETWORK_TYPE:
+			return []
+		return [str(value) for key, value in instance.properties.items() if key.startswith('docker_network') and value not in (None, '')]
+
+	def values(self):
+		with self.lock:
+			return list(self.byId.values())
+
+	def __iter__(self):
+		return iter(self.values())
+
+	def __len__(self):
+		return len(self.byId)
+
+	def index(self, instance):
+		resourceId=instance.resourceId
+		self.byLocation.setdefault(instance.location, {})[resourceId]=instance
+		self.byType.setdefault(instance.type.name, {})[resourceId]=instance
+		self.byKey.setdefault((instance.location, instance.type.name, instance.name), {})[resourceId]=instance
+		self.indexNetworks(instance)
+		for key in [instance.location, (instance.location, instance.type.name)]:
+			ids=self.ordered.setdefault(key, [])
+			if len(ids)==0 or ids[-1]<resourceId:
+				ids.append(resourceId)
+			else:
+				position=bisect.bisect_left(ids, resourceId)
+				if position==len(ids) or ids[position]!=resourceId:
+					ids.insert(position, resourceId)
+
+	def unindex(self, instance):
+		resourceId=instance.resourceId
+		self.discard(self.byLocation, instance.location, resourceId)
+		self.discard(self.byType, instance.type.name, resourceId)
+		self.discard(self.byKey, (instance.location, instance.type.name, instance.name), resourceId)
+		self.unindexNetworks(resourceId)
+		self.discardOrdered(instance.location, instance.location)
+		self.discardOrdered((instance.location, instance.type.name), instance.location, instance.type.name)
+
+	def indexNetworks(self, instance):
+		keys=[(instance.location, networkName) for networkName in self.networkNames(instance)]
+		for key in keys:
+			self.byNetwork.setdefault(key, {})[instance.resourceId]=instance
+		if len(keys)>0:
+			self.networkKeys[instance.resourceId]=keys
+
+	def unindexNetworks(self, resourceId):
+		for key in self.networkKeys.pop(resourceId, []):
+			self.discard(self.byNetwork, key, resourceId)
+
+	def discardOrdered(self, key, location, typename=None):
+		# stale ids are dropped in one pass once they make up half the list
+		stale=self.stale.get(key, 0)+1
+		ids=self.ordered.get(key, [])
+		if stale*2>=len(ids):
+			ids=[i for i in ids if self.isLive(i, location, typename)]
+			if len(ids)==0:
+				self.ordered.pop(key, None)
+			else:
+				self.ordered[key]=ids
+			stale=0
+		self.stale[key]=stale
+
+	def isLive(self, resourceId, location, typename):
+		instance=self.byId.get(resourceId)
+		if instance==None or instance.location!=location:
+			return False
+		return typename==None or instance.type.name==typename
+
+	def discard(self, index, key, resourceId):
+		instances=index.get(key)
+		if instances!=None:
+			instances.pop(resourceId, None)
+			if len(instances)==0:
+				del index[key]
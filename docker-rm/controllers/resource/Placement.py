@@ -0,0 +1,256 @@
+import itertools
+import logging
+import re
+import threading
+from controllers.util.Config import *
+from controllers.util.Metrics import metrics
+from controllers.resource.DockerEndpoint import dockerEndpoints
+
+STRATEGIES=('spread', 'binpack')
+ANTI_AFFINITY=('off', 'soft', 'hard')
+
+MEMORY_UNITS={'':1, 'k':1024, 'm':1024**2, 'g':1024**3, 't':1024**4}
+
+def parseMemory(value):
+	""" bytes in a memory quantity such as 512m, 512Mi or 2GB, None if it is not set """
+	if value==None:
+		return None
+	match=re.match(r'^\s*([0-9.]+)\s*([kmgt]?)i?b?\s*$', str(value).lower())
+	if match==None:
+		raise ValueError('invalid memory quantity '+str(value))
+	return int(float(match.group(1))*MEMORY_UNITS[match.group(2)])
+
+def getReservation(resourceType):
+	# cpus and bytes of memory an instance of the type reserves, from resources in its resource.yaml
+	resources=(resourceType.resourceDescriptor or {}).get('resources') or {}
+	return float(resources.get('cpu') or 0), parseMemory(resources.get('memory')) or 0
+
+class EndpointLoad:
+	""" what placement has reserved on one docker endpoint and how long its installs take """
+	def __init__(self, endpoint, maxContainers=None):
+		self.endpoint=endpoint
+		self.cpus=endpoint.capacity.get('cpus')
+		self.memory=parseMemory(endpoint.capacity.get('memory'))
+		self.containers=endpoint.capacity.get('containers', maxContainers)
+		# resourceId to the name, cpus and memory of every instance placed here
+		self.instances={}
+		self.names={}
+		self.reservedCpus=0.0
+		self.reservedMemory=0
+		# smoothed seconds of recent installs, None until one has finished
+		self.latency=None
+		self.installs=0
+
+	def add(self, resourceId, name, cpu, memory):
+		self.instances[resourceId]=(name, cpu, memory)
+		self.names[name]=self.names.get(name, 0)+1
+		self.reservedCpus=self.reservedCpus+cpu
+		self.reservedMemory=self.reservedMemory+memory
+
+	def remove(self, resourceId):
+		name, cpu, memory=self.instances.pop(resourceId)
+		if self.names[name]==1:
+			del self.names[name]
+		else:
+			self.names[name]=self.names[name]-1
+		self.reservedCpus=self.reservedCpus-cpu
+		self.reservedMemory=self.reservedMemory-memory
+
+	def countContainers(self):
+		# running containers as last reported by docker events, at least the instances placed here
+		# as their containers may not have started yet
+		running=self.endpoint.state.countContainers()
+		return max(running or 0, len(self.instances))
+
+	def fits(self, cpu, memory, containers):
+		if self.cpus!=None and self.reservedCpus+cpu>self.cpus:
+			return False
+		if self.memory!=None and self.reservedMemory+memory>self.memory:
+			return False
+		if self.containers!=None and containers+1>self.containers:
+			return False
+		return True
+
+	def fill(self, cpu, memory, containers, mostContainers):
+		# the largest fraction of its capacity in use with the instance added, endpoints without
+		# a container limit are compared with the busiest candidate
+		fractions=[(containers+1)/(self.containers if self.containers!=None else mostContainers+1)]
+		if self.cpus:
+			fractions.append((self.reservedCpus+cpu)/self.cpus)
+		if self.memory:
+			fractions.append((self.reservedMemory+memory)/self.memory)
+		return max(fractions)
+
+	def getMetrics(self):
+		return {
+			'instances':len(self.instances),
+			'reservedCpus':self.reservedCpus,
+			'reservedMemory':self.reservedMemory,
+			'latencyMs':round(self.latency*1000, 3) if self.latency!=None else None,
+			'installs':self.installs
+		}
+
+class PlacementEngine:
+	"""
+		Placement of new instances on the docker endpoints of a location
+		----------------------------------------------------------------
+		Uses only what is already known without asking docker: the containers
+		running on each endpoint, the smoothed time its recent installs took and
+		the cpus and memory reserved on it by instances whose resource.yaml sets
+		resources. spread installs on the least filled endpoint, binpack on the
+		most filled one that still has room, and an endpoint whose installs are
+		slower than the fastest candidate's is penalised by latencyWeight per
+		multiple of that time. Anti-affinity keeps instances of the same name on
+		different endpoints, soft when possible and hard or not at all.
+		A type overrides strategy and antiAffinity with placement in its
+		resource.yaml.
+	"""
+	def __init__(self, endpoints, strategy='spread', antiAffinity='soft', latencyWeight=0.5, smoothing=0.2, maxContainers=None):
+		self.logger = logging.getLogger(__name__)
+		self.endpoints=endpoints
+		self.strategy=strategy
+		self.antiAffinity=antiAffinity
+		self.latencyWeight=latencyWeight
+		# weight of the latest install in the smoothed install time
+		self.smoothing=smoothing
+		# containers per endpoint when its capacity does not say
+		self.maxContainers=maxContainers
+		self.lock=threading.Lock()
+		self.loads={}
+		self.turns={}
+		self.placed=0
+		self.rejected=0
+
+	def getLoad(self, endpoint):
+		# the lock must be held
+		load=self.loads.get(endpoint.name)
+		if load==None:
+			load=EndpointLoad(endpoint, self.maxContainers)
+			self.loads[endpoint.name]=load
+		return load
+
+	def getPolicy(self, resourceType):
+		placement=(resourceType.resourceDescriptor or {}).get('placement') or {}
+		strategy=placement.get('strategy', self.strategy)
+		antiAffinity=placement.get('antiAffinity', self.antiAffinity)
+		if strategy not in STRATEGIES:
+			raise ValueError('unknown placement strategy '+str(strategy)+' for '+resourceType.name)
+		if antiAffinity not in ANTI_AFFINITY:
+			raise ValueError('unknown anti-affinity '+str(antiAffinity)+' for '+resourceType.name)
+		return strategy, antiAffinity
+
+	def place(self, instance):
+		"""
+		choose the endpoint of its location a new instance is installed on, reserve its resources
+		there and record the decision on it, returns None if no endpoint has the image of its type
+		"""
+		resourceType=instance.type
+		endpoints=[e for e in self.endpoints.forLocation(instance.location) if e.images.get(resourceType.imageName)!=None]
+		if len(endpoints)==0:
+			return None
+		strategy, antiAffinity=self.getPolicy(resourceType)
+		cpu, memory=getReservation(resourceType)
+
+		with self.lock:
+			# candidates start at a different endpoint each time, so ties are spread
+			turn=next(self.turns.setdefault(instance.location, itertools.count()))
+			start=turn%len(endpoints)
+			endpoints=endpoints[start:]+endpoints[:start]
+
+			candidates=[]
+			for endpoint in endpoints:
+				load=self.getLoad(endpoint)
+				containers=load.countContainers()
+				if load.fits(cpu, memory, containers):
+					candidates.append((load, containers))
+			if len(candidates)==0:
+				self.rejected=self.rejected+1
+				raise NoPlacementException(instance.location, resourceType.name, 'no docker endpoint has room for it')
+			if antiAffinity!='off':
+				apart=[c for c in candidates if instance.name not in c[0].names]
+				if len(apart)>0:
+					candidates=apart
+				elif antiAffinity=='hard':
+					self.rejected=self.rejected+1
+					raise NoPlacementException(instance.location, resourceType.name, 'every docker endpoint already has an instance called '+instance.name)
+
+			mostContainers=max(containers for load, containers in candidates)
+			latencies=[load.latency for load, containers in candidates if load.latency!=None]
+			fastest=min(latencies) if len(latencies)>0 else None
+			best=None
+			for load, containers in candidates:
+				fill=load.fill(cpu, memory, containers, mostContainers)
+				penalty=0.0
+				if load.latency!=None and fastest:
+					penalty=self.latencyWeight*(load.latency/fastest-1)
+				score=(fill if strategy=='spread' else -fill)+penalty
+				# the first of equal scores wins
+				if best==None or score<best[0]:
+					best=(score, load, containers)
+			score, load, containers=best
+			load.add(instance.resourceId, instance.name, cpu, memory)
+			self.placed=self.placed+1
+
+		instance.endpoint=load.endpoint.name
+		instance.placement={
+			'endpoint':load.endpoint.name,
+			'strategy':strategy,
+			'score':round(score, 3),
+			'candidates':len(candidates),
+			'containers':containers,
+			'latencyMs':round(load.latency*1000, 3) if load.latency!=None else None
+		}
+		self.logger.debug('placed '+instance.name+' on docker endpoint '+load.endpoint.name+' '+str(instance.placement))
+		return load.endpoint
+
+	def reserve(self, instance):
+		""" count an instance restored after a restart against the endpoint it runs on """
+		cpu, memory=getReservation(instance.type)
+		with self.lock:
+			load=self.getLoad(self.endpoints.forInstance(instance))
+			if instance.resourceId not in load.instances:
+				load.add(instance.resourceId, instance.name, cpu, memory)
+
+	def release(self, instance):
+		""" give back what an uninstalled instance reserved """
+		with self.lock:
+			load=self.loads.get(self.endpoints.forInstance(instance).name)
+			if load!=None and instance.resourceId in load.instances:
+				load.remove(instance.resourceId)
+
+	def recordInstall(self, instance, seconds):
+		""" how long an install took on the endpoint of the instance """
+		with self.lock:
+			load=self.getLoad(self.endpoints.forInstance(instance))
+			if load.latency==None:
+				load.latency=seconds
+			else:
+				load.latency=load.latency+self.smoothing*(seconds-load.latency)
+			load.installs=load.installs+1
+
+	def getMetrics(self):
+		with self.lock:
+			return {
+				'strategy':self.strategy,
+				'antiAffinity':self.antiAffinity,
+				'placed':self.placed,
+				'rejected':self.rejected,
+				'endpoints':dict((name, load.getMetrics()) for name, load in self.loads.items())
+			}
+
+# no endpoint of the location can take a new instance of the type
+class NoPlacementException(Exception):
+	def __init__(self, location, type, reason):
+		self.location=location
+		self.type=type
+		self.reason=reason
+		self.message='cannot place '+type+' in location '+location+', '+reason
+
+placementConfig=globalConfig.configDescriptor.get('placement') or {}
+placementEngine=PlacementEngine(dockerEndpoints,
+								strategy=placementConfig.get('strategy', 'spread'),
+								antiAffinity=placementConfig.get('antiAffinity', 'soft'),
+								latencyWeight=placementConfig.get('latencyWeight', 0.5),
+								smoothing=placementConfig.get('smoothing', 0.2),
+								maxContainers=placementConfig.get('maxContainers'))
+metrics.register('placement', placementEngine.getMetrics)
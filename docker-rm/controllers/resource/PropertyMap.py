@@ -0,0 +1,103 @@
+import sys
+import threading
+from collections.abc import MutableMapping
+
+# key layouts by key tuple, so every instance of a resource type shares one
+layouts={}
+layoutsLock=threading.Lock()
+
+# marks a layout key that has been deleted from a property map
+MISSING=object()
+
+class PropertyLayout:
+	""" interned property names of a resource type and their positions """
+	__slots__=('keys','positions')
+
+	def __init__(self, keys):
+		self.keys=keys
+		self.positions=dict((k, i) for i, k in enumerate(keys))
+
+def internLayout(keys):
+	keys=tuple(sys.intern(str(k)) for k in keys)
+	with layoutsLock:
+		layout=layouts.get(keys)
+		if layout==None:
+			layout=PropertyLayout(keys)
+			layouts[keys]=layout
+		return layout
+
+class PropertyMap(MutableMapping):
+	"""
+		Resource instance properties
+		----------------------------
+		Behaves like a dict, but keeps the values of the keys declared by the
+		resource type in a list against the shared layout of the type. Only
+		keys that are not in the layout get a dict of their own. Use dict()
+		on it wherever the properties are serialised.
+	"""
+	__slots__=('layout','data','extra')
+
+	def __init__(self, layout, defaults=None):
+		self.layout=layout
+		if defaults!=None:
+			self.data=list(defaults)
+		else:
+			self.data=[MISSING]*len(layout.keys)
+		self.extra=None
+
+	@staticmethod
+	def fromDict(properties):
+		propertyMap=PropertyMap(internLayout(properties.keys()))
+		propertyMap.data=list(properties.values())
+		return propertyMap
+
+	def __getitem__(self, key):
+		position=self.layout.positions.get(key)
+		if position!=None:
+			value=self.data[position]
+			if value is not MISSING:
+				return value
+		elif self.extra!=None and key in self.extra:
+			return self.extra[key]
+		raise KeyError(key)
+
+	def __setitem__(self, key, value):
+		position=self.layout.positions.get(key)
+		if position!=None:
+			self.data[position]=value
+		else:
+			if self.extra==None:
+				self.extra={}
+			self.extra[sys.intern(str(key))]=value
+
+	def __delitem__(self, key):
+		position=self.layout.positions.get(key)
+		if position!=None and self.data[position] is not MISSING:
+			self.data[position]=MISSING
+		elif self.extra!=None and key in self.extra:
+			del self.extra[key]
+		else:
+			raise KeyError(key)
+
+	def __contains__(self, key):
+		position=self.layout.positions.get(key)
+		if position!=None:
+			return self.data[position] is not MISSING
+		return self.extra!=None and key in self.extra
+
+	def __iter__(self):
+		for key, value in zip(self.layout.keys, self.data):
+			if value is not MISSING:
+				yield key
+		if self.extra!=None:
+			for key in list(self.extra):
+				yield key
+
+	def __len__(self):
+		count=len(self.data)-self.data.count(MISSING)
+		if self.extra!=None:
+			count=count+len(self.extra)
+		return count
+
+	def __repr__(self):
+		return repr(dict(self))
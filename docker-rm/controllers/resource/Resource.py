@@ -4,6 +4,7 @@ import os
 from datetime import datetime
 import pytz
 import yaml
+from controllers.resource.PropertyMap import internLayout
 
 class Resource:
 	# Reponsible for loading and managing resource types from the filesystem
@@ -35,6 +36,9 @@ class Resource:
 		self.resourceDescriptorString=''
 		self.resourceDescriptor=self.loadResourceDescriptor()
 
+		# property names are shared by all instances of this type, only their values are per instance
+		self.propertyLayout, self.propertyDefaults=self.loadPropertyLayout()
+
 #		self.logger.info('created resource '+self.name +' ' + self.resourceDescriptorString)
 		
 	def loadResourceDescriptor(self):
@@ -54,6 +58,18 @@ class Resource:
 			self.logger.debug('no resource descriptor file '+resfilename+' found')
 			return None
 
+	def loadPropertyLayout(self):
+		properties={}
+		if self.resourceDescriptor!=None and self.resourceDescriptor.get('properties')!=None:
+			properties=self.resourceDescriptor['properties']
+		defaults=[]
+		for p in properties:
+			if 'default' in properties[p]:
+				defaults.append(properties[p]['default'])
+			else:
+				defaults.append('')
+		return internLayout(properties), defaults
+
 	def loadLifecycleConfig(self):
 		filename=str(self.path)+'/lifecycle/lifecycle.yaml'
 		self.logger.debug('looking to see if lifecycle yaml file '+filename+' is available')
@@ -103,7 +119,18 @@ class Resource:
 			self.logger.debug('found '+transitionName+' in operations')
 			return True
 		
-		return False		
+		return False
+
+	def getTimeout(self, transitionName, operation=False):
+		# seconds the transition may run, from timeouts or timeout in operations.yaml or lifecycle.yaml
+		# None when the type does not set one
+		config=self.operationsPath if operation else self.lifecyclePath
+		if config==None:
+			return None
+		timeouts=config.get('timeouts') or {}
+		if transitionName in timeouts:
+			return timeouts[transitionName]
+		return config.get('timeout')
 
 	def getResourceOverview(self):
 		self.logger.debug('get resource overview')
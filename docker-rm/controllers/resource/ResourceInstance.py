@@ -1,27 +1,127 @@
 import docker
 import logging
-from datetime import datetime, timezone
+import shlex
+import struct
+import time
+from docker.utils.socket import read_exactly, SocketError
 from controllers.resource.Resource import Resource
+from controllers.resource.InstanceRegistry import InstanceRegistry, NETWORK_TYPE
+from controllers.resource.DockerEndpoint import dockerEndpoints
+from controllers.resource.Placement import placementEngine
+from controllers.resource.ContainerPool import poolPrefix, POOL_LABEL, POOL_NETWORK
+from controllers.resource.PropertyMap import PropertyMap
+from controllers.util.Timestamp import formatTimestamp, parseTimestamp
 import controllers.ResourceManager
 import sys
 from controllers.util.Config import *
-import yaml
+from controllers.util.DB import dbClient
+from controllers.transition.TransitionDeadline import wrapCommand, KILL_COMMAND
+from controllers.transition.TransitionTimings import TransitionTimings
+from controllers.transition.TransitionOutput import TransitionOutput, checkExitCode
+from controllers.util.DockerAPI import apiVersionAtLeast, MULTI_NETWORK_API_VERSION, STREAM_NAMES
+from controllers.util.PropertyArchive import packProperties, unpackProperties, PROPERTIES_DIR, TRANSITION_PROPERTIES, OPERATION_PROPERTIES
 
 
 ##########################################################################################
 # docker connection
 ##########################################################################################
-dockerClient=None
 logger=logging.getLogger(__name__)
-try:
-	dockerClient = docker.from_env()
-	dockerClient.ping()
-	logger.debug('docker client configured and successfully pinged server')
-except Exception as e:
-	logger.error(type(e).__name__)
-	logger.error(str(e))
-	logger.error('Docker environment variables must be provided, please re-run with correct Docker environment')
-	sys.exit(0)
+
+class DockerClientSource:
+	# docker calls made by the container and network state cache of an endpoint
+	def __init__(self, client):
+		self.client=client
+
+	def listContainers(self):
+		return self.client.api.containers(all=True)
+
+	def inspectContainer(self, key):
+		try:
+			return self.client.api.inspect_container(key)
+		except docker.errors.NotFound:
+			return None
+
+	def listNetworks(self):
+		return self.client.api.networks()
+
+	def inspectNetwork(self, key):
+		try:
+			return self.client.api.inspect_network(key)
+		except docker.errors.NotFound:
+			return None
+
+	def events(self):
+		return self.client.events(decode=True, filters={'type':['container', 'network']})
+
+class DockerPoolBackend:
+	# docker calls made by the warm container pools of an endpoint
+	def __init__(self, client):
+		self.client=client
+
+	def create(self, resourceType, name):
+		container=self.client.containers.run(resourceType.imageName,
+											name=name,
+											labels={POOL_LABEL:resourceType.name},
+											network=POOL_NETWORK,
+											detach=True,
+											privileged=True,
+											volumes=["/sys/fs/cgroup:/sys/fs/cgroup:ro"])
+		return container.id
+
+	def remove(self, containerId):
+		self.client.api.remove_container(containerId, force=True)
+
+	def listPooled(self, resourceType):
+		# claimed containers keep the label but are renamed after their instance
+		containers=self.client.api.containers(filters={'label':POOL_LABEL+'='+resourceType.name, 'status':'running'})
+		return [c['Id'] for c in containers if any(n.lstrip('/').startswith(poolPrefix(resourceType)) for n in c['Names'])]
+
+def execFrames(sock):
+	# exec output without a tty is framed as [stream, 0, 0, 0, size] headers followed by size bytes
+	while True:
+		try:
+			header=read_exactly(sock, 8)
+		except SocketError:
+			return
+		stream, size=struct.unpack('>BxxxI', header)
+		yield STREAM_NAMES.get(stream, 'stdout'), read_exactly(sock, size)
+
+def lookupImage(client, imageName):
+	# image attributes for the image cache, None if docker does not have the image
+	try:
+		return client.images.get(imageName).attrs
+	except docker.errors.ImageNotFound:
+		return None
+
+def connectEndpoint(endpoint):
+	# a client of its own, so each endpoint has its own connection pool
+	if endpoint.url==None:
+		client=docker.from_env(version=endpoint.apiVersion)
+	else:
+		tls=None
+		if endpoint.tls!=None:
+			tls=docker.tls.TLSConfig(client_cert=(endpoint.tls['cert'], endpoint.tls['key']), ca_cert=endpoint.tls.get('ca'), verify=endpoint.tls.get('ca')!=None)
+		client=docker.DockerClient(base_url=endpoint.url, tls=tls, version=endpoint.apiVersion)
+	client.ping()
+	endpoint.client=client
+	endpoint.images.lookup=lambda imageName: lookupImage(client, imageName)
+	endpoint.images.watch(lambda: client.events(decode=True, filters={'type':'image'}))
+	endpoint.state.source=DockerClientSource(client)
+	endpoint.state.watch()
+	endpoint.pools.backend=DockerPoolBackend(client)
+
+for endpoint in dockerEndpoints.all():
+	try:
+		connectEndpoint(endpoint)
+		logger.debug('docker client for endpoint '+endpoint.name+' configured and successfully pinged server')
+	except Exception as e:
+		logger.error(type(e).__name__)
+		logger.error(str(e))
+		if endpoint.url==None:
+			logger.error('Docker environment variables must be provided, please re-run with correct Docker environment')
+		else:
+			logger.error('Docker endpoint '+endpoint.name+' at '+endpoint.url+' in locations.yaml cannot be reached')
+		sys.exit(0)
 
 ##########################################################################################
 # resource instances and managements
@@ -30,55 +130,52 @@ except Exception as e:
 # id of last allocated resource instance
 lastResourceId=0
 
-# list of all resource instances
-resourceInstances=[]
+# registry of all resource instances
+resourceInstances=InstanceRegistry()
 
 def findInstanceByResourceId(id):
 	logger.debug('searching for instance with resource id '+str(id))
 
-	for i in resourceInstances:
-		if i.resourceId==int(id):			
-			return i
-	logger.debug('could not find instance ')
-	return None
+	i=resourceInstances.get(int(id))
+	if i==None:
+		logger.debug('could not find instance ')
+	return i
 
-def findInstances(location, typename):
+def findInstances(location, typename, instanceName=None, relatedInstanceId=None, after=None, limit=None, fields=None):
 	logger.debug('searching for instances in '+location)
 
-	# partial and full search of all instances with a particular name
+	# one page of instances in a location, optionally of a particular type, with the last resourceId if there are more
 	instances=[]
-	for i in resourceInstances:
-		if location!=None and i.location==location:
-			if typename !=None:
-				if i.type.name==typename:
-					instances.append(i.getInstanceDetails())
-			else:
-	 			instances.append(i.getInstanceDetails())
+	lastId=None
+	if location!=None:
+		page, lastId=resourceInstances.search(location, typename, instanceName, relatedInstanceId, after, limit)
+		for i in page:
+			instances.append(i.getInstanceDetails(fields))
 
-	return instances
+	return instances, lastId
 
 def findInstancesByLocation(location, name, typename):
 	logger.debug('find instance in location: '+location+' with name: '+name+' with type: '+typename)
-	# partial and full search of all instances with a particular name in a provided location
-	# return single instance exact match
-	for i in resourceInstances:
-		if location!=None and i.location==location:
-			if typename !=None and i.type.name==typename:
-				if name!=None and i.name==name:
-					return i
-	logger.debug('found no network')
-	return None
+	# return single instance exact match on name and type in a provided location
+	i=resourceInstances.findOne(location, name, typename)
+	if i==None:
+		logger.debug('found no network')
+	return i
 
 def removeResourceInstance(id):
 	# expecting an integer id
 	logger.debug('removing resource instance '+str(id))
-	index=0;
-	for p in resourceInstances:
-		if p.resourceId==id:
-			logger.debug('found it')
-			del resourceInstances[index]
-			logger.debug('deleted '+str(id))
-		index=index+1
+	instance=resourceInstances.remove(id)
+	if instance!=None:
+		placementEngine.release(instance)
+		logger.debug('deleted '+str(id))
+	dbClient.removeInstance(id)
+
+def reserveResourceIds(maxResourceId):
+	# make sure newly allocated resource ids are above any id already in use
+	global lastResourceId
+	if maxResourceId>=lastResourceId:
+		lastResourceId=maxResourceId+1
 
 
 ##########################################################################################
@@ -86,9 +183,15 @@ def removeResourceInstance(id):
 ##########################################################################################
 class ResourceInstance:
 	""" Responsible for running resource instance lifecycles"""
-	
-	def __init__(self,resourceType=None,name='',location='',properties={}):
-		self.logger = logging.getLogger(__name__)
+
+	# an RM can hold tens of thousands of instances, so there is no per instance __dict__,
+	# times are epoch seconds and properties share the key layout of their type
+	__slots__=('type','properties','location','createdAt','lastModifiedAt','name','resourceId',
+			'container','containerId','containerName','readonly','endpoint','placement')
+
+	logger=logging.getLogger(__name__)
+
+	def __init__(self,resourceType=None,name='',location='',properties={},resourceId=None,endpoint=None):
 		self.logger.info('creating new resource instance with name='+name)
 
 		self.type=resourceType
@@ -98,35 +201,65 @@ class ResourceInstance:
 
 		self.location=location
 
-		self.createdAt=str(datetime.now(timezone.utc).astimezone().isoformat())
+		self.createdAt=time.time()
 
-		self.lastModifiedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
+		self.lastModifiedAt=self.createdAt
 
 		self.name=name
 
 		global lastResourceId
-		self.resourceId=lastResourceId
-		lastResourceId=lastResourceId+1
+		if resourceId==None:
+			self.resourceId=lastResourceId
+			lastResourceId=lastResourceId+1
+		else:
+			# restoring an instance from the snapshot
+			self.resourceId=resourceId
+			reserveResourceIds(resourceId)
 
 		self.container=None
+		self.containerId=None
+		self.containerName=None
 
 		self.readonly=False
 
-		# add self to list of instances
-		global resourceInstances
-		resourceInstances.append(self)
+		# name of the docker endpoint the instance runs on and why it was chosen
+		self.endpoint=endpoint
+		self.placement=None
+
+		# add self to the registry of instances
+		resourceInstances.add(self)
+
+	def restore(self, record):
+		# restore state saved by getSnapshot, the container itself is looked up lazily
+		# older snapshots hold ISO timestamps
+		self.createdAt=parseTimestamp(record['createdAt'])
+		self.lastModifiedAt=parseTimestamp(record['lastModifiedAt'])
+		self.containerId=record.get('containerId')
+		self.containerName=record.get('containerName')
+		self.readonly=record.get('readonly', False)
+		self.endpoint=record.get('endpoint')
+		self.placement=record.get('placement')
+
+	def getSnapshot(self):
+		# everything needed to rebuild this instance after a restart
+		return {
+				 'resourceId':self.resourceId,
+				 'resourceType':self.type.name,
+				 'resourceName': self.name,
+				 'deploymentLocation':self.location,
+				 'properties':dict(self.properties),
+				 'createdAt': self.createdAt,
+				 'lastModifiedAt':self.lastModifiedAt,
+				 'containerId':self.containerId,
+				 'containerName':self.containerName,
+				 'readonly':self.readonly,
+				 'endpoint':self.endpoint,
+				 'placement':self.placement
+				 }
 
 	def createProperties(self):
 		self.logger.debug('creating properties')
-		props={}
-		for p in self.type.resourceDescriptor['properties']:
-			self.logger.debug('adding '+str(p))
-			self.logger.debug(self.type.resourceDescriptor['properties'][p])
-			if 'default' in self.type.resourceDescriptor['properties'][p]:
-				props[p]=self.type.resourceDescriptor['properties'][p]['default']
-			else:
-				props[p]=''
-
+		props=PropertyMap(self.type.propertyLayout, self.type.propertyDefaults)
 		self.logger.debug(props)
 		return props
 
@@ -139,17 +272,20 @@ class ResourceInstance:
 
 		self.logger.debug(self.properties)
 
-	def startContainer(self):
+	def getEndpoint(self):
+		return dockerEndpoints.forInstance(self)
+
+	def startContainer(self, timings=None):
 		self.logger.debug('starting container')
+		timings=timings or TransitionTimings()
 		""" check if image exists, if not throw an exception """
-		image=None
-		try:
-			image=dockerClient.images.get(self.type.imageName)
-
-		except docker.errors.ImageNotFound as ex:
+		endpoint=self.getEndpoint()
+		with timings.phase('imageLookup'):
+			image=endpoint.images.get(self.type.imageName)
+		if image==None:
 			self.logger.debug('no image found for '+self.type.name + ' called ' + self.type.imageName)
 			removeResourceInstance(self.resourceId)
-			raise
+			raise docker.errors.ImageNotFound('No such image: '+self.type.imageName)
 
 		# pass all properties as env variables here
 		# create a list of env strings with all key, values
@@ -175,75 +311,118 @@ class ResourceInstance:
 		self.logger.debug('startup network ='+network)
 		self.logger.debug('hostname ='+hostname)
 
-		""" run the docker container """
-		
-		self.logger.debug('creating docker container for '+self.type.name)
-		volumeList=[]
-		volumeList.append("/sys/fs/cgroup:/sys/fs/cgroup:ro")
-		try:
-			self.container=dockerClient.containers.run(self.type.imageName,
-													name=self.type.imageName+str(self.resourceId),
-													environment=envlist,
-													hostname=hostname,
-													network=network,
-													detach=True,
-													privileged=True,
-													volumes=volumeList)
-		except (docker.errors.APIError, docker.errors.ContainerError) as ex:
-			# Need to check if a container was created and remove it if it was.
-			self.logger.error(str(ex))
-			name = self.type.imageName+str(self.resourceId)
-			containers = dockerClient.containers.list(all=True, filters={'name': name})
-			if len(containers) == 1:
-				self.logger.debug("Removing container that was created with error: " + name)
-				containers[0].remove()			
-			raise ex
+		# every docker_networkN property names another network to attach, all found in one lookup
+		extraNetworks=[(key[len('docker_network'):], value) for key, value in self.properties.items()
+						if key.startswith('docker_network') and len(key)>len('docker_network') and value]
+		attach=[]
+		if len(extraNetworks)>0 and network=='host':
+			self.logger.error('a container on the host network cannot join other networks, ignoring '+str([value for suffix, value in extraNetworks]))
+		elif len(extraNetworks)>0:
+			with timings.phase('networkLookup'):
+				found=endpoint.state.findNetworks(set(value for suffix, value in extraNetworks))
+			for suffix, value in extraNetworks:
+				if value in found:
+					self.logger.debug('FOUND additional docker network docker_network'+suffix+'='+value+' to attach to container.')
+					attach.append((suffix, found[value]['name']))
+				else:
+					self.logger.error('could not find network '+value)
+
+		""" take a warm container from the pool of the type, or run a new one """
+		# the host network cannot be joined after a container has started
+		claimed=False
+		if network!='host':
+			with timings.phase('poolClaim'):
+				claimed=endpoint.pools.claim(self.type, lambda containerId: self.claimContainer(containerId, network, hostname))
+		if claimed:
+			self.logger.debug('claimed pooled container '+self.container.id+' for '+self.type.name)
+			# already running, so the other networks are connected one at a time
+			with timings.phase('networkAttach'):
+				for suffix, name in attach:
+					endpoint.client.api.connect_container_to_network(self.container.id, name)
+		else:
+			self.runContainer(envlist, network, hostname, [name for suffix, name in attach], timings)
+
+		self.containerId=self.container.id
+		self.containerName=self.container.name
 		
-		# wait for a second and check for ip address
-		self.container.reload()
-		self.logger.debug('attributes='+str(self.container.attrs))
-		self.logger.debug('-------------------------------------')
-		self.logger.debug(self.container.attrs['NetworkSettings']['Networks'][network])
-		self.logger.debug('-------------------------------------')
-		self.properties['docker_ipaddr']=self.container.attrs['NetworkSettings']['Networks'][network]['IPAddress']
+		# the addresses on every network are known once the start and connect events have reached the state cache
+		networks=[network]+[name for suffix, name in attach]
+		with timings.phase('containerReload'):
+			state=endpoint.state.waitForContainer(self.container.id, lambda c: c['state']!='created' and all(n in c['networks'] for n in networks))
+		self.logger.debug('state='+str(state))
+		self.properties['docker_ipaddr']=state['networks'][network]['ipaddr']
 		
 		#if the network set was host network then no ip address will be allocated so pass something dummy back
 		if network=='host':
 			self.properties['docker_ipaddr']='HOSTIP'
 
-		# if there are additional docker_network properties, then add those networks to the container 
-		# and update the read-only propeties for each if they exist
-		for key, value in self.properties.items():
-			if key.startswith('docker_network') and len(key)>len("docker_network"):
-				self.logger.debug('FOUND additional docker network '+key+'='+value+' to attach to container.')
-				networknames=[]
-				networknames.append(value)
-				try:
-					networks = dockerClient.networks.list(names=networknames)
-					if networks!=None and len(networks)>0:
-						self.logger.debug('found networks '+str(networks))
-						# attached to network at [0]
-						network=dockerClient.networks.get(networks[0].id)
-						self.logger.debug('attaching to network '+str(network))
-						network.connect(self.container)
-						
-						self.container.reload()
-						self.logger.debug('Attached to network '+network.name)
-						self.logger.debug(self.container.attrs['NetworkSettings']['Networks'][network.name])
-						ipaddrProp="docker_ipaddr"+key[len("docker_network"):]
-						if ipaddrProp in self.properties:
-							self.logger.debug('setting read only property '+ipaddrProp)					
-							self.properties[ipaddrProp]=self.container.attrs['NetworkSettings']['Networks'][network.name]['IPAddress']
-					
-				except docker.errors.APIError:
-					self.logger.error('could not find network '+networkname)
-					self.logger.error('set error in db')
-					
+		# update the read-only address property of each additional network if there is one
+		for suffix, name in attach:
+			ipaddrProp='docker_ipaddr'+suffix
+			if ipaddrProp in self.properties and name in state['networks']:
+				self.logger.debug('setting read only property '+ipaddrProp)
+				self.properties[ipaddrProp]=state['networks'][name]['ipaddr']
 
+	def runContainer(self, envlist, network, hostname, extraNetworks, timings):
+		""" create the docker container on all of its networks and start it """
 		
-
-	def runTransition(self, cmd, properties=None,isTransition=True):
+		self.logger.debug('creating docker container for '+self.type.name)
+		client=self.getEndpoint().client
+		name=self.type.imageName+str(self.resourceId)
+		volumeList=[]
+		volumeList.append("/sys/fs/cgroup:/sys/fs/cgroup:ro")
+		# later api versions join every network at create, earlier ones only the first so the
+		# others are connected before the container starts
+		connectAtCreate=apiVersionAtLeast(client.api.api_version, MULTI_NETWORK_API_VERSION)
+		endpointsConfig={network:client.api.create_endpoint_config()}
+		if connectAtCreate:
+			for extraNetwork in extraNetworks:
+				endpointsConfig[extraNetwork]=client.api.create_endpoint_config()
+		with timings.phase('containerRun'):
+			container=client.api.create_container(self.type.imageName,
+												name=name,
+												environment=envlist,
+												hostname=hostname,
+												detach=True,
+												host_config=client.api.create_host_config(network_mode=network, privileged=True, binds=volumeList),
+												networking_config=client.api.create_networking_config(endpointsConfig))
+			try:
+				if not connectAtCreate:
+					for extraNetwork in extraNetworks:
+						client.api.connect_container_to_network(container['Id'], extraNetwork)
+				client.api.start(container['Id'])
+			except docker.errors.APIError as ex:
+				# do not leave a container behind that never started
+				self.logger.error(str(ex))
+				self.logger.debug("Removing container that was created with error: " + name)
+				client.api.remove_container(container['Id'], force=True)
+				raise ex
+		self.container=client.containers.prepare_model({'Id':container['Id'], 'Name':'/'+name})
+
+	def claimContainer(self, containerId, network, hostname):
+		# make a pooled container this instance's container, its properties reach it in /etc/rmparams
+		# as it was started before they were known, so they are not in its RM_PROP_ environment
+		name=self.type.imageName+str(self.resourceId)
+		self.logger.debug('claiming pooled container '+containerId+' as '+name)
+		client=self.getEndpoint().client
+		container=client.containers.prepare_model({'Id':containerId, 'Name':'/'+name})
+		container.rename(name)
+		if network!=POOL_NETWORK:
+			client.api.connect_container_to_network(containerId, network)
+			client.api.disconnect_container_from_network(containerId, POOL_NETWORK)
+		execId=client.api.exec_create(containerId, ['/bin/sh', '-c', 'hostname '+shlex.quote(hostname)+' && echo '+shlex.quote(hostname)+' > /etc/hostname'])
+		output=client.api.exec_start(execId)
+		if client.api.exec_inspect(execId).get('ExitCode'):
+			self.logger.error('could not set hostname of '+name+' '+output.decode('utf-8', 'replace'))
+			# a container that has stopped is removed by the pool and a new one is run instead
+			if not client.api.inspect_container(containerId)['State']['Running']:
+				self.logger.error('pooled container '+containerId+' claimed as '+name+' is not running')
+				raise NoContainerException(containerId)
+		self.container=container
+
+	def runTransition(self, cmd, properties=None,isTransition=True,deadline=None,timings=None,output=None):
 		self.logger.info('running transition command '+cmd)
+		timings=timings or TransitionTimings()
 
 		self.logger.debug("update all property environment variables in the container?")
 
@@ -261,15 +440,24 @@ class ResourceInstance:
 			self.logger.info('***TRANSITION: '+str(cmdList)+' created on RESOURCE: '+ self.name +'***')
 
 			# update properties on the container before we call command
-			self.sendProperties(properties,isTransition)
-
-			resp=self.container.exec_run(cmdList, stream=True)
-			self.logger.info('***CMD OUTPUT from resource: '+self.name+' ***')
-			for val in resp:
-				self.logger.info('*** >>>>>>'+str(val))
+			with timings.phase('sendProperties'):
+				self.sendProperties(properties,isTransition)
+
+			# stdout and stderr go to the transition's output as they arrive
+			output=output or TransitionOutput()
+			with timings.phase('lifecycleExec' if isTransition else 'operationExec'):
+				if deadline==None:
+					output.exited(self.execCommand(cmdList, output))
+				else:
+					# a timeout or cancel kills the command, which ends the output stream
+					container=self.container
+					with deadline.guard(lambda: container.exec_run(KILL_COMMAND)):
+						output.exited(self.execCommand(wrapCommand(cmd), output))
+			checkExitCode(output, cmd, self.name)
 
 			# collect any property changes after command runs
-			self.getProperties()
+			with timings.phase('getProperties'):
+				self.getProperties()
 			self.logger.info('***TRANSITION: '+str(cmdList)+' complete on RESOURCE: '+ self.name +'***')
 
 		else:
@@ -280,35 +468,43 @@ class ResourceInstance:
 		ret={'status':'OK','containerId':self.container.id}
 		return ret
 
+	def execCommand(self, cmd, output):
+		# the docker SDK merges stdout and stderr, so the frames are read from the exec's socket
+		client=self.getEndpoint().client
+		execId=client.api.exec_create(self.container.id, cmd)
+		sock=client.api.exec_start(execId, socket=True)
+		try:
+			for stream, data in execFrames(sock):
+				output.write(stream, data)
+		finally:
+			sock.close()
+		return client.api.exec_inspect(execId).get('ExitCode')
+
 	def sendProperties(self,properties=None,transition=True):
-		# send properties as a yaml string to container using docker exec
-		# store yaml in /etc/rmparams
+		# send properties as a yaml file to the container with the docker archive api
+		# store yaml in /etc/rmparams, or /etc/opparams for operations
 		if properties!=None:
 			props=properties
 		else:
-			props=self.properties
+			props=dict(self.properties)
 			
 		self.logger.info('Sending properties '+str(props))
 
-		propString=yaml.dump(props,default_flow_style = False,default_style='')
-		if transition:
-			cmdString="/bin/sh -c \"echo '"+propString+"' > /etc/rmparams\""
-		else:
-			cmdString="/bin/sh -c \"echo '"+propString+"' > /etc/opparams\""
-			
-		self.logger.debug(cmdString)
-		resp=self.container.exec_run(cmdString, stream=True)
+		target=TRANSITION_PROPERTIES if transition else OPERATION_PROPERTIES
+		self.container.put_archive(PROPERTIES_DIR, packProperties(target, props))
 
 	def getProperties(self):
-		# cat the current /etc/rmparams file on container
+		# read the current /etc/rmparams file from the container
 		# update the properties on this object and store
 		self.logger.debug('Retrieving properties from container')
-		resp=self.container.exec_run("cat /etc/rmparams", stream=True)
-		
-		propYaml=None
-		for val in resp:
-			propYaml=yaml.safe_load(val)
-			self.logger.debug('updating properties with '+str(propYaml))
+		try:
+			stream, stat=self.container.get_archive(TRANSITION_PROPERTIES)
+			propYaml=unpackProperties(b''.join(stream))
+		except docker.errors.NotFound:
+			propYaml=None
+		self.logger.debug('updating properties with '+str(propYaml))
+		if propYaml==None:
+			return
 			
 		#loop over resource instance properties and update if changes found, else ignore
 		for p in self.properties:
@@ -319,42 +515,54 @@ class ResourceInstance:
 		self.logger.info('Updated properties '+str(self.properties))
 
 	def getContainer(self) :
-		containername='dockerrm-'+self.type.imageName+str(self.resourceId)
+		# prefer the id recorded at install, containers are named after the image and resource id
+		containername=self.containerId
+		if containername==None:
+			containername=self.type.imageName+str(self.resourceId)
 		self.logger.debug('getting container '+containername)
 		try:
-			c=dockerClient.containers.get(containername)
-			return c
-		except docker.errors.NotFound:
-			self.logger.error('cannot find container')
+			endpoint=self.getEndpoint()
+			state=endpoint.state.getContainer(containername)
+			if state==None:
+				self.logger.error('cannot find container')
+				return None
+			return endpoint.client.containers.prepare_model({'Id':state['id'], 'Name':'/'+state['name']})
 		except docker.errors.APIError:
 			self.logger.error('cannot connect to server')
 
 	def getID(self):
 		self.logger.debug('getting container instance id')
-		id = None
+		id = self.containerId
 		if self.container != None:
 			id = self.container.id
 		return id
 
-	def runStandardTransition(self, transitionName, properties):
+	def runStandardTransition(self, transitionName, properties, deadline=None, timings=None, output=None):
 		self.logger.debug('running standard transition '+transitionName)
 		self.logger.debug(properties)
+		timings=timings or TransitionTimings()
 
 		if transitionName=='uninstall':
 			self.logger.debug('killing container')
 			removeResourceInstance(self.resourceId)
-			try:
-				self.container.kill()
-				self.container.remove()
-			except docker.errors.APIError as ex:
-				self.logger.error('caught exception during uninstall, continuing '+ str(type(ex).__name__) + ' ' +str(ex))
+			if self.container==None:
+				self.container=self.getContainer()
+			if self.container!=None:
+				try:
+					with timings.phase('containerRemove'):
+						self.container.kill()
+						self.container.remove()
+				except docker.errors.APIError as ex:
+					self.logger.error('caught exception during uninstall, continuing '+ str(type(ex).__name__) + ' ' +str(ex))
+			else:
+				self.logger.error('no container found during uninstall, continuing')
 			ret={'status':'OK'}	
 			return ret
 
 		if transitionName=='install':
 			self.logger.debug('creating container for install transition')
 			""" start a new container """
-			self.startContainer()
+			self.startContainer(timings)
 
 		""" now run script """
 		self.logger.debug('about to run lifecycle script')
@@ -362,7 +570,7 @@ class ResourceInstance:
 		if self.type!=None and self.type.lifecyclePath!=None:
 			if 'lifecycle' in self.type.lifecyclePath and transitionName in self.type.lifecyclePath['lifecycle']:
 				self.logger.debug('running '+self.type.lifecyclePath['lifecycle'][transitionName]+' from lifecycle config')
-				return self.runTransition(self.type.lifecyclePath['lifecycle'][transitionName])
+				return self.runTransition(self.type.lifecyclePath['lifecycle'][transitionName], deadline=deadline, timings=timings, output=output)
 		else:
 			self.logger.error('no lifecycle config found for transition '+transitionName)
 			return None
@@ -375,11 +583,13 @@ class ResourceInstance:
 			self.logger.error('no network id provided')
 			return None
 
-		network=dockerClient.networks.get(networkid);
+		# an instance restored at startup looks its container up on first use
+		if self.container==None:
+			self.container=self.getContainer()
 
 		# attach this container to network
 		if self.container!=None:
-			network.connect(self.container)
+			self.getEndpoint().client.api.connect_container_to_network(self.container.id, self.resolveNetwork(networkid))
 		else:
 			self.logger.error('no container found to attach to network')
 			return None
@@ -395,10 +605,12 @@ class ResourceInstance:
 			self.logger.error('no network id provided')
 			return None
 
-		network=dockerClient.networks.get(networkid);
+		# an instance restored at startup looks its container up on first use
+		if self.container==None:
+			self.container=self.getContainer()
 
 		if self.container!=None:
-			network.disconnect(self.container)
+			self.getEndpoint().client.api.disconnect_container_from_network(self.container.id, self.resolveNetwork(networkid))
 		else:
 			self.logger.error('no container found to detach from network')
 			return None
@@ -406,7 +618,18 @@ class ResourceInstance:
 		ret={'status':'OK','containerId':self.container.id}
 		return ret
 
-	def runOperation(self, transitionName,properties):
+	def resolveNetwork(self, networkid):
+		""" the network id or, when the network was created on another endpoint of the location, its name """
+		# a network is created on every endpoint of its location but only the id on its first endpoint is
+		# recorded, the others have a network of the same name
+		for network in resourceInstances.findByType(NETWORK_TYPE):
+			if network.properties.get('networkid')==networkid and network.location==self.location:
+				if dockerEndpoints.forInstance(network) is not self.getEndpoint():
+					return network.properties['networkname']
+				break
+		return networkid
+
+	def runOperation(self, transitionName,properties,deadline=None,timings=None,output=None):
 		self.logger.debug('running operation '+transitionName +' with properties '+str(properties))
 
 		if transitionName=='addNetwork':
@@ -424,7 +647,7 @@ class ResourceInstance:
 			if self.type!=None and self.type.operationsPath!=None:
 				if 'operations' in self.type.operationsPath and transitionName in self.type.operationsPath['operations']:
 					self.logger.debug('running '+self.type.operationsPath['operations'][transitionName]+' from operations config')
-					return self.runTransition(self.type.operationsPath['operations'][transitionName], properties,False)
+					return self.runTransition(self.type.operationsPath['operations'][transitionName], properties,False,deadline,timings,output)
 			else:
 				self.logger.error('no operations config found for operation '+transitionName)
 				return None
@@ -435,36 +658,67 @@ class ResourceInstance:
 				 'resourceId':self.resourceId,
 				 'resourceType':self.type.name,
 				 'resourceName': self.name,
-				 'createdAt': self.createdAt,
-				 'properties':self.properties,
+				 'createdAt': formatTimestamp(self.createdAt),
+				 'properties':dict(self.properties),
 				 'deploymentLocation':self.location,
-				 'lastModifiedAt':self.lastModifiedAt,
+				 'lastModifiedAt':formatTimestamp(self.lastModifiedAt),
 				 'resourceManagerId':globalConfig.configDescriptor['name']
 				 } 
 
-	def getInstanceDetails(self):
+	def getInstanceDetails(self, fields=None):
 		self.logger.debug('get running instance details')
-		internalContainers=[]
-		if self.container!=None:
-			container={
-				'id':self.container.id,
-				'name': self.container.name,
-				'type':'docker container'
-			}
-			internalContainers.append(container)
+		if fields!=None:
+			# build only the requested fields, so searches can leave out the properties
+			details={}
+			for field in fields:
+				if field in INSTANCE_DETAIL_FIELDS:
+					details[field]=INSTANCE_DETAIL_FIELDS[field](self)
+			return details
 
 		return {
 				 'resourceId':self.resourceId,
 				 'resourceType':self.type.name,
 				 'resourceName': self.name,
-				 'createdAt': self.createdAt,
-				 'properties':self.properties,
+				 'createdAt': formatTimestamp(self.createdAt),
+				 'properties':dict(self.properties),
 				 'deploymentLocation':self.location,
-				 'lastModifiedAt':self.lastModifiedAt,
+				 'lastModifiedAt':formatTimestamp(self.lastModifiedAt),
 				 'resourceManagerId':globalConfig.configDescriptor['name'],
-				 'internalResourceInstances':internalContainers
+				 'internalResourceInstances':self.getInternalResourceInstances()
 				 } 		
 
+	def getInternalResourceInstances(self):
+		internalContainers=[]
+		if self.containerId!=None:
+			container={
+				'id':self.containerId,
+				'name': self.containerName,
+				'type':'docker container'
+			}
+			# as last reported by docker events, left out while they are not being received
+			endpoint=self.getEndpoint()
+			container['endpoint']=endpoint.name
+			if self.placement!=None:
+				container['placement']=self.placement
+			state=endpoint.state.getContainerState(self.containerId)
+			if state!=None:
+				container['state']=state
+			internalContainers.append(container)
+		return internalContainers
+
+# instance detail fields that can be requested on their own
+INSTANCE_DETAIL_FIELDS={
+	'resourceId':lambda i: i.resourceId,
+	'resourceType':lambda i: i.type.name,
+	'resourceName':lambda i: i.name,
+	'createdAt':lambda i: formatTimestamp(i.createdAt),
+	'properties':lambda i: dict(i.properties),
+	'deploymentLocation':lambda i: i.location,
+	'lastModifiedAt':lambda i: formatTimestamp(i.lastModifiedAt),
+	'resourceManagerId':lambda i: globalConfig.configDescriptor['name'],
+	'internalResourceInstances':lambda i: i.getInternalResourceInstances()
+}
+
 ##########################################################################################
 # Resource instance exceptions
 ##########################################################################################
@@ -3,6 +3,10 @@ from controllers.resource.ResourceInstance import ResourceInstance
 
 class VolumeInstance(ResourceInstance):
 	""" Reponsible for running resource instance lifecycles"""
-	
+
+	__slots__=()
+
+	logger=logging.getLogger(__name__)
+
 	def __init__(self, network):
-		self.logger = logging.getLogger(__name__)
+		pass
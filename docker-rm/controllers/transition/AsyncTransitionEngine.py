@@ -0,0 +1,417 @@
+import asyncio
+import logging
+import threading
+from controllers.util.Config import *
+from controllers.util.Metrics import metrics
+from controllers.util.DockerAPI import DockerAPI, DockerAPIException, apiVersionAtLeast, MULTI_NETWORK_API_VERSION
+from controllers.resource.DockerEndpoint import dockerEndpoints
+from controllers.transition.TransitionDeadline import wrapCommand, KILL_COMMAND
+from controllers.transition.TransitionTimings import TransitionTimings
+from controllers.transition.TransitionOutput import TransitionOutput, checkExitCode
+from controllers.util.PropertyArchive import packProperties, unpackProperties, PROPERTIES_DIR, TRANSITION_PROPERTIES, OPERATION_PROPERTIES
+
+NETWORK_TYPE='resource::docker-network::1.0'
+
+class AsyncTransitionEngine:
+	"""
+		Transition engine on an asyncio event loop
+		------------------------------------------
+		Runs the docker side of transitions as coroutines against the Docker
+		Engine API instead of through the synchronous docker SDK, so a
+		transition waiting on docker holds no thread. The loop runs in one
+		background thread; tasks are handed to it with submit and at most
+		maxInFlight of them talk to docker at once. submit blocks the caller
+		while all of them are taken, so transitions behind them wait in the
+		scheduler queue, where they count against its size.
+
+		The docker work mirrors ResourceInstance and DockerNetworkResourceInstance.
+		Each docker endpoint reached over a unix socket gets its own DockerAPI
+		and connection limit, socketPath being the one of the default endpoint.
+		Transitions of instances on tcp endpoints are left to the docker SDK.
+	"""
+	def __init__(self, socketPath='/var/run/docker.sock', apiVersion=None, maxInFlight=1000, maxConnections=64, endpoints=None):
+		self.logger = logging.getLogger(__name__)
+		self.endpoints=endpoints or dockerEndpoints
+		self.apis={}
+		for endpoint in self.endpoints.all():
+			path=endpoint.getSocketPath()
+			if path==None and endpoint.url==None:
+				path=socketPath
+			if path!=None:
+				self.apis[endpoint.name]=DockerAPI(path, endpoint.apiVersion or apiVersion, maxConnections)
+		self.maxInFlight=maxInFlight
+
+		self.loop=None
+		# taken by submit, given back when the task finishes
+		self.slots=threading.BoundedSemaphore(maxInFlight)
+		self.thread=None
+		self.ready=threading.Event()
+
+		self.lock=threading.Lock()
+		# kills in progress, held so they are not garbage collected before they finish
+		self.kills=set()
+		self.inFlight=0
+		self.completed=0
+		self.failed=0
+
+	def start(self):
+		self.logger.debug('starting async transition engine on '+', '.join(api.socketPath for api in self.apis.values()))
+		self.thread=threading.Thread(target=self.runLoop, name='async-transition-engine', daemon=True)
+		self.thread.start()
+		self.ready.wait()
+
+	def runLoop(self):
+		self.loop=asyncio.new_event_loop()
+		asyncio.set_event_loop(self.loop)
+		self.ready.set()
+		self.loop.run_forever()
+
+	def stop(self):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+
+	def submit(self, coroutine):
+		"""
+		run a coroutine on the engine loop, returns a concurrent.futures.Future for its result.
+		blocks until fewer than maxInFlight tasks are running
+		"""
+		self.slots.acquire()
+		with self.lock:
+			self.inFlight=self.inFlight+1
+		try:
+			future=asyncio.run_coroutine_threadsafe(self.counted(coroutine), self.loop)
+		except Exception:
+			coroutine.close()
+			self.release(None)
+			raise
+		future.add_done_callback(self.release)
+		return future
+
+	def release(self, future):
+		with self.lock:
+			self.inFlight=self.inFlight-1
+		self.slots.release()
+
+	async def counted(self, coroutine):
+		try:
+			result=await coroutine
+			with self.lock:
+				self.completed=self.completed+1
+			return result
+		except Exception:
+			with self.lock:
+				self.failed=self.failed+1
+			raise
+
+	def apiFor(self, instance):
+		# the api of the endpoint the instance runs on, None if it is not a unix socket endpoint
+		return self.apis.get(self.endpoints.forInstance(instance).name)
+
+	def networkEndpoints(self, instance):
+		# a network is on every endpoint of its location, the one its id was recorded on first
+		first=self.endpoints.forInstance(instance)
+		return [first]+[e for e in self.endpoints.forLocation(instance.location) if e is not first]
+
+	def handlesEndpoint(self, endpoint):
+		# installs on the endpoint run on the engine rather than the docker SDK
+		return endpoint.name in self.apis
+
+	def handles(self, instance):
+		""" True if the engine can reach every docker endpoint the instance's transitions use """
+		if instance.type.name==NETWORK_TYPE:
+			return all(e.name in self.apis for e in self.networkEndpoints(instance))
+		return self.apiFor(instance)!=None
+
+	def killCommand(self, api, containerId):
+		# called from the deadline's thread, the kill skips the connection limit the hung command holds
+		future=asyncio.run_coroutine_threadsafe(api.execRun(containerId, KILL_COMMAND, limited=False), self.loop)
+		with self.lock:
+			self.kills.add(future)
+		future.add_done_callback(self.killed)
+
+	def killed(self, future):
+		with self.lock:
+			self.kills.discard(future)
+		if future.exception()!=None:
+			self.logger.error('could not kill transition command '+str(future.exception()))
+
+	def getMetrics(self):
+		with self.lock:
+			return {
+				'inFlight':self.inFlight,
+				'maxInFlight':self.maxInFlight,
+				'endpoints':sorted(self.apis),
+				'completed':self.completed,
+				'failed':self.failed
+			}
+
+	# standard transitions and operations
+
+	async def runStandardTransition(self, instance, transitionName, properties, deadline=None, timings=None, output=None):
+		self.logger.debug('running standard transition '+transitionName+' on '+instance.name)
+		timings=timings or TransitionTimings()
+		if instance.type.name==NETWORK_TYPE:
+			return await self.runNetworkTransition(instance, transitionName, timings)
+
+		if transitionName=='uninstall':
+			containerId=instance.containerId or instance.type.imageName+str(instance.resourceId)
+			try:
+				with timings.phase('containerRemove'):
+					await self.apiFor(instance).removeContainer(containerId)
+			except DockerAPIException as ex:
+				self.logger.error('caught exception during uninstall, continuing '+str(ex))
+			return {'status':'OK'}
+
+		if transitionName=='install':
+			await self.startContainer(instance, timings)
+
+		lifecycle=instance.type.lifecyclePath
+		if lifecycle!=None and 'lifecycle' in lifecycle and transitionName in lifecycle['lifecycle']:
+			self.logger.debug('running '+lifecycle['lifecycle'][transitionName]+' from lifecycle config')
+			return await self.runCommand(instance, lifecycle['lifecycle'][transitionName], deadline=deadline, timings=timings, output=output)
+		self.logger.error('no lifecycle config found for transition '+transitionName)
+		return None
+
+	async def runOperation(self, instance, operationName, properties, deadline=None, timings=None, output=None):
+		self.logger.debug('running operation '+operationName+' with properties '+str(properties))
+		if instance.type.name==NETWORK_TYPE:
+			self.logger.error('should not try to run operations on a docker-network')
+			return None
+
+		if operationName in ('addNetwork', 'removeNetwork'):
+			networkid=properties.get('networkid')
+			if networkid==None:
+				self.logger.error('no network id provided')
+				return None
+			networkid=instance.resolveNetwork(networkid)
+			if operationName=='addNetwork':
+				await self.apiFor(instance).connectNetwork(networkid, instance.containerId)
+			else:
+				await self.apiFor(instance).disconnectNetwork(networkid, instance.containerId)
+			return {'status':'OK','containerId':instance.containerId}
+
+		operations=instance.type.operationsPath
+		if operations!=None and 'operations' in operations and operationName in operations['operations']:
+			self.logger.debug('running '+operations['operations'][operationName]+' from operations config')
+			return await self.runCommand(instance, operations['operations'][operationName], properties, False, deadline, timings, output)
+		self.logger.error('no operations config found for operation '+operationName)
+		return None
+
+	# containers
+
+	async def startContainer(self, instance, timings):
+		# warm container pools are left to the docker SDK path, every install here creates its container
+		api=self.apiFor(instance)
+		images=self.endpoints.forInstance(instance).images
+		# only images not already known to the endpoint's image cache are checked with docker
+		with timings.phase('imageLookup'):
+			if images.peek(instance.type.imageName)==None:
+				generation=images.generation
+				try:
+					images.put(instance.type.imageName, await api.inspectImage(instance.type.imageName), generation)
+				except DockerAPIException as ex:
+					if ex.status==404:
+						raise ImageNotFoundException(instance.type.imageName)
+					raise
+
+		envlist=['RM_PROP_'+str(key)+'='+str(value) for key, value in instance.properties.items()]
+		network=instance.properties.get('docker_network') or 'bridge'
+		hostname=instance.properties.get('docker_hostname') or instance.name
+		name=instance.type.imageName+str(instance.resourceId)
+
+		# every docker_networkN property names another network to attach, all found in one lookup
+		extraNetworks=[(key[len('docker_network'):], value) for key, value in instance.properties.items()
+						if key.startswith('docker_network') and len(key)>len('docker_network') and value]
+		attach=[]
+		if len(extraNetworks)>0 and network=='host':
+			self.logger.error('a container on the host network cannot join other networks, ignoring '+str([value for suffix, value in extraNetworks]))
+		elif len(extraNetworks)>0:
+			with timings.phase('networkLookup'):
+				found={}
+				for attrs in await api.listNetworks(sorted(set(value for suffix, value in extraNetworks))):
+					found[attrs['Id']]=attrs['Name']
+					found[attrs['Name']]=attrs['Name']
+			for suffix, value in extraNetworks:
+				if value in found:
+					attach.append((suffix, found[value]))
+				else:
+					self.logger.error('could not find network '+str(value))
+
+		# later api versions join every network at create, earlier ones only the first so the
+		# others are connected before the container starts
+		connectAtCreate=apiVersionAtLeast(await api.getApiVersion(), MULTI_NETWORK_API_VERSION)
+		endpointsConfig={network:{}}
+		if connectAtCreate:
+			for suffix, extraNetwork in attach:
+				endpointsConfig[extraNetwork]={}
+
+		self.logger.debug('creating docker container '+name+' on networks '+str(list(endpointsConfig)))
+		config={
+			'Image':instance.type.imageName,
+			'Hostname':hostname,
+			'Env':envlist,
+			'HostConfig':{
+				'NetworkMode':network,
+				'Privileged':True,
+				'Binds':['/sys/fs/cgroup:/sys/fs/cgroup:ro']
+			},
+			'NetworkingConfig':{'EndpointsConfig':endpointsConfig}
+		}
+		with timings.phase('containerRun'):
+			containerId=await api.createContainer(name, config)
+			try:
+				if not connectAtCreate:
+					for suffix, extraNetwork in attach:
+						await api.connectNetwork(extraNetwork, containerId)
+				await api.startContainer(containerId)
+			except DockerAPIException:
+				# do not leave a container behind that never started
+				self.logger.debug('removing container that was created with error: '+name)
+				await api.removeContainer(containerId)
+				raise
+
+		instance.containerId=containerId
+		instance.containerName=name
+
+		# one inspect has the address on every network
+		with timings.phase('containerReload'):
+			details=await api.inspectContainer(containerId)
+		networks=details['NetworkSettings']['Networks']
+		if network=='host':
+			# no ip address is allocated on the host network
+			instance.properties['docker_ipaddr']='HOSTIP'
+		elif network in networks:
+			instance.properties['docker_ipaddr']=networks[network]['IPAddress']
+		for suffix, extraNetwork in attach:
+			ipaddrProp='docker_ipaddr'+suffix
+			if ipaddrProp in instance.properties and extraNetwork in networks:
+				instance.properties[ipaddrProp]=networks[extraNetwork]['IPAddress']
+
+	async def runCommand(self, instance, cmd, properties=None, isTransition=True, deadline=None, timings=None, output=None):
+		timings=timings or TransitionTimings()
+		if instance.containerId==None:
+			self.logger.error('no running container found')
+			return None
+		self.logger.info('***TRANSITION: '+str(cmd)+' created on RESOURCE: '+instance.name+'***')
+
+		# update properties on the container before running the command
+		api=self.apiFor(instance)
+		props=properties if properties!=None else dict(instance.properties)
+		target=TRANSITION_PROPERTIES if isTransition else OPERATION_PROPERTIES
+		with timings.phase('sendProperties'):
+			await api.putArchive(instance.containerId, PROPERTIES_DIR, packProperties(target, props))
+
+		# stdout and stderr go to the transition's output as they arrive
+		output=output or TransitionOutput()
+		with timings.phase('lifecycleExec' if isTransition else 'operationExec'):
+			if deadline==None:
+				exitCode, ignored=await api.execRun(instance.containerId, [cmd], onOutput=output.write)
+			else:
+				# a timeout or cancel kills the command from another thread, which ends the exec
+				containerId=instance.containerId
+				with deadline.guard(lambda: self.killCommand(api, containerId)):
+					exitCode, ignored=await api.execRun(containerId, wrapCommand(cmd), onOutput=output.write)
+		output.exited(exitCode)
+		checkExitCode(output, cmd, instance.name)
+
+		# collect any property changes after the command runs
+		with timings.phase('getProperties'):
+			try:
+				propYaml=unpackProperties(await api.getArchive(instance.containerId, TRANSITION_PROPERTIES))
+			except DockerAPIException as ex:
+				self.logger.error('could not read properties from '+instance.name+' '+str(ex))
+				propYaml=None
+		if propYaml!=None:
+			for p in list(instance.properties):
+				if p in propYaml:
+					instance.properties[p]=propYaml[p]
+
+		self.logger.info('***TRANSITION: '+str(cmd)+' complete on RESOURCE: '+instance.name+'***')
+		return {'status':'OK','containerId':instance.containerId}
+
+	# networks
+
+	async def runNetworkTransition(self, instance, transitionName, timings):
+		if transitionName=='install':
+			instance.properties['bridgename']='net'+str(instance.resourceId)
+			config={
+				'Name':instance.properties['networkname'],
+				'Driver':'bridge',
+				'CheckDuplicate':True,
+				'Options':{'com.docker.network.bridge.name':instance.properties['bridgename']},
+				'IPAM':{
+					'Driver':'default',
+					'Config':[{'Subnet':instance.properties['subnet'], 'Gateway':instance.properties['gateway']}]
+				}
+			}
+			# containers of the location may run on any of its endpoints, each gets the network
+			endpoints=self.networkEndpoints(instance)
+			with timings.phase('networkCreate'):
+				networkIds=[]
+				try:
+					for endpoint in endpoints:
+						networkIds.append(await self.apis[endpoint.name].createNetwork(config))
+				except DockerAPIException:
+					# a network left on some endpoints would block installing it again
+					for endpoint, networkId in zip(endpoints, networkIds):
+						try:
+							await self.apis[endpoint.name].removeNetwork(networkId)
+						except DockerAPIException as ex:
+							self.logger.error('could not remove network on docker endpoint '+endpoint.name+' '+str(ex))
+					raise
+			# the id reported is the one on the first endpoint
+			instance.properties['networkid']=networkIds[0]
+			instance.endpoint=endpoints[0].name
+			self.logger.debug('created network '+instance.properties['networkid'])
+			return {'status':'OK'}
+
+		if transitionName=='uninstall':
+			if instance.readonly:
+				self.logger.debug('cannot delete read only docker networks')
+				return {'status':'OK'}
+			with timings.phase('networkRemove'):
+				endpoints=self.networkEndpoints(instance)
+				failures=[]
+				missing=[]
+				# every endpoint is tried, so a retry only has the failed ones left to remove
+				for endpoint in endpoints:
+					# the id is only known on the first endpoint, the others have a network of the same name
+					key=instance.properties['networkid'] if endpoint is self.endpoints.forInstance(instance) else instance.properties['networkname']
+					try:
+						await self.apis[endpoint.name].removeNetwork(key)
+					except DockerAPIException as ex:
+						if ex.status==404:
+							missing.append((endpoint.name, ex))
+						else:
+							self.logger.error('cannot remove network on docker endpoint '+endpoint.name+' '+str(ex))
+							failures.append((endpoint.name, ex))
+				# already gone from an endpoint is fine, unless it was not on any
+				if len(missing)==len(endpoints):
+					failures=missing
+				if len(failures)>0:
+					raise NetworkRemoveException(instance.properties['networkname'], failures)
+			return {'status':'OK'}
+		return None
+
+# the image for a resource type is not available to docker
+class ImageNotFoundException(Exception):
+	def __init__(self, imageName):
+		super().__init__('no image found called '+imageName)
+		self.imageName=imageName
+
+# a network could not be removed from some of the docker endpoints of its location
+class NetworkRemoveException(Exception):
+	def __init__(self, networkName, failures):
+		self.failures=failures
+		self.message='cannot remove network '+networkName+' on docker endpoints '+', '.join(name+' ('+str(ex)+')' for name, ex in failures)
+		super().__init__(self.message)
+
+# engine shared by every transition task, None runs transitions with the docker SDK on the scheduler workers
+engineConfig=globalConfig.configDescriptor.get('engine') or {}
+transitionEngine=None
+if engineConfig.get('type', 'sync')=='async':
+	transitionEngine=AsyncTransitionEngine(socketPath=engineConfig.get('socket', '/var/run/docker.sock'),
+										apiVersion=engineConfig.get('apiVersion'),
+										maxInFlight=engineConfig.get('maxInFlight', 1000),
+										maxConnections=engineConfig.get('maxConnections', 64))
+	transitionEngine.start()
+	metrics.register('asyncTransitionEngine', transitionEngine.getMetrics)
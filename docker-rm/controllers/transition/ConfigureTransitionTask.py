@@ -7,5 +7,5 @@ class ConfigureTransitionTask(TransitionTask):
 		self.logger = logging.getLogger(__name__)
 
 	def run(self):
-		super().run('configure')
+		return super().run('configure')
 
@@ -2,6 +2,8 @@ import logging
 from controllers.transition.TransitionTasks import TransitionTask
 from controllers.transition.TransitionTasks import MissingPropertiesException
 from controllers.util.Config import *
+from controllers.resource.Placement import placementEngine
+from controllers.resource.ResourceInstance import removeResourceInstance
 import controllers.ResourceManager
 
 class InstallTransitionTask(TransitionTask):
@@ -54,13 +56,22 @@ class InstallTransitionTask(TransitionTask):
 				self.transition.properties
 				)
 		self.resourceId=self.resourceInstance.resourceId
+
+		# networks are on every endpoint of their location, containers go on the one placement picks
+		if not resourceType.internal:
+			try:
+				if placementEngine.place(self.resourceInstance)==None:
+					raise controllers.ResourceManager.ImageNotAvailableException(resourceType.name, resourceType.imageName)
+			except Exception:
+				removeResourceInstance(self.resourceId)
+				raise
 		
 		self.logger.debug('instance to be run='+str(self.resourceInstance.resourceId))
 
 	def run(self):
 		self.logger.debug('running install transition')
 
-		super().run('install')
+		return super().run('install')
 
 	def validateProperties(self):
 		self.logger.debug('validating install properties are there')
@@ -7,5 +7,5 @@ class IntegrityTransitionTask(TransitionTask):
 		self.logger = logging.getLogger(__name__)
 
 	def run(self):
-		super().run('integrity')
+		return super().run('integrity')
 
@@ -0,0 +1,35 @@
+import re
+from controllers.util.Timestamp import formatTimestamp
+
+def buildLifecycleEvent(transition, resourceInstance):
+	""" build the kafka lifecycle event for a finished transition from in memory state only """
+	kafkaMessage=transition.getTransitionRequestStatus()
+
+	internalResourceInstance={
+		'name':resourceInstance.name,
+		'type':re.sub('[:.-]','_',resourceInstance.type.name),
+	}
+	if resourceInstance.type.name == "resource::docker-network::1.0":
+		if 'networkid' in resourceInstance.properties:
+			internalResourceInstance['id']=resourceInstance.properties['networkid']
+	else:
+		internalResourceInstance['id']=resourceInstance.getID()
+
+	instance={
+		'resourceId':resourceInstance.resourceId,
+		'metricKey':transition.metricKey,
+		'resourceName':resourceInstance.name,
+		'resourceType':resourceInstance.type.name,
+		'resourceManagerId':transition.resourceManagerId,
+		'deploymentLocation':transition.deploymentLocation,
+		'properties':dict(resourceInstance.properties),
+		'createdAt': formatTimestamp(resourceInstance.createdAt),
+		'lastModifiedAt':formatTimestamp(resourceInstance.lastModifiedAt),
+		'internalResourceInstances':[internalResourceInstance],
+	}
+	kafkaMessage['transitionName']=transition.transitionName
+	kafkaMessage['resourceManagerId']=transition.resourceManagerId
+	kafkaMessage['deploymentLocation']=transition.deploymentLocation
+	kafkaMessage['resourceInstance']=instance
+
+	return kafkaMessage
@@ -15,4 +15,4 @@ class OperationTransitionTask(TransitionTask):
 		super().validateOperationProperties(self.transition.transitionName, instance.type)
 		
 	def run(self):
-		super().run(self.transition.transitionName,False)
+		return super().run(self.transition.transitionName,False)
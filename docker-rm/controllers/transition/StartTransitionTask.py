@@ -7,5 +7,5 @@ class StartTransitionTask(TransitionTask):
 		self.logger = logging.getLogger(__name__)
 
 	def run(self):
-		super().run('start')
+		return super().run('start')
 
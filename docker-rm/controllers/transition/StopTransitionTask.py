@@ -7,4 +7,4 @@ class StopTransitionTask(TransitionTask):
 		self.logger = logging.getLogger(__name__)
 
 	def run(self):
-		super().run('stop')
+		return super().run('stop')
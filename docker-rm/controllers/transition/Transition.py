@@ -1,6 +1,6 @@
 import logging
 import threading
-from datetime import datetime, timezone
+import time
 from controllers.util.DB import *
 from controllers.transition.TransitionTasks import *
 from controllers.transition.InstallTransitionTask import InstallTransitionTask
@@ -10,31 +10,61 @@ from controllers.transition.IntegrityTransitionTask import IntegrityTransitionTa
 from controllers.transition.StopTransitionTask import StopTransitionTask
 from controllers.transition.UninstallTransitionTask import UninstallTransitionTask
 from controllers.transition.OperationTransitionTask import OperationTransitionTask
+from controllers.transition.TransitionScheduler import transitionScheduler, TransitionQueueFullException
 from controllers.resource.ResourceInstance import *
 from controllers.util.Kafka import *
 from controllers.util.Config import *
 from controllers.ResourceManager import *
 from controllers.resource.Resource import Resource
+from controllers.util.Timestamp import formatTimestamp, parseTimestamp
+from controllers.transition.TransitionTimings import TransitionTimings
+from controllers.transition.TransitionOutput import transitionOutputs
 
 # placeholder for generating transition ids
 transitionId=0
 
+# transitions accepted and not finished yet, by request id, so they can be cancelled
+liveTransitions={}
+liveTransitionsLock=threading.Lock()
+
+def findLiveTransition(requestId):
+	with liveTransitionsLock:
+		return liveTransitions.get(requestId)
+
+def reserveTransitionIds(maxRequestId):
+	# make sure new requests are numbered above any request id already stored
+	global transitionId
+	if maxRequestId>transitionId:
+		transitionId=maxRequestId
+
 class Transition:
 	""" 
 		Transition object
 	    -----------------
 	    Manages a unique transition request, and all asynchronus running tasks 
-	    that are executing it.
+	    that are executing it. Times are kept as epoch seconds and only
+	    formatted when the status is built, the time spent in each phase is
+	    kept in timings.
 	"""
-	def __init__(self, transitionRequest=None):
-		self.logger = logging.getLogger(__name__)
+	__slots__=('startedAt','requestState','requestStateReason','finishedAt','requestId','properties',
+			'resourceName','metricKey','resourceId','resourceTypeName','resourceManagerId',
+			'deploymentLocation','transitionName','dependsOn','acceptedAt','timings','eid','task','resourceInstance')
+
+	logger=logging.getLogger(__name__)
+
+	def __init__(self, transitionRequest=None, persist=True):
 		self.logger.debug('creating a new transition')
 		self.logger.debug(transitionRequest)
 
-		self.startedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
-		self.requestState='IN_PROGRESS'		
+		self.startedAt=time.time()
+		# monotonic, for the time spent waiting to run
+		self.acceptedAt=time.monotonic()
+		self.timings=TransitionTimings()
+		# accepted transitions wait as PENDING until a worker runs them
+		self.requestState='PENDING'
 		self.requestStateReason=''
-		self.finishedAt=''
+		self.finishedAt=None
+		self.eid=None
 		self.requestId=0
 		self.properties=None
 		self.resourceName=None
@@ -44,6 +74,8 @@ class Transition:
 		self.resourceManagerId=None
 		self.deploymentLocation=None
 		self.transitionName=None
+		# request ids this transition waits on when it is part of a batch
+		self.dependsOn=None
 		
 		if transitionRequest!=None:
 			if 'properties' in transitionRequest:
@@ -67,8 +99,9 @@ class Transition:
 			global transitionId
 			transitionId=transitionId+1
 			self.requestId=transitionId
-			#save to db
-			self.eid=dbClient.createNewTransitionRequest(self.getTransitionRequestStatus())
+			#save to db, a batch saves all of its transitions together once they are parsed
+			if persist:
+				self.eid=dbClient.createNewTransitionRequest(self.getTransitionRequestStatus())
 
 		self.task=None
 		self.resourceInstance=None
@@ -160,11 +193,11 @@ class Transition:
 		else:
 			self.requestId-dbRequest.requestId
 			self.transitionName=dbRequest.transitionName
-			self.startedAt=dbRequest.startedAt
+			self.startedAt=parseTimestamp(dbRequest.startedAt)
 			self.properties=dbRequest.properties
 			self.deploymentLocation=dbRequest.deploymentLocation
 			self.resourceName=dbRequest.resourceName
-			self.finishedAt=dbRequest.finishedAt
+			self.finishedAt=parseTimestamp(dbRequest.finishedAt)
 			self.requestState=dbRequest.requestState
 			self.requestStateReason=dbRequest.requestStateReason
 			self.eid-dbRequest.eid
@@ -173,9 +206,35 @@ class Transition:
 		self.logger.debug('updating transition in database')
 		dbClient.updateTransitionRequest(self.eid, self.getTransitionRequestStatus())
 
+	def updateTimings(self):
+		# phases timed after the last status update
+		dbClient.updateTransitionRequest(self.eid, {'timings':self.timings.asDict()})
+
 	def delete(self):
 		self.logger.debug('deleting transition with request id '+str(self.requestId))
-		dbClient.removeTransition(self.eid)
+		self.unregister()
+		transitionOutputs.close(self.requestId)
+		if self.eid!=None:
+			dbClient.removeTransition(self.eid)
+
+	def register(self):
+		with liveTransitionsLock:
+			liveTransitions[self.requestId]=self
+
+	def unregister(self):
+		with liveTransitionsLock:
+			liveTransitions.pop(self.requestId, None)
+
+	def cancel(self, reason='Transition cancelled'):
+		""" stop the transition, returns False if it has already finished """
+		self.logger.debug('cancelling transition with request id '+str(self.requestId))
+		return self.task.cancel(reason)
+
+	def discard(self):
+		# an install that never runs must not leave its new instance behind
+		if self.task!=None and self.transitionName.lower()=='install':
+			removeResourceInstance(self.task.resourceInstance.resourceId)
+		transitionOutputs.close(self.requestId)
 
 	def getTransitionRequestStatus(self):
 		self.logger.debug('get transition request called')
@@ -184,16 +243,21 @@ class Transition:
 			'AsynchronousTransitionResponses':globalConfig.configDescriptor['supportedFeatures']['asynchronousTransitionResponse']
 			}
 
-		return {'requestId': self.requestId,
-				'finishedAt':self.finishedAt,
+		status={'requestId': self.requestId,
+				'finishedAt':formatTimestamp(self.finishedAt),
 				'requestId':self.requestId,
 				'requestState':self.requestState,
 				'requestStateReason': self.requestStateReason,
 				'resourceId': str(self.resourceId),
-				'startedAt':self.startedAt,
+				'startedAt':formatTimestamp(self.startedAt),
 				'context':context,
 				'transitionName':self.transitionName
 				}
+		if self.dependsOn!=None:
+			status['dependsOnRequestIds']=self.dependsOn
+		if len(self.timings.phases)>0:
+			status['timings']=self.timings.asDict()
+		return status
 
 	def getTransitionRequestResponse(self):
 		self.logger.debug('get transition request called')
@@ -206,20 +270,27 @@ class Transition:
 				'context':context
 				}
 
-	def runTransition(self):
+	def runTransition(self, onComplete=None):
 		""" 
-		Spawn a thread that runs a transition, return response and when thread completes
+		Queue the transition for a scheduler worker, return response and when the task completes
 		  - update status of thread in DB
 		  - send notification on Kafka if it is configured
+		  - call onComplete if given
 		"""
 		self.logger.debug('running run Transition')
 
 		if self.task !=None:
-			self.logger.debug('running transition '+self.transitionName+' on resource instance '+str(self.task.resourceInstance.resourceId))
-			self.task.start()
+			self.logger.debug('queueing transition '+self.transitionName+' on resource instance '+str(self.task.resourceInstance.resourceId))
+			self.register()
+			try:
+				queuePosition=transitionScheduler.submit(self.task, self.transitionName, self.task.resourceInstance.resourceId, self.requestId, onComplete)
+			except TransitionQueueFullException:
+				self.discard()
+				raise
 		else:
 			raise Exception()
 
-		self.finishedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
-
-		return self.getTransitionRequestResponse()
+		response=self.getTransitionRequestResponse()
+		if response['requestState']=='PENDING':
+			response['queuePosition']=queuePosition
+		return response
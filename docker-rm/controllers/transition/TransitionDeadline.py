@@ -0,0 +1,96 @@
+import logging
+import shlex
+import threading
+from contextlib import contextmanager
+from controllers.util.Config import *
+
+# lifecycle and operation commands record their pid here so they can be killed
+PIDFILE='/tmp/rm-transition.pid'
+KILL_COMMAND=['/bin/sh', '-c', 'pid=$(cat '+PIDFILE+' 2>/dev/null) && { pkill -KILL -P $pid 2>/dev/null; kill -KILL $pid; }; rm -f '+PIDFILE]
+
+# seconds between kills while a stopped command is still running, it may not have written its pid yet
+KILL_RETRY=1.0
+
+def wrapCommand(cmd):
+	# the shell replaces itself with the command, so the recorded pid is the command's
+	return ['/bin/sh', '-c', 'echo $$ > '+PIDFILE+'; exec '+shlex.quote(cmd)]
+
+class TransitionDeadline:
+	"""
+		Timeout and cancellation of one transition
+		------------------------------------------
+		The timeout runs from the start of the transition. Commands run in the
+		container are guarded with a function that kills them, so when the
+		timeout expires or the transition is cancelled while a command runs the
+		exec returns and the worker is released. The kill is repeated until the
+		command returns, in case it had not recorded its pid yet. Once stopped,
+		guarding another command raises TransitionStoppedException without
+		running it.
+	"""
+	def __init__(self, timeout=None):
+		self.logger = logging.getLogger(__name__)
+		# seconds, None or 0 for no limit
+		self.timeout=timeout
+		self.lock=threading.Lock()
+		self.reason=None
+		self.kill=None
+		self.timer=None
+
+	def start(self):
+		if self.timeout:
+			self.timer=threading.Timer(self.timeout, self.stop, args=('Transition timed out after '+str(self.timeout)+' seconds',))
+			self.timer.daemon=True
+			self.timer.start()
+
+	def finish(self):
+		if self.timer!=None:
+			self.timer.cancel()
+
+	def stop(self, reason):
+		""" stop the transition, killing the command it is running """
+		with self.lock:
+			if self.reason!=None:
+				return
+			self.reason=reason
+		self.logger.info(reason)
+		self.killCommand()
+
+	def killCommand(self):
+		with self.lock:
+			kill=self.kill
+		if kill==None:
+			return
+		try:
+			kill()
+		except Exception as ex:
+			self.logger.error('could not kill transition command '+str(type(ex).__name__)+' '+str(ex))
+		retry=threading.Timer(KILL_RETRY, self.killCommand)
+		retry.daemon=True
+		retry.start()
+
+	def check(self):
+		if self.reason!=None:
+			raise TransitionStoppedException(self.reason)
+
+	@contextmanager
+	def guard(self, kill):
+		""" run the body with kill as the way to stop it, raises TransitionStoppedException if it was stopped """
+		with self.lock:
+			self.check()
+			self.kill=kill
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.kill=None
+		self.check()
+
+# a transition timed out or was cancelled, reason says which
+class TransitionStoppedException(Exception):
+	def __init__(self, reason):
+		super().__init__(reason)
+		self.reason=reason
+
+# seconds a transition may run when neither lifecycle.yaml nor operations.yaml sets a timeout
+transitionsConfig=globalConfig.configDescriptor.get('transitions') or {}
+DEFAULT_TIMEOUT=transitionsConfig.get('timeout')
@@ -0,0 +1,154 @@
+import logging
+import threading
+
+class TransitionGraph:
+	"""
+		Batch of transitions run in dependency order
+		--------------------------------------------
+		A transition in a batch can depend on others in the same batch. It is
+		handed to the scheduler as soon as every transition it depends on has
+		COMPLETED, so independent branches run in parallel. When a transition
+		does not complete, every transition downstream of it is marked FAILED
+		without running.
+
+		transitions maps batch positions to accepted transitions and parents
+		maps the same positions to the positions they depend on, as returned
+		by resolveDependencies.
+	"""
+	def __init__(self, transitions, parents):
+		self.logger = logging.getLogger(__name__)
+		self.transitions=transitions
+		self.lock=threading.Lock()
+		# position -> positions waiting on it
+		self.children={}
+		# position -> parents that have not completed yet
+		self.remaining={}
+		# positions failed because of a parent
+		self.failed=set()
+		for position in transitions:
+			self.remaining[position]=len(parents[position])
+			for parent in parents[position]:
+				self.children.setdefault(parent, []).append(position)
+
+	def start(self):
+		""" queue every transition without dependencies, returns position -> response, or the exception that refused it """
+		results={}
+		# taken before anything runs, a fast parent can make its children ready while this loops
+		roots=[position for position in sorted(self.transitions) if self.remaining[position]==0]
+		for position in roots:
+			try:
+				results[position]=self.submit(position)
+			except Exception as ex:
+				self.logger.error('could not queue transition at position '+str(position)+' '+str(ex))
+				results[position]=ex
+				self.failDependents(position)
+		# the rest are PENDING in the store until their parents complete, or already FAILED
+		for position in sorted(self.transitions):
+			if position not in results:
+				results[position]=self.transitions[position].getTransitionRequestResponse()
+		return results
+
+	def submit(self, position):
+		return self.transitions[position].runTransition(lambda: self.completed(position))
+
+	def completed(self, position):
+		# called by the scheduler once the transition at position has finished
+		transition=self.transitions[position]
+		if transition.requestState!='COMPLETED':
+			self.logger.debug('request '+str(transition.requestId)+' did not complete, failing its dependents')
+			self.failDependents(position)
+			return
+
+		ready=[]
+		with self.lock:
+			for child in self.children.get(position, ()):
+				self.remaining[child]=self.remaining[child]-1
+				if self.remaining[child]==0 and child not in self.failed:
+					ready.append(child)
+		for child in ready:
+			try:
+				self.submit(child)
+			except Exception as ex:
+				reason=getattr(ex, 'message', str(ex))
+				self.logger.error('could not queue request '+str(self.transitions[child].requestId)+' '+str(reason))
+				self.fail(child, 'Could not be queued: '+str(reason))
+				self.failDependents(child)
+
+	def failDependents(self, position):
+		failed=[]
+		with self.lock:
+			pending=list(self.children.get(position, ()))
+			while len(pending)>0:
+				child=pending.pop()
+				if child in self.failed:
+					continue
+				self.failed.add(child)
+				failed.append(child)
+				pending.extend(self.children.get(child, ()))
+
+		reason='Dependency request '+str(self.transitions[position].requestId)+' did not complete'
+		for child in sorted(failed):
+			self.fail(child, reason)
+
+	def fail(self, position, reason):
+		# a transition that has not started fails as if it had been cancelled
+		self.transitions[position].cancel(reason)
+
+def resolveDependencies(dependsOn, size):
+	"""
+	dependsOn maps the position of each valid request in a batch of size requests
+	to the positions it depends on. Returns the parents of every request that can
+	run, and the exception refusing each of the others: bad positions, dependency
+	cycles, and dependencies on a refused request.
+	"""
+	parents={}
+	errors={}
+	for position, positions in dependsOn.items():
+		positions=positions or []
+		bad=[p for p in positions if isinstance(p, bool) or not isinstance(p, int) or p<0 or p>=size or p==position]
+		if len(bad)>0:
+			errors[position]=InvalidDependencyException('dependsOn must list positions of other requests in the batch, found '+str(bad))
+		else:
+			parents[position]=sorted(set(positions))
+
+	# visit requests in dependency order so a refusal reaches everything downstream of it
+	refused=set(range(size))-set(parents)
+	children={}
+	remaining={}
+	for position, positions in parents.items():
+		remaining[position]=0
+		for parent in positions:
+			if parent in parents:
+				remaining[position]=remaining[position]+1
+				children.setdefault(parent, []).append(position)
+	ready=[position for position in parents if remaining[position]==0]
+	accepted={}
+	while len(ready)>0:
+		position=ready.pop()
+		refusedParents=[parent for parent in parents[position] if parent in refused]
+		if len(refusedParents)>0:
+			errors[position]=DependencyRefusedException(refusedParents[0])
+			refused.add(position)
+		else:
+			accepted[position]=parents[position]
+		for child in children.get(position, ()):
+			remaining[child]=remaining[child]-1
+			if remaining[child]==0:
+				ready.append(child)
+
+	# whatever was never visited is in, or downstream of, a cycle
+	for position in parents:
+		if position not in accepted and position not in errors:
+			errors[position]=InvalidDependencyException('request at position '+str(position)+' is part of, or depends on, a dependency cycle')
+	return accepted, errors
+
+# a batch request has a dependsOn that cannot be run
+class InvalidDependencyException(Exception):
+	def __init__(self, message):
+		self.message=message
+
+# a batch request depends on a request of the same batch that was refused
+class DependencyRefusedException(Exception):
+	def __init__(self, position):
+		self.position=position
+		self.message='Depends on the request at position '+str(position)+' which was refused'
@@ -0,0 +1,221 @@
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import deque
+from controllers.util.Config import *
+from controllers.util.Metrics import metrics
+
+STREAMS=('stdout', 'stderr')
+
+# characters of stderr quoted in the failure reason of a command
+REASON_LENGTH=500
+
+class TransitionOutput:
+	"""
+		Output of the commands run by one transition
+		--------------------------------------------
+		stdout and stderr kept apart as the exec delivers them, each piece
+		numbered in order so a reader can follow from the last one it saw.
+		At most maxBytes of each stream are kept, so a chatty stdout cannot
+		push out the stderr that explains a failure. The oldest pieces are
+		dropped first and dropped counts the bytes that went. exitCode is
+		that of the last command, and close marks the transition finished so
+		readers stop.
+	"""
+	def __init__(self, requestId=None, maxBytes=65536):
+		self.requestId=requestId
+		self.maxBytes=maxBytes
+		self.lock=threading.Lock()
+		# (number, stream, bytes) of each stream in the order they were written
+		self.chunks=dict((stream, deque()) for stream in STREAMS)
+		self.sizes=dict((stream, 0) for stream in STREAMS)
+		self.last=0
+		self.dropped=0
+		self.totals=dict((stream, 0) for stream in STREAMS)
+		self.exitCode=None
+		self.closed=False
+
+	def write(self, stream, data):
+		""" add output of stream, stdout or stderr, dropping its oldest output past maxBytes """
+		if len(data)==0:
+			return
+		with self.lock:
+			self.totals[stream]=self.totals[stream]+len(data)
+			if len(data)>self.maxBytes:
+				self.dropped=self.dropped+len(data)-self.maxBytes
+				data=data[-self.maxBytes:]
+			self.last=self.last+1
+			chunks=self.chunks[stream]
+			chunks.append((self.last, stream, data))
+			self.sizes[stream]=self.sizes[stream]+len(data)
+			while self.sizes[stream]>self.maxBytes:
+				number, oldStream, old=chunks.popleft()
+				self.sizes[stream]=self.sizes[stream]-len(old)
+				self.dropped=self.dropped+len(old)
+
+	def exited(self, exitCode):
+		self.exitCode=exitCode
+
+	def close(self):
+		with self.lock:
+			self.closed=True
+
+	def read(self, after=0):
+		""" the pieces kept that come after number after, and whether no more will be written """
+		with self.lock:
+			if self.last<=after:
+				return [], self.closed
+			return list(heapq.merge(*[[chunk for chunk in self.chunks[stream] if chunk[0]>after] for stream in STREAMS])), self.closed
+
+	def follow(self, after=0, sleep=time.sleep, poll=0.25, heartbeat=15.0):
+		"""
+		yield lists of new pieces until the transition is closed, an empty list every heartbeat
+		seconds without output. sleep waits between polls, so a server on greenlets can pass its own
+		"""
+		quiet=0.0
+		while True:
+			chunks, closed=self.read(after)
+			if len(chunks)>0:
+				after=chunks[-1][0]
+				quiet=0.0
+				yield chunks
+			elif quiet>=heartbeat:
+				quiet=0.0
+				yield chunks
+			if closed:
+				return
+			if len(chunks)==0:
+				sleep(poll)
+				quiet=quiet+poll
+
+	def events(self, after=0, follow=True, sleep=time.sleep):
+		"""
+		the output after number after as server-sent events, one per piece with the stream as its event
+		and its number as its id, then an end event with the summary once the transition has finished.
+		follow keeps the stream open until then
+		"""
+		if follow:
+			batches=self.follow(after, sleep)
+		else:
+			batches=[self.read(after)[0]]
+		for chunks in batches:
+			if len(chunks)==0:
+				# a comment keeps proxies from closing a quiet stream
+				yield ': waiting\n\n'
+			for number, stream, data in chunks:
+				# a carriage return would also end an event line, so it is sent as a new line
+				lines=data.decode('utf-8', 'replace').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+				yield 'id: '+str(number)+'\nevent: '+stream+'\n'+''.join('data: '+line+'\n' for line in lines)+'\n'
+		summary=self.getSummary()
+		if summary['closed']:
+			yield 'event: end\ndata: '+json.dumps(summary)+'\n\n'
+
+	def getText(self, stream):
+		with self.lock:
+			return b''.join(data for number, s, data in self.chunks[stream]).decode('utf-8', 'replace')
+
+	def tail(self, stream, length=REASON_LENGTH):
+		# the end of what is kept of a stream, on one line
+		text=' '.join(line.strip() for line in self.getText(stream).splitlines() if line.strip()!='')
+		return text[-length:]
+
+	def describe(self):
+		return 'exit code '+str(self.exitCode)+', '+str(self.totals['stdout'])+' bytes of stdout, '+str(self.totals['stderr'])+' bytes of stderr'
+
+	def getSummary(self):
+		with self.lock:
+			return {
+				'exitCode':self.exitCode,
+				'stdoutBytes':self.totals['stdout'],
+				'stderrBytes':self.totals['stderr'],
+				'droppedBytes':self.dropped,
+				'closed':self.closed
+			}
+
+class TransitionOutputs:
+	"""
+		Command output of recent transitions by request id
+		--------------------------------------------------
+		A transition's output is kept from the time it is accepted until keep
+		later transitions have finished, so it can be tailed while it runs and
+		read for a while after. Output is only logged as a summary line, and
+		in full at debug level, so writing it costs no log I/O on the exec.
+	"""
+	def __init__(self, maxBytes=65536, keep=200):
+		self.logger = logging.getLogger(__name__)
+		self.maxBytes=maxBytes
+		self.keep=keep
+		self.lock=threading.Lock()
+		self.outputs={}
+		# request ids of finished transitions, oldest first
+		self.finished=deque()
+		self.failedCommands=0
+
+	def open(self, requestId):
+		""" the output of a transition, created when it has none """
+		with self.lock:
+			output=self.outputs.get(requestId)
+			if output==None:
+				output=TransitionOutput(requestId, self.maxBytes)
+				self.outputs[requestId]=output
+			return output
+
+	def get(self, requestId):
+		with self.lock:
+			return self.outputs.get(requestId)
+
+	def close(self, requestId):
+		""" mark a transition finished, dropping the output of the oldest finished ones past keep """
+		with self.lock:
+			output=self.outputs.get(requestId)
+			if output==None or output.closed:
+				return
+			output.close()
+			self.finished.append(requestId)
+			while len(self.finished)>self.keep:
+				self.outputs.pop(self.finished.popleft(), None)
+
+	def recordExit(self, output, cmd, name):
+		# one summary line per command, the output itself only when debugging
+		if output.exitCode:
+			with self.lock:
+				self.failedCommands=self.failedCommands+1
+		self.logger.info('command '+cmd+' on '+name+' finished with '+output.describe())
+		if self.logger.isEnabledFor(logging.DEBUG):
+			for stream in STREAMS:
+				for line in output.getText(stream).splitlines():
+					self.logger.debug(stream+' '+name+' >>>>>>'+line)
+
+	def getMetrics(self):
+		with self.lock:
+			outputs=list(self.outputs.values())
+			failedCommands=self.failedCommands
+		return {
+			'transitions':len(outputs),
+			'running':sum(1 for output in outputs if not output.closed),
+			'bytes':sum(sum(output.sizes.values()) for output in outputs),
+			'droppedBytes':sum(output.dropped for output in outputs),
+			'failedCommands':failedCommands
+		}
+
+# a lifecycle or operation command exited with a non-zero exit code
+class CommandFailedException(Exception):
+	def __init__(self, cmd, exitCode, stderr=''):
+		self.cmd=cmd
+		self.exitCode=exitCode
+		self.message='command '+cmd+' exited with '+str(exitCode)
+		if stderr:
+			self.message=self.message+': '+stderr
+		super().__init__(self.message)
+
+def checkExitCode(output, cmd, name):
+	""" record how a command finished, raises CommandFailedException if it failed """
+	transitionOutputs.recordExit(output, cmd, name)
+	if output.exitCode:
+		raise CommandFailedException(cmd, output.exitCode, output.tail('stderr'))
+
+outputConfig=globalConfig.configDescriptor.get('output') or {}
+transitionOutputs=TransitionOutputs(maxBytes=outputConfig.get('maxBytes', 65536), keep=outputConfig.get('keep', 200))
+metrics.register('transitionOutput', transitionOutputs.getMetrics)
@@ -0,0 +1,205 @@
+import concurrent.futures
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from controllers.util.Config import *
+from controllers.util.Metrics import metrics
+
+# lower runs first, transitions not listed here use DEFAULT_PRIORITY
+DEFAULT_PRIORITIES={
+	'uninstall':0,
+	'stop':1,
+	'start':2,
+	'configure':2,
+	'integrity':3,
+	'install':4
+}
+DEFAULT_PRIORITY=3
+
+class TransitionScheduler:
+	"""
+		Bounded pool of transition workers
+		----------------------------------
+		Transition tasks are queued by priority of their transition name and run
+		by a fixed number of worker threads, so a burst of requests does not
+		start a thread per request against the docker daemon. When the queue is
+		full new requests are refused with a hint of when to retry.
+
+		Each resource also has its own FIFO queue. Only the oldest transition of
+		a resource is offered to the workers; the ones behind it stay PENDING
+		until it finishes, so transitions on one resource run strictly in
+		order while unrelated resources run in parallel.
+	"""
+	def __init__(self, workers=8, queueSize=1000, priorities=None, retryAfter=5):
+		self.logger = logging.getLogger(__name__)
+		self.workers=workers
+		self.queueSize=queueSize
+		self.priorities=dict(DEFAULT_PRIORITIES)
+		if priorities!=None:
+			self.priorities.update(dict((str(k).lower(), v) for k, v in priorities.items()))
+		self.retryAfter=retryAfter
+
+		# transitions ready to run, the head of each resource queue
+		self.queue=queue.PriorityQueue()
+		# keeps tasks of equal priority in arrival order
+		self.sequence=itertools.count()
+
+		self.lock=threading.Lock()
+		# resourceId -> deque of entries, the first is ready or running
+		self.resources={}
+		# requestId -> resourceId of transitions not finished yet
+		self.requests={}
+		# transitions accepted but not yet started, bounded by queueSize
+		self.waiting=0
+		self.submitted=0
+		self.rejected=0
+		self.completed=0
+		self.busy=0
+		self.waitSeconds=0.0
+		self.maxWaitSeconds=0.0
+		self.runSeconds=0.0
+
+		self.threads=[]
+
+	def start(self):
+		self.logger.debug('starting '+str(self.workers)+' transition workers, queue size '+str(self.queueSize))
+		for i in range(self.workers):
+			thread=threading.Thread(target=self.runLoop, name='transition-worker-'+str(i), daemon=True)
+			thread.start()
+			self.threads.append(thread)
+
+	def priorityFor(self, transitionName):
+		return self.priorities.get(str(transitionName).lower(), DEFAULT_PRIORITY)
+
+	def submit(self, task, transitionName, resourceId, requestId=None, onComplete=None):
+		""" 
+		queue a task behind any unfinished transitions on its resource, returns how many are ahead of it,
+		onComplete is called with no arguments once the task has finished, whether it succeeded or not
+		"""
+		entry=(self.priorityFor(transitionName), next(self.sequence), time.monotonic(), task, resourceId, requestId, onComplete)
+		with self.lock:
+			if self.waiting>=self.queueSize:
+				self.rejected=self.rejected+1
+				retryAfter=self.estimateRetryAfter()
+				self.logger.error('transition queue full, rejecting '+str(transitionName)+', retry after '+str(retryAfter)+' seconds')
+				raise TransitionQueueFullException(retryAfter)
+			self.waiting=self.waiting+1
+			self.submitted=self.submitted+1
+
+			entries=self.resources.setdefault(resourceId, deque())
+			entries.append(entry)
+			if requestId!=None:
+				self.requests[requestId]=resourceId
+			position=len(entries)-1
+			if position==0:
+				self.queue.put(entry)
+			else:
+				self.logger.debug('resource '+str(resourceId)+' is busy, transition queued at position '+str(position))
+			return position
+
+	def queuePosition(self, requestId):
+		""" how many transitions on the same resource are ahead of this one, None if it is not queued """
+		with self.lock:
+			resourceId=self.requests.get(requestId)
+			if resourceId==None:
+				return None
+			for position, entry in enumerate(self.resources.get(resourceId, ())):
+				if entry[5]==requestId:
+					return position
+			return None
+
+	def estimateRetryAfter(self):
+		# time for the workers to drain the queue at the average run time so far, never below the configured hint
+		if self.completed==0:
+			return self.retryAfter
+		averageRun=self.runSeconds/self.completed
+		return max(self.retryAfter, int(math.ceil(self.waiting*averageRun/self.workers)))
+
+	def finished(self, entry):
+		# offer the next transition on this resource to the workers
+		resourceId=entry[4]
+		entries=self.resources[resourceId]
+		entries.popleft()
+		self.requests.pop(entry[5], None)
+		if len(entries)>0:
+			self.queue.put(entries[0])
+		else:
+			del self.resources[resourceId]
+
+	def runLoop(self):
+		while True:
+			entry=self.queue.get()
+			priority, sequence, queuedAt, task, resourceId, requestId, onComplete=entry
+			waited=time.monotonic()-queuedAt
+			with self.lock:
+				self.waiting=self.waiting-1
+				self.busy=self.busy+1
+				self.waitSeconds=self.waitSeconds+waited
+				self.maxWaitSeconds=max(self.maxWaitSeconds, waited)
+
+			start=time.monotonic()
+			result=None
+			try:
+				result=task.run()
+			except Exception as ex:
+				self.logger.error('transition task failed '+str(type(ex).__name__)+' '+str(ex))
+
+			if isinstance(result, concurrent.futures.Future):
+				# the async engine runs the task, the resource is released once it finishes. run waits for a
+				# free engine slot first, so while the engine is full transitions stay queued here
+				result.add_done_callback(lambda future, entry=entry, start=start: self.complete(entry, start, future))
+			else:
+				self.complete(entry, start)
+
+	def complete(self, entry, start, future=None):
+		if future!=None and future.exception()!=None:
+			ex=future.exception()
+			self.logger.error('transition task failed '+str(type(ex).__name__)+' '+str(ex))
+		with self.lock:
+			self.busy=self.busy-1
+			self.completed=self.completed+1
+			self.runSeconds=self.runSeconds+time.monotonic()-start
+			self.finished(entry)
+		self.queue.task_done()
+
+		onComplete=entry[6]
+		if onComplete!=None:
+			try:
+				onComplete()
+			except Exception as ex:
+				self.logger.error('transition completion callback failed '+str(type(ex).__name__)+' '+str(ex))
+
+	def getMetrics(self):
+		with self.lock:
+			started=self.completed+self.busy
+			return {
+				'workers':self.workers,
+				'busyWorkers':self.busy,
+				'queueDepth':self.waiting,
+				'queueCapacity':self.queueSize,
+				'busyResources':len(self.resources),
+				'submitted':self.submitted,
+				'rejected':self.rejected,
+				'completed':self.completed,
+				'averageWaitSeconds':self.waitSeconds/started if started>0 else 0.0,
+				'maxWaitSeconds':self.maxWaitSeconds
+			}
+
+# the transition queue is full, retryAfter is a hint in seconds
+class TransitionQueueFullException(Exception):
+	def __init__(self, retryAfter):
+		self.retryAfter=retryAfter
+		self.message='Too many transitions waiting to run, retry after '+str(retryAfter)+' seconds'
+
+# scheduler shared by every transition request
+schedulerConfig=globalConfig.configDescriptor.get('scheduler') or {}
+transitionScheduler=TransitionScheduler(workers=schedulerConfig.get('workers', 8),
+										queueSize=schedulerConfig.get('queueSize', 1000),
+										priorities=schedulerConfig.get('priorities'),
+										retryAfter=schedulerConfig.get('retryAfter', 5))
+transitionScheduler.start()
+metrics.register('transitionScheduler', transitionScheduler.getMetrics)
@@ -1,24 +1,35 @@
+import asyncio
 import logging
-import re
 import threading
-from datetime import datetime, timezone
+import time
 #from controllers.util.DB import *
 from controllers.resource.ResourceInstance import *
 from controllers.util.Kafka import *
 from controllers.transition.Transition import *
 from controllers.util.DB import *
+from controllers.transition.LifecycleEvent import buildLifecycleEvent
+from controllers.util.LockManager import resourceLocks
+from controllers.transition.AsyncTransitionEngine import transitionEngine, ImageNotFoundException
+from controllers.resource.Placement import placementEngine
+from controllers.transition.TransitionDeadline import TransitionDeadline, TransitionStoppedException, DEFAULT_TIMEOUT
+from controllers.transition.TransitionOutput import transitionOutputs, CommandFailedException
 
-lock = threading.Lock()
-
-class TransitionTask(threading.Thread):
+class TransitionTask:
+	""" one transition on one resource instance, run by a worker of the transition scheduler """
 
 	def __init__(self, transition, resourceInstance=None):
 
-		threading.Thread.__init__(self)
 		self.logger = logging.getLogger(__name__)
 		self.logger.info('new transition task thread with transition '+str(transition.transitionName)+' and instance '+str(resourceInstance))
 		self.transition=transition
 		self.resourceInstance=resourceInstance
+		self.deadline=TransitionDeadline()
+		# stdout and stderr of its commands, which can be tailed from the time it is accepted
+		self.output=transitionOutputs.open(transition.requestId)
+		# started is also set by a cancel before the task runs, so it never does
+		self.stateLock=threading.Lock()
+		self.started=False
+		self.finished=False
 		self.logger.debug('finished init of transition task')
 
 	def validateOperationProperties(self, operationName, resourceType):
@@ -106,99 +117,186 @@ class TransitionTask(threading.Thread):
 		self.logger.debug('Failed task - updating DB with failure and error')
 		self.transition.requestState='FAILED'
 		self.transition.requestStateReason=reason
-		self.transition.finishedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
+		self.transition.finishedAt=time.time()
 		
 		
 	def run(self, transitionName, standardLifecycle=True):
 		self.logger.debug('run transition '+ transitionName 
 						+ ' resource id: ' + str(self.transition.resourceId) 
 						+ ' request id: ' + str(self.transition.requestId))
+
+		timeout=self.resourceInstance.type.getTimeout(transitionName, not standardLifecycle)
+		self.deadline.timeout=timeout if timeout!=None else DEFAULT_TIMEOUT
+
+		if transitionEngine!=None and transitionEngine.handles(self.resourceInstance):
+			# the docker work runs on the async engine loop, the scheduler keeps transitions on one resource in order
+			return transitionEngine.submit(self.runAsync(transitionName, standardLifecycle))
+
 		resp=None
-		
-		# if this is a read only network then just return true
+
+		# transitions on the same resource run one at a time, unrelated resources run in parallel
+		with resourceLocks.lock(self.resourceInstance.resourceId):
+			if not self.startTask():
+				self.logger.debug('transition '+str(self.transition.requestId)+' was cancelled before it started')
+				return
+
+			# if this is a read only network then just return true
+			if self.checkExistingNetwork():
+				self.logger.debug('mark install complete for pre-existing network')
+				self.transition.requestState='COMPLETED'
+				self.transition.finishedAt=time.time()
+			else:
+				try:
+					if standardLifecycle==True:
+						self.logger.debug('running standard transition '+transitionName)
+						resp=self.resourceInstance.runStandardTransition(transitionName,self.transition.properties,self.deadline,self.transition.timings,self.output)
+					else:
+						self.logger.debug('running operation '+transitionName)
+						resp=self.resourceInstance.runOperation(transitionName,self.transition.properties,self.deadline,self.transition.timings,self.output)
+					self.logger.debug('marking transition COMPLETED')	
+					self.transition.requestState='COMPLETED'
+					self.transition.finishedAt=time.time()
+				except TransitionStoppedException as ex:
+					resp=None
+					self.reportFailedTask(ex.reason)
+				except CommandFailedException as ex:
+					resp=None
+					self.reportFailedTask(ex.message)
+				except Exception as ex:
+					self.logger.error('caught transition exception '+ str(type(ex).__name__) + ' ' +str(ex))
+					resp=None
+					self.reportFailedTask("Failure from Virtual Infrastructure: " + str(ex))
+
+				self.logger.debug(resp)
+
+			self.finishTask()
+
+		self.sendLifecycleEvent()
+
+	async def runAsync(self, transitionName, standardLifecycle=True):
+		# same steps as run, with the docker work awaited on the engine loop and the
+		# database, snapshot and kafka writes on executor threads so they do not hold it up
+		loop=asyncio.get_event_loop()
+		resp=None
+		if not await loop.run_in_executor(None, self.startTask):
+			self.logger.debug('transition '+str(self.transition.requestId)+' was cancelled before it started')
+			return
+
 		if self.checkExistingNetwork():
 			self.logger.debug('mark install complete for pre-existing network')
 			self.transition.requestState='COMPLETED'
-			self.transition.finishedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
+			self.transition.finishedAt=time.time()
 		else:
+			isNetwork=self.resourceInstance.type.name=='resource::docker-network::1.0'
 			try:
 				if standardLifecycle==True:
 					self.logger.debug('running standard transition '+transitionName)
-					resp=self.resourceInstance.runStandardTransition(transitionName,self.transition.properties)
+					if transitionName=='uninstall' and not isNetwork:
+						await loop.run_in_executor(None, removeResourceInstance, self.resourceInstance.resourceId)
+					resp=await transitionEngine.runStandardTransition(self.resourceInstance, transitionName, self.transition.properties, self.deadline, self.transition.timings, self.output)
+					if transitionName=='uninstall' and isNetwork and resp['status']=='OK' and not self.resourceInstance.readonly:
+						await loop.run_in_executor(None, removeResourceInstance, self.resourceInstance.resourceId)
 				else:
 					self.logger.debug('running operation '+transitionName)
-					with lock:
-						self.logger.debug('Locked for  transition '+ transitionName 
-						+ ' resource id: ' + str(self.transition.resourceId) 
-						+ ' request id: ' + str(self.transition.requestId))
-						resp=self.resourceInstance.runOperation(transitionName,self.transition.properties)
-						self.logger.debug('Unlocked for  transition '+ transitionName 
-						+ ' resource id: ' + str(self.transition.resourceId) 
-						+ ' request id: ' + str(self.transition.requestId))
-				self.logger.debug('marking transition COMPLETED')	
+					resp=await transitionEngine.runOperation(self.resourceInstance, transitionName, self.transition.properties, self.deadline, self.transition.timings, self.output)
+				self.logger.debug('marking transition COMPLETED')
 				self.transition.requestState='COMPLETED'
-				self.transition.finishedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
+				self.transition.finishedAt=time.time()
+			except TransitionStoppedException as ex:
+				resp=None
+				self.reportFailedTask(ex.reason)
+			except CommandFailedException as ex:
+				resp=None
+				self.reportFailedTask(ex.message)
 			except Exception as ex:
 				self.logger.error('caught transition exception '+ str(type(ex).__name__) + ' ' +str(ex))
+				if isinstance(ex, ImageNotFoundException):
+					await loop.run_in_executor(None, removeResourceInstance, self.resourceInstance.resourceId)
 				resp=None
 				self.reportFailedTask("Failure from Virtual Infrastructure: " + str(ex))
-	
+
 			self.logger.debug(resp)
-			
-	
+
+		await loop.run_in_executor(None, self.finishTask)
+		await loop.run_in_executor(None, self.sendLifecycleEvent)
+
+	def startTask(self):
+		# False when the transition was cancelled before it could start
+		with self.stateLock:
+			if self.started:
+				return False
+			self.started=True
+		self.deadline.start()
+		self.transition.timings.add('queueWait', time.monotonic()-self.transition.acceptedAt)
+		self.transition.requestState='IN_PROGRESS'
+		with self.transition.timings.phase('dbUpdate'):
+			self.transition.updateDB()
+		return True
+
+	def cancel(self, reason):
+		""" stop the transition, killing its command if it is running, returns False if it has already finished """
+		with self.stateLock:
+			if self.finished:
+				return False
+			running=self.started
+			self.started=True
+		if running:
+			self.deadline.stop(reason)
+		else:
+			# it will never run, record the failure now
+			self.reportFailedTask(reason)
+			self.transition.discard()
+			self.finishTask()
+			self.sendLifecycleEvent()
+		return True
+
+	def finishTask(self):
+		self.deadline.finish()
 		if self.transition.resourceId==None:
 			self.logger.debug('adding resource id to transition object')
 			self.transition.resourceId=self.resourceInstance.resourceId
 
+		# the instance carries its own install and modification times so the event needs no history lookup
+		if self.transition.transitionName.lower() == 'install':
+			self.resourceInstance.createdAt=self.transition.finishedAt
+		self.resourceInstance.lastModifiedAt=self.transition.finishedAt
+
+		# from acceptance to now, the phases account for most of it
+		self.transition.timings.add('total', time.monotonic()-self.transition.acceptedAt)
+
+		# placement prefers endpoints whose installs finish quickly, the queue wait is not theirs
+		if self.transition.transitionName.lower()=='install' and self.transition.requestState=='COMPLETED' and not self.resourceInstance.type.internal:
+			phases=self.transition.timings.phases
+			placementEngine.recordInstall(self.resourceInstance, phases['total']-phases.get('queueWait', 0.0))
+
 		# update the transition in database
 		self.logger.debug('updating transition status in database')
-		with lock:
+		with self.transition.timings.phase('dbUpdate'):
 			self.transition.updateDB()
 
-		# Get the createdAt for the resource
-		createdAt = self.transition.finishedAt
+		# keep the instance snapshot current, uninstalled instances have already been removed
+		if findInstanceByResourceId(self.resourceInstance.resourceId)!=None:
+			# its script or operation may have changed the networks it names
+			resourceInstances.refresh(self.resourceInstance)
+			with self.transition.timings.phase('instanceSnapshot'):
+				dbClient.saveInstance(self.resourceInstance.getSnapshot())
 
-		if self.transition.transitionName.lower() != 'install':
-			with lock:
-				# Query the database to find when this resource was installed
-				dbTransitions = dbClient.findTransitionsByResourceID(self.resourceInstance.resourceId)
-				if dbTransitions != None:
-					for dbTransition in dbTransitions:
-						if 'transitionName' in dbTransition and dbTransition['transitionName'].lower() == 'install':
-							createdAt = dbTransition['finishedAt']
+		with self.stateLock:
+			self.finished=True
+		self.transition.unregister()
+		transitionOutputs.close(self.transition.requestId)
 
+	def sendLifecycleEvent(self):
 		# send update to kafka
-		kafkaMessage=self.transition.getTransitionRequestStatus()
-
-		internalResourceInstance={
-			'name':self.resourceInstance.name,
-			'type':re.sub('[:.-]','_',self.resourceInstance.type.name),
-		}
-		if self.resourceInstance.type.name == "resource::docker-network::1.0":
-			if 'networkid' in self.resourceInstance.properties:
-				internalResourceInstance['id']=self.resourceInstance.properties['networkid']
-		else:
-			internalResourceInstance['id']=self.resourceInstance.getID()
-
-		resourceInstance={
-			'resourceId':self.resourceInstance.resourceId,
-			'metricKey':self.transition.metricKey,
-			'resourceName':self.resourceInstance.name,
-			'resourceType':self.resourceInstance.type.name,
-			'resourceManagerId':self.transition.resourceManagerId,
-			'deploymentLocation':self.transition.deploymentLocation,
-			'properties':self.resourceInstance.properties,
-			'createdAt': createdAt,
-			'lastModifiedAt':self.transition.finishedAt,
-			'internalResourceInstances':[internalResourceInstance],
-		}
-		kafkaMessage['transitionName']=self.transition.transitionName
-		kafkaMessage['resourceManagerId']=self.transition.resourceManagerId
-		kafkaMessage['deploymentLocation']=self.transition.deploymentLocation
-		kafkaMessage['resourceInstance']=resourceInstance
+		kafkaMessage=buildLifecycleEvent(self.transition, self.resourceInstance)
 
 		self.logger.info('completed task '+str(self.transition.requestId)+' with response ='+str(kafkaMessage))
-		kafkaClient.sendLifecycleEvent(kafkaMessage)
+		with self.transition.timings.phase('kafkaSend'):
+			kafkaClient.sendLifecycleEvent(kafkaMessage)
+
+		# the send can only be timed after the event has gone, record it when there was one
+		if kafkaClient.producer!=None:
+			self.transition.updateTimings()
 
 class NoTransitionFoundException(Exception):
 	def __init__(self, requestId):
@@ -0,0 +1,31 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+class TransitionTimings:
+	"""
+		Where the time of one transition goes
+		-------------------------------------
+		Seconds spent in each phase of a transition, such as the image lookup,
+		the lifecycle exec or the kafka send, measured with the monotonic clock
+		so they are not thrown off by changes to the wall clock. A phase that
+		happens more than once, such as attaching several networks, adds up.
+	"""
+	def __init__(self):
+		# phases in the order they first ran
+		self.phases=OrderedDict()
+
+	@contextmanager
+	def phase(self, name):
+		start=time.monotonic()
+		try:
+			yield
+		finally:
+			self.add(name, time.monotonic()-start)
+
+	def add(self, name, seconds):
+		self.phases[name]=self.phases.get(name, 0.0)+seconds
+
+	def asDict(self):
+		# milliseconds, as stored with the transition and sent in lifecycle events
+		return OrderedDict((name, round(seconds*1000, 3)) for name, seconds in self.phases.items())
@@ -7,4 +7,4 @@ class UninstallTransitionTask(TransitionTask):
 		self.logger = logging.getLogger(__name__)
 
 	def run(self):
-		super().run('uninstall')
+		return super().run('uninstall')
@@ -1,63 +1,201 @@
-from tinydb import TinyDB, Query
+import atexit
 import logging
-import threading
+from datetime import datetime, timezone
+from controllers.util.Config import *
+from controllers.util.TinyDBStore import TinyDBStore
+from controllers.util.SQLiteStore import SQLiteStore
+from controllers.util.WriteBehindStore import WriteBehindStore
+from controllers.util.InstanceSnapshot import InstanceSnapshot
+from controllers.util.TransitionCompactor import TransitionCompactor
+from controllers.util.Metrics import metrics
+
+# storage backends selectable with database.backend in config.yaml
+BACKENDS={
+	'tinydb': (TinyDBStore, 'config/db.json'),
+	'sqlite': (SQLiteStore, 'config/db.sqlite')
+}
 
-lock = threading.Lock()
 class DB:
 	""" persistence for instances and transition requests """
 	def __init__(self) :
 		self.logger = logging.getLogger(__name__)
+		dbConfig=globalConfig.configDescriptor.get('database') or {}
+		backend=dbConfig.get('backend', 'tinydb')
+		if backend not in BACKENDS:
+			raise DBException(ValueError('unknown database backend '+str(backend)))
+		storeClass, defaultPath=BACKENDS[backend]
+		path=dbConfig.get('path', defaultPath)
 		try:
-			self.db = TinyDB('config/db.json')
-			self.db.purge()
-			self.db.purge_tables()
-			
-			self.transitionTable=self.db.table('transitions')
-			#self.instanceTable=self.db.table('instances')
+			self.store=storeClass(path)
+
+			# optionally buffer changes in memory and write them in batches
+			writeBehind=dbConfig.get('writeBehind') or {}
+			if writeBehind.get('enabled', False):
+				self.store=WriteBehindStore(self.store,
+											flushInterval=writeBehind.get('flushInterval', 1.0),
+											maxBatchSize=writeBehind.get('maxBatchSize', 100))
+				self.logger.debug('write-behind enabled for transitions')
+
+			# persistent mode keeps transitions and a resource instance snapshot across restarts
+			self.persistent=dbConfig.get('persistent', False)
+			self.instanceSnapshot=None
+			if self.persistent:
+				self.instanceSnapshot=InstanceSnapshot(dbConfig.get('instanceSnapshot', 'config/instances.jsonl'))
+				self.logger.debug('persistent db, keeping existing transitions and instances')
+			else:
+				self.store.purge()
 			
-			self.logger.debug('created db at config/db.json')
+			self.logger.debug('created '+backend+' db at '+path)
 		except Exception as ex:	
 			raise DBException(ex)
 
+		# evict old finished transitions in the background
+		self.compactor=None
+		retention=dbConfig.get('retention') or {}
+		if retention.get('enabled', False):
+			self.compactor=TransitionCompactor(self,
+											maxAge=retention.get('maxAge'),
+											maxPerResource=retention.get('maxPerResource'),
+											interval=retention.get('interval', 60),
+											batchSize=retention.get('batchSize', 500))
+			self.compactor.start()
+			metrics.register('transitionCompactor', self.compactor.getMetrics)
+
+		# make sure buffered changes reach the disk on shutdown
+		atexit.register(self.close)
+
+	def close(self):
+		self.logger.debug('closing db')
+		if self.compactor!=None:
+			self.compactor.stop()
+		try:
+			self.store.close()
+			if self.instanceSnapshot!=None:
+				self.instanceSnapshot.close()
+		except Exception as ex:
+			self.logger.error('cannot close db cleanly '+str(ex))
+
+	def saveInstance(self, record):
+		# record the latest state of a resource instance in the snapshot
+		if self.instanceSnapshot==None:
+			return
+		try:
+			self.instanceSnapshot.save(record)
+		except Exception as ex:
+			self.logger.error('cannot save instance '+str(record['resourceId']))
+			raise DBException(ex)
+
+	def removeInstance(self, resourceId):
+		if self.instanceSnapshot==None:
+			return
+		try:
+			self.instanceSnapshot.remove(resourceId)
+		except Exception as ex:
+			self.logger.error('cannot remove instance '+str(resourceId))
+			raise DBException(ex)
+
+	def loadInstances(self):
+		""" return the snapshot records of all live instances, compacting the snapshot as a side effect """
+		if self.instanceSnapshot==None:
+			return {}
+		try:
+			records=self.instanceSnapshot.load()
+			self.instanceSnapshot.compact(records)
+		except Exception as ex:
+			self.logger.error('cannot load instance snapshot')
+			raise DBException(ex)
+		return records
+
+	def findMaxIds(self):
+		""" return the highest requestId and resourceId referenced by stored transitions """
+		try:
+			return self.store.maxIds()
+		except Exception as ex:
+			raise DBException(ex)
+
+	def failInterruptedTransitions(self):
+		# transitions that were running when the resource manager stopped can never complete
+		finishedAt=str(datetime.now(timezone.utc).astimezone().isoformat())
+		for state in ['PENDING','IN_PROGRESS']:
+			for transition in self.findTransitionsByState(state):
+				self.logger.info('failing transition '+str(transition['requestId'])+' interrupted by restart')
+				self.store.update(self.store.eidForRequestId(transition['requestId']), {
+					'requestState':'FAILED',
+					'requestStateReason':'Transition interrupted by a resource manager restart',
+					'finishedAt':finishedAt
+				})
+
 	def createNewTransitionRequest(self,transition):
-		""" store transition request and return unique id """
+		""" store transition request and return unique id, with write-behind enabled the id is the requestId """
 		self.logger.debug('create transition db entry called')
 		self.logger.debug(transition)
 		try:
-			with lock:
-				id=self.transitionTable.insert(transition)
+			id=self.store.insert(transition)
 			self.logger.debug('added transition request with id '+str(id))
 		except Exception as ex:	
 			raise DBException(ex)
 		
 		return id
 
+	def createNewTransitionRequests(self, transitions):
+		""" store a batch of transition requests in a single write and return their ids in the same order """
+		self.logger.debug('create '+str(len(transitions))+' transition db entries called')
+		if len(transitions)==0:
+			return []
+		try:
+			ids=self.store.writeBatch(transitions, [], [])
+			self.logger.debug('added transition requests with ids '+str(ids))
+		except Exception as ex:
+			raise DBException(ex)
+
+		return ids
+
 	def updateTransitionRequest(self, id, transition):
 		# update transition status
 		self.logger.debug('update transition request')
 		self.logger.debug(transition)
 		try:
-			with lock:
-				self.transitionTable.update(transition,eids=[id])
+			self.store.update(id, transition)
 		except Exception as ex:	
 			raise DBException(ex)
 		
 	def removeTransition(self, eid):
 		self.logger.debug('removing transition with eid '+str(eid))
 		try:
-			with lock:
-				self.transitionTable.remove(eids=[eid])
+			self.store.remove(eid)
 		except Exception as ex:
 			self.logger.error('cannot remove transition with eid '+str(eid))
 			raise DBException(ex)
 
+	def removeTransitions(self, requestIds):
+		# remove a batch of transitions in one storage write
+		self.logger.debug('removing '+str(len(requestIds))+' transitions')
+		try:
+			eids=[self.store.eidForRequestId(requestId) for requestId in requestIds]
+			self.store.writeBatch([], [], [eid for eid in eids if eid!=None])
+		except Exception as ex:
+			self.logger.error('cannot remove transitions')
+			raise DBException(ex)
+
+	def saveResourceSummaries(self, summaries):
+		# summaries keep the essentials of a resource's history once its transitions are evicted
+		try:
+			self.store.putSummaries(summaries)
+		except Exception as ex:
+			raise DBException(ex)
+
+	def findResourceSummary(self, resourceId):
+		try:
+			return self.store.getSummary(resourceId)
+		except Exception as ex:
+			raise DBException(ex)
+
 	def findTransitionByRequestID(self, id):
 		# will need to be updated to reflect new transition stuff
 		self.logger.debug('find transition db entry for request id '+str(id))
-		Transition=Query()
 
 		try:
-			i=self.transitionTable.get(Transition.requestId==int(id))
+			i=self.store.findByRequestId(id)
 		except Exception as ex:
 			self.logger.error('something bad happened')
 			raise DBException(ex)
@@ -67,10 +205,9 @@ class DB:
 	
 	def findTransitionsByResourceID(self, id):
 		self.logger.debug('search for transition db entry for resource id '+str(id))
-		Transition=Query()
 		transitions=[]
 		try:
-			transitions=self.transitionTable.search(Transition.resourceId==str(id))
+			transitions=self.store.findByResourceId(id)
 		except Exception as ex:
 			self.logger.error('something bad happened')
 			raise DBException(ex)
@@ -78,14 +215,25 @@ class DB:
 		self.logger.debug(str(transitions))
 		return transitions
 
+	def findTransitionsByState(self, state):
+		self.logger.debug('search for transition db entries in state '+str(state))
+		transitions=[]
+		try:
+			transitions=self.store.findByState(state)
+		except Exception as ex:
+			self.logger.error('something bad happened')
+			raise DBException(ex)
+		
+		return transitions
+
 	def findTransitionByID(self, id):
 		# will need to be updated to reflect new transition stuff
 		self.logger.debug('find transition db entry for id '+id)
 		try:
-			i=self.transitionTable.get(eid=int(id))
+			i=self.store.get(int(id))
 			self.logger.debug(i)
 		except Exception as ex:
-			self.logger.error('cannot find transition with eid '+str(eid))
+			self.logger.error('cannot find transition with eid '+str(id))
 			raise DBException(ex)
 		
 		return i
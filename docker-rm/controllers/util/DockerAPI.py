@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import struct
+from urllib.parse import quote, urlencode
+
+# exec output frames name the stream they carry
+STREAM_NAMES={1:'stdout', 2:'stderr'}
+
+# first api version a container can be created on more than one network
+MULTI_NETWORK_API_VERSION='1.44'
+
+def apiVersionAtLeast(version, minimum):
+	""" True if a docker api version such as 1.41 is minimum or later """
+	return tuple(int(part) for part in str(version).split('.'))>=tuple(int(part) for part in str(minimum).split('.'))
+
+class DockerAPI:
+	"""
+		Docker Engine API over the unix socket, for asyncio
+		---------------------------------------------------
+		Speaks just enough HTTP/1.1 for the calls the async transition engine
+		makes. Each request uses its own connection, which is cheap on a unix
+		socket. At most maxConnections are open at once so a large number of
+		transitions in flight does not overrun the daemon's accept queue.
+		Requests made with limited=False, such as killing a command, skip that
+		limit so they are not stuck behind the commands they are meant to stop.
+	"""
+	def __init__(self, socketPath='/var/run/docker.sock', apiVersion=None, maxConnections=64):
+		self.logger = logging.getLogger(__name__)
+		self.socketPath=socketPath
+		# auto, as the docker SDK takes it, is the daemon's own version
+		if apiVersion=='auto':
+			apiVersion=None
+		self.apiVersion=apiVersion
+		self.prefix=''
+		if apiVersion:
+			self.prefix='/v'+str(apiVersion)
+		# the daemon's api version, asked for once when none was given
+		self.serverVersion=None
+		self.maxConnections=maxConnections
+		# created on first use so it belongs to the loop making the requests
+		self.connections=None
+
+	async def request(self, method, path, body=None, query=None, stream=False, limited=True, archive=None, onFrame=None):
+		"""
+		returns the status and the response body, decoded from json unless stream is set, body is sent as json
+		and archive as a tar. A hijacked stream is instead handed to onFrame a frame at a time as it arrives
+		"""
+		target=self.prefix+path
+		if query:
+			target=target+'?'+urlencode(query)
+		payload=b''
+		if body!=None:
+			payload=json.dumps(body).encode('utf-8')
+		elif archive!=None:
+			payload=archive
+
+		head=method+' '+target+' HTTP/1.1\r\nHost: docker\r\nConnection: close\r\n'
+		if body!=None:
+			head=head+'Content-Type: application/json\r\n'
+		elif archive!=None:
+			head=head+'Content-Type: application/x-tar\r\n'
+		head=head+'Content-Length: '+str(len(payload))+'\r\n\r\n'
+
+		if not limited:
+			status, headers, data=await self.send(head.encode('ascii')+payload, onFrame)
+		else:
+			if self.connections==None:
+				self.connections=asyncio.Semaphore(self.maxConnections)
+			async with self.connections:
+				status, headers, data=await self.send(head.encode('ascii')+payload, onFrame)
+
+		if status>=400:
+			message=data.decode('utf-8', 'replace')
+			try:
+				message=json.loads(message).get('message', message)
+			except ValueError:
+				pass
+			raise DockerAPIException(status, message)
+		if stream:
+			return status, data
+		if len(data)==0:
+			return status, None
+		return status, json.loads(data.decode('utf-8'))
+
+	async def send(self, message, onFrame=None):
+		reader, writer=await asyncio.open_unix_connection(self.socketPath)
+		try:
+			writer.write(message)
+			await writer.drain()
+			status, headers=await self.readHead(reader)
+			if onFrame!=None and status<400 and isHijacked(headers):
+				await self.readFrames(reader, onFrame)
+				data=b''
+			else:
+				data=await self.readBody(reader, headers)
+		finally:
+			writer.close()
+		return status, headers, data
+
+	async def readHead(self, reader):
+		statusLine=await reader.readline()
+		if not statusLine:
+			raise DockerAPIException(0, 'connection closed by docker')
+		status=int(statusLine.split()[1])
+		headers={}
+		while True:
+			line=await reader.readline()
+			if line in (b'\r\n', b'\n', b''):
+				break
+			name, value=line.decode('latin-1').split(':', 1)
+			headers[name.strip().lower()]=value.strip()
+		return status, headers
+
+	async def readBody(self, reader, headers):
+		if 'content-length' in headers:
+			return await reader.readexactly(int(headers['content-length']))
+		if headers.get('transfer-encoding', '').lower()=='chunked':
+			chunks=[]
+			while True:
+				size=int((await reader.readline()).split(b';')[0], 16)
+				if size==0:
+					await reader.readline()
+					break
+				chunks.append(await reader.readexactly(size))
+				await reader.readline()
+			return b''.join(chunks)
+		# hijacked streams such as exec output run until the daemon closes the connection
+		return await reader.read()
+
+	async def readFrames(self, reader, onFrame):
+		# exec output without a tty is framed as [stream, 0, 0, 0, size] headers followed by size bytes
+		while True:
+			try:
+				header=await reader.readexactly(8)
+			except asyncio.IncompleteReadError:
+				return
+			stream, size=struct.unpack('>BxxxI', header)
+			onFrame(STREAM_NAMES.get(stream, 'stdout'), await reader.readexactly(size))
+
+	async def getApiVersion(self):
+		""" the api version requests are made with, which is the daemon's own when none was given """
+		if self.apiVersion:
+			return str(self.apiVersion)
+		if self.serverVersion==None:
+			status, resp=await self.request('GET', '/version')
+			self.serverVersion=resp['ApiVersion']
+		return self.serverVersion
+
+	# containers
+
+	async def createContainer(self, name, config):
+		status, resp=await self.request('POST', '/containers/create', config, {'name':name})
+		return resp['Id']
+
+	async def startContainer(self, containerId):
+		await self.request('POST', '/containers/'+quote(containerId)+'/start')
+
+	async def inspectContainer(self, containerId):
+		status, resp=await self.request('GET', '/containers/'+quote(containerId)+'/json')
+		return resp
+
+	async def removeContainer(self, containerId):
+		# force kills a running container before removing it
+		await self.request('DELETE', '/containers/'+quote(containerId), query={'force':'1'})
+
+	async def putArchive(self, containerId, path, archive):
+		""" extract a tar into the directory path of a container """
+		await self.request('PUT', '/containers/'+quote(containerId)+'/archive', query={'path':path}, archive=archive)
+
+	async def getArchive(self, containerId, path):
+		""" returns a tar of path in a container """
+		status, data=await self.request('GET', '/containers/'+quote(containerId)+'/archive', query={'path':path}, stream=True)
+		return data
+
+	async def inspectImage(self, imageName):
+		status, resp=await self.request('GET', '/images/'+quote(imageName)+'/json')
+		return resp
+
+	# exec
+
+	async def execCreate(self, containerId, cmd, limited=True):
+		status, resp=await self.request('POST', '/containers/'+quote(containerId)+'/exec',
+										{'Cmd':cmd, 'AttachStdout':True, 'AttachStderr':True, 'Tty':False}, limited=limited)
+		return resp['Id']
+
+	async def execStart(self, execId, limited=True, onOutput=None):
+		"""
+		run the exec to completion, returns its combined stdout and stderr, or hands each piece of them to
+		onOutput(stream, data) as it arrives, stream being stdout or stderr, and returns nothing
+		"""
+		status, data=await self.request('POST', '/exec/'+quote(execId)+'/start', {'Detach':False, 'Tty':False}, stream=True, limited=limited, onFrame=onOutput)
+		if onOutput!=None:
+			return None
+		return demultiplex(data)
+
+	async def execInspect(self, execId, limited=True):
+		status, resp=await self.request('GET', '/exec/'+quote(execId)+'/json', limited=limited)
+		return resp
+
+	async def execRun(self, containerId, cmd, limited=True, onOutput=None):
+		""" returns the exit code and output of a command run in a container, output is None when onOutput takes it """
+		execId=await self.execCreate(containerId, cmd, limited)
+		output=await self.execStart(execId, limited, onOutput)
+		details=await self.execInspect(execId, limited)
+		return details.get('ExitCode'), output
+
+	# networks
+
+	async def createNetwork(self, config):
+		status, resp=await self.request('POST', '/networks/create', config)
+		return resp['Id']
+
+	async def listNetworks(self, names=None):
+		""" networks whose name contains one of names, every network if there are none """
+		query=None
+		if names:
+			query={'filters':json.dumps({'name':dict((name, True) for name in names)})}
+		status, resp=await self.request('GET', '/networks', query=query)
+		return resp
+
+	async def inspectNetwork(self, networkId):
+		status, resp=await self.request('GET', '/networks/'+quote(networkId))
+		return resp
+
+	async def removeNetwork(self, networkId):
+		await self.request('DELETE', '/networks/'+quote(networkId))
+
+	async def connectNetwork(self, networkId, containerId):
+		await self.request('POST', '/networks/'+quote(networkId)+'/connect', {'Container':containerId})
+
+	async def disconnectNetwork(self, networkId, containerId):
+		await self.request('POST', '/networks/'+quote(networkId)+'/disconnect', {'Container':containerId})
+
+def isHijacked(headers):
+	# a hijacked stream has no length, it runs until the daemon closes the connection
+	return 'content-length' not in headers and headers.get('transfer-encoding', '').lower()!='chunked'
+
+def demultiplex(data):
+	# exec output without a tty is framed as [stream, 0, 0, 0, size] headers followed by size bytes
+	output=[]
+	position=0
+	while position+8<=len(data):
+		size=struct.unpack('>I', data[position+4:position+8])[0]
+		output.append(data[position+8:position+8+size])
+		position=position+8+size
+	return b''.join(output)
+
+# the docker daemon refused a request, status 0 when it could not be reached
+class DockerAPIException(Exception):
+	def __init__(self, status, message):
+		super().__init__(str(status)+' '+str(message))
+		self.status=status
+		self.message=message
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import threading
+
+class InstanceSnapshot:
+	"""
+		Append only journal of resource instances
+		-----------------------------------------
+		Every change to an instance appends one JSON line, either the full
+		instance record or a removal marker. On startup the journal is replayed
+		line by line, so a large file never has to be parsed in one go, and then
+		compacted down to one line per live instance.
+	"""
+	def __init__(self, path, compactThreshold=10000):
+		self.logger = logging.getLogger(__name__)
+		self.path=path
+		self.lock=threading.Lock()
+		# compact once this many lines are superseded
+		self.compactThreshold=compactThreshold
+		self.lines=0
+		self.live=set()
+		self.file=None
+
+	def load(self):
+		""" replay the journal and return the live instance records keyed by resourceId """
+		with self.lock:
+			records=self.replayRecords()
+		self.logger.debug('loaded '+str(len(records))+' instance records from '+self.path)
+		return records
+
+	def replayRecords(self):
+		records={}
+		for record in self.replay():
+			if record.get('removed', False):
+				records.pop(record['resourceId'], None)
+			else:
+				records[record['resourceId']]=record
+		return records
+
+	def replay(self):
+		if not os.path.exists(self.path):
+			return
+		with open(self.path, 'rt') as f:
+			for line in f:
+				line=line.strip()
+				if len(line)==0:
+					continue
+				try:
+					yield json.loads(line)
+				except ValueError:
+					# a torn final line from a crash is skipped
+					self.logger.error('skipping unreadable instance record in '+self.path)
+
+	def compact(self, records=None):
+		""" rewrite the journal with one line per live instance """
+		with self.lock:
+			if records==None:
+				records=self.replayRecords()
+			self.closeFile()
+			tmpPath=self.path+'.tmp'
+			with open(tmpPath, 'wt') as f:
+				for record in records.values():
+					f.write(json.dumps(record)+'\n')
+			os.replace(tmpPath, self.path)
+			self.lines=len(records)
+			self.live=set(records)
+		self.logger.debug('compacted instance journal to '+str(len(records))+' records')
+
+	def save(self, record):
+		self.append(record)
+		with self.lock:
+			self.live.add(record['resourceId'])
+
+	def remove(self, resourceId):
+		self.append({'resourceId':resourceId, 'removed':True})
+		with self.lock:
+			self.live.discard(resourceId)
+
+	def append(self, record):
+		with self.lock:
+			if self.file==None:
+				self.file=open(self.path, 'at')
+			self.file.write(json.dumps(record)+'\n')
+			self.file.flush()
+			self.lines=self.lines+1
+			superseded=self.lines-len(self.live)
+		if superseded>self.compactThreshold:
+			self.compact()
+
+	def closeFile(self):
+		if self.file!=None:
+			self.file.close()
+			self.file=None
+
+	def close(self):
+		with self.lock:
+			self.closeFile()
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from controllers.util.Config import *
+from controllers.util.Metrics import metrics
+
+class LockManager:
+	"""
+		Locks keyed by resourceId
+		-------------------------
+		Transitions on the same resource are mutually exclusive while those on
+		unrelated resources run in parallel. Resource ids are hashed onto a
+		fixed set of striped locks, so memory does not grow with the number of
+		resources, at the cost of two resources occasionally sharing a stripe.
+		Time spent waiting for a lock is counted for the metrics endpoint.
+	"""
+	def __init__(self, stripes=256):
+		self.logger = logging.getLogger(__name__)
+		self.stripes=[threading.Lock() for i in range(stripes)]
+
+		self.statsLock=threading.Lock()
+		self.acquisitions=0
+		self.contended=0
+		self.waitSeconds=0.0
+		self.maxWaitSeconds=0.0
+
+	def stripeFor(self, resourceId):
+		# requests carry resource ids as strings and instances as ints, both must map to the same stripe
+		return self.stripes[hash(str(resourceId)) % len(self.stripes)]
+
+	@contextmanager
+	def lock(self, resourceId):
+		stripe=self.stripeFor(resourceId)
+		waited=0.0
+		contended=not stripe.acquire(blocking=False)
+		if contended:
+			self.logger.debug('waiting for lock on resource '+str(resourceId))
+			start=time.monotonic()
+			stripe.acquire()
+			waited=time.monotonic()-start
+
+		with self.statsLock:
+			self.acquisitions=self.acquisitions+1
+			if contended:
+				self.contended=self.contended+1
+				self.waitSeconds=self.waitSeconds+waited
+				self.maxWaitSeconds=max(self.maxWaitSeconds, waited)
+		try:
+			yield
+		finally:
+			stripe.release()
+
+	def getMetrics(self):
+		with self.statsLock:
+			return {
+				'stripes':len(self.stripes),
+				'acquisitions':self.acquisitions,
+				'contended':self.contended,
+				'waitSeconds':self.waitSeconds,
+				'maxWaitSeconds':self.maxWaitSeconds
+			}
+
+# locks shared by every transition task
+lockConfig=globalConfig.configDescriptor.get('locks') or {}
+resourceLocks=LockManager(lockConfig.get('stripes', 256))
+metrics.register('resourceLocks', resourceLocks.getMetrics)
@@ -0,0 +1,32 @@
+import logging
+import threading
+
+class Metrics:
+	"""
+		Registry of internal counters
+		-----------------------------
+		Components register a function returning a dict of their current
+		counters, and the metrics endpoint collects them all on request.
+	"""
+	def __init__(self):
+		self.logger = logging.getLogger(__name__)
+		self.lock=threading.Lock()
+		self.providers={}
+
+	def register(self, name, provider):
+		self.logger.debug('registering metrics provider '+name)
+		with self.lock:
+			self.providers[name]=provider
+
+	def collect(self):
+		with self.lock:
+			providers=dict(self.providers)
+		resp={}
+		for name, provider in providers.items():
+			try:
+				resp[name]=provider()
+			except Exception as ex:
+				self.logger.error('cannot collect metrics for '+name+' '+str(ex))
+		return resp
+
+metrics=Metrics()
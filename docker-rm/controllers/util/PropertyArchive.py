@@ -0,0 +1,31 @@
+import io
+import os
+import tarfile
+import yaml
+
+# properties are exchanged with lifecycle and operation commands as yaml files in /etc
+PROPERTIES_DIR='/etc'
+TRANSITION_PROPERTIES='/etc/rmparams'
+OPERATION_PROPERTIES='/etc/opparams'
+
+def packProperties(path, properties):
+	""" a tar holding properties as yaml in the file named by path, to extract into PROPERTIES_DIR with the docker archive api """
+	data=yaml.dump(properties, default_flow_style=False, default_style='').encode('utf-8')
+	info=tarfile.TarInfo(os.path.basename(path))
+	info.size=len(data)
+	info.mode=0o644
+	buffer=io.BytesIO()
+	with tarfile.open(fileobj=buffer, mode='w') as tar:
+		tar.addfile(info, io.BytesIO(data))
+	return buffer.getvalue()
+
+def unpackProperties(archive):
+	""" the properties in the yaml file of a tar read with the docker archive api, None if there are none """
+	if not archive:
+		return None
+	with tarfile.open(fileobj=io.BytesIO(archive), mode='r') as tar:
+		for member in tar:
+			if member.isfile():
+				properties=yaml.safe_load(tar.extractfile(member).read().decode('utf-8', 'replace'))
+				return properties if isinstance(properties, dict) else None
+	return None
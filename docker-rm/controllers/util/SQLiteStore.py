@@ -0,0 +1,188 @@
+import json
+import logging
+import sqlite3
+import threading
+
+# statements are kept as constants so each connection's statement cache
+# prepares them once and reuses them
+CREATE_TABLE='''CREATE TABLE IF NOT EXISTS transitions (
+	eid INTEGER PRIMARY KEY AUTOINCREMENT,
+	requestId INTEGER,
+	resourceId TEXT,
+	requestState TEXT,
+	document TEXT NOT NULL
+)'''
+CREATE_SUMMARY_TABLE='''CREATE TABLE IF NOT EXISTS summaries (
+	resourceId TEXT PRIMARY KEY,
+	document TEXT NOT NULL
+)'''
+CREATE_INDEXES=[
+	'CREATE INDEX IF NOT EXISTS transitions_requestId ON transitions (requestId)',
+	'CREATE INDEX IF NOT EXISTS transitions_resourceId ON transitions (resourceId)',
+	'CREATE INDEX IF NOT EXISTS transitions_requestState ON transitions (requestState)'
+]
+INSERT='INSERT INTO transitions (requestId, resourceId, requestState, document) VALUES (?, ?, ?, ?)'
+UPDATE='UPDATE transitions SET requestId=?, resourceId=?, requestState=?, document=? WHERE eid=?'
+DELETE='DELETE FROM transitions WHERE eid=?'
+DELETE_ALL='DELETE FROM transitions'
+DELETE_ALL_SUMMARIES='DELETE FROM summaries'
+PUT_SUMMARY='INSERT OR REPLACE INTO summaries (resourceId, document) VALUES (?, ?)'
+SELECT_SUMMARY='SELECT document FROM summaries WHERE resourceId=?'
+SELECT_BY_EID='SELECT document FROM transitions WHERE eid=?'
+SELECT_EID_BY_REQUEST_ID='SELECT eid FROM transitions WHERE requestId=? ORDER BY eid LIMIT 1'
+SELECT_BY_REQUEST_ID='SELECT document FROM transitions WHERE requestId=? ORDER BY eid LIMIT 1'
+SELECT_BY_RESOURCE_ID='SELECT document FROM transitions WHERE resourceId=? ORDER BY eid'
+SELECT_MAX_IDS="SELECT MAX(requestId), MAX(CASE WHEN resourceId GLOB '[0-9]*' THEN CAST(resourceId AS INTEGER) END) FROM transitions"
+SELECT_BY_STATE='SELECT document FROM transitions WHERE requestState=? ORDER BY eid'
+
+class SQLiteStore:
+	"""
+		SQLite transition storage
+		-------------------------
+		Stores each transition as a JSON document next to indexed requestId,
+		resourceId and requestState columns. The database runs in WAL mode so
+		readers never block the writer, and every thread gets its own connection
+		instead of sharing a process wide lock. close closes the connections of
+		every thread.
+	"""
+	def __init__(self, path):
+		self.logger = logging.getLogger(__name__)
+		self.path=path
+		self.local=threading.local()
+		# every connection opened, so close reaches those of other threads
+		self.connections=[]
+		self.connectionsLock=threading.Lock()
+
+		conn=self.connection()
+		conn.execute('PRAGMA journal_mode=WAL')
+		conn.execute(CREATE_TABLE)
+		conn.execute(CREATE_SUMMARY_TABLE)
+		for statement in CREATE_INDEXES:
+			conn.execute(statement)
+
+		self.logger.debug('opened sqlite store at '+path)
+
+	def connection(self):
+		# one connection per thread, created on first use
+		conn=getattr(self.local, 'conn', None)
+		if conn==None:
+			# only its own thread uses it, but close may come from another
+			conn=sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=64, check_same_thread=False)
+			conn.execute('PRAGMA synchronous=NORMAL')
+			self.local.conn=conn
+			with self.connectionsLock:
+				self.connections.append(conn)
+		return conn
+
+	def columns(self, transition):
+		requestId=transition.get('requestId')
+		if requestId!=None:
+			requestId=int(requestId)
+		resourceId=transition.get('resourceId')
+		if resourceId!=None:
+			resourceId=str(resourceId)
+		return (requestId, resourceId, transition.get('requestState'), json.dumps(transition))
+
+	def purge(self):
+		conn=self.connection()
+		conn.execute(DELETE_ALL)
+		conn.execute(DELETE_ALL_SUMMARIES)
+
+	def insert(self, transition):
+		cursor=self.connection().execute(INSERT, self.columns(transition))
+		return cursor.lastrowid
+
+	def update(self, eid, transition):
+		# read-modify-write inside one transaction to keep TinyDB's merge semantics
+		conn=self.connection()
+		conn.execute('BEGIN IMMEDIATE')
+		try:
+			row=conn.execute(SELECT_BY_EID, (eid,)).fetchone()
+			if row!=None:
+				document=json.loads(row[0])
+				document.update(transition)
+				conn.execute(UPDATE, self.columns(document)+(eid,))
+			conn.execute('COMMIT')
+		except Exception:
+			conn.execute('ROLLBACK')
+			raise
+
+	def remove(self, eid):
+		self.connection().execute(DELETE, (eid,))
+
+	def writeBatch(self, inserts, updates, removes):
+		# apply a batch of changes in a single transaction
+		conn=self.connection()
+		eids=[]
+		conn.execute('BEGIN IMMEDIATE')
+		try:
+			for transition in inserts:
+				eids.append(conn.execute(INSERT, self.columns(transition)).lastrowid)
+			for eid, transition in updates:
+				row=conn.execute(SELECT_BY_EID, (eid,)).fetchone()
+				if row!=None:
+					document=json.loads(row[0])
+					document.update(transition)
+					conn.execute(UPDATE, self.columns(document)+(eid,))
+			conn.executemany(DELETE, [(eid,) for eid in removes])
+			conn.execute('COMMIT')
+		except Exception:
+			conn.execute('ROLLBACK')
+			raise
+		return eids
+
+	def eidForRequestId(self, requestId):
+		row=self.connection().execute(SELECT_EID_BY_REQUEST_ID, (int(requestId),)).fetchone()
+		if row==None:
+			return None
+		return row[0]
+
+	def get(self, eid):
+		return self.fetchOne(SELECT_BY_EID, eid)
+
+	def findByRequestId(self, requestId):
+		return self.fetchOne(SELECT_BY_REQUEST_ID, int(requestId))
+
+	def findByResourceId(self, resourceId):
+		return self.fetchAll(SELECT_BY_RESOURCE_ID, str(resourceId))
+
+	def findByState(self, state):
+		return self.fetchAll(SELECT_BY_STATE, state)
+
+	def putSummaries(self, summaries):
+		conn=self.connection()
+		conn.execute('BEGIN IMMEDIATE')
+		try:
+			conn.executemany(PUT_SUMMARY, [(str(resourceId), json.dumps(summary)) for resourceId, summary in summaries.items()])
+			conn.execute('COMMIT')
+		except Exception:
+			conn.execute('ROLLBACK')
+			raise
+
+	def getSummary(self, resourceId):
+		return self.fetchOne(SELECT_SUMMARY, str(resourceId))
+
+	def maxIds(self):
+		maxRequestId, maxResourceId=self.connection().execute(SELECT_MAX_IDS).fetchone()
+		if maxRequestId==None:
+			maxRequestId=0
+		if maxResourceId==None:
+			maxResourceId=-1
+		return maxRequestId, maxResourceId
+
+	def fetchOne(self, statement, key):
+		row=self.connection().execute(statement, (key,)).fetchone()
+		if row==None:
+			return None
+		return json.loads(row[0])
+
+	def fetchAll(self, statement, key):
+		return [json.loads(row[0]) for row in self.connection().execute(statement, (key,))]
+
+	def close(self):
+		with self.connectionsLock:
+			connections=self.connections
+			self.connections=[]
+		for conn in connections:
+			conn.close()
+		self.local.conn=None
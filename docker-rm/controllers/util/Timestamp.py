@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+def parseTimestamp(value):
+	""" convert an ISO 8601 timestamp written by the resource manager to epoch seconds, None if it cannot be read """
+	if value==None or value=='':
+		return None
+	if isinstance(value, (int, float)):
+		return float(value)
+	# strptime in older pythons does not accept a colon in the utc offset
+	if len(value)>6 and value[-3]==':' and value[-6] in '+-':
+		value=value[:-3]+value[-2:]
+	for format in ['%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z']:
+		try:
+			return datetime.strptime(value, format).timestamp()
+		except ValueError:
+			pass
+	return None
+
+def formatTimestamp(value):
+	""" format epoch seconds as the local ISO 8601 timestamp the API returns, empty if not set """
+	if value==None:
+		return ''
+	return str(datetime.fromtimestamp(value, timezone.utc).astimezone().isoformat())
@@ -0,0 +1,116 @@
+from tinydb import TinyDB
+import logging
+import threading
+from controllers.util.TransitionIndex import TransitionIndex
+
+class TinyDBStore:
+	"""
+		TinyDB transition storage
+		-------------------------
+		Keeps the transitions table in a single JSON file. TinyDB rewrites the file
+		on every change, so all access is serialised by one lock. Lookups are
+		answered by an in memory TransitionIndex.
+	"""
+	def __init__(self, path):
+		self.logger = logging.getLogger(__name__)
+		self.lock = threading.Lock()
+		self.path=path
+		self.db = TinyDB(path)
+		self.transitionTable=self.db.table('transitions')
+		self.summaryTable=self.db.table('summaries')
+		self.summaries=dict((s['resourceId'], dict(s)) for s in self.summaryTable.all())
+
+		# in memory indexes answer the finders without scanning the table
+		self.index=TransitionIndex()
+		self.index.rebuild((t.eid, t) for t in self.transitionTable.all())
+
+		self.logger.debug('opened tinydb store at '+path)
+
+	def purge(self):
+		with self.lock:
+			self.db.purge()
+			self.db.purge_tables()
+			self.transitionTable=self.db.table('transitions')
+			self.summaryTable=self.db.table('summaries')
+			self.summaries={}
+			self.index.clear()
+
+	def insert(self, transition):
+		with self.lock:
+			eid=self.transitionTable.insert(transition)
+			self.index.add(eid, transition)
+		return eid
+
+	def update(self, eid, transition):
+		with self.lock:
+			self.transitionTable.update(transition,eids=[eid])
+			self.index.update(eid, transition)
+
+	def remove(self, eid):
+		with self.lock:
+			self.transitionTable.remove(eids=[eid])
+			self.index.remove(eid)
+
+	def writeBatch(self, inserts, updates, removes):
+		# apply a batch of changes with at most one file rewrite per kind of change
+		eids=[]
+		with self.lock:
+			if len(inserts)>0:
+				eids=self.transitionTable.insert_multiple(inserts)
+				for eid, transition in zip(eids, inserts):
+					self.index.add(eid, transition)
+			if len(updates)>0:
+				changes=dict(updates)
+				def applyUpdate(data, eid):
+					if eid in data:
+						data[eid].update(changes[eid])
+				self.transitionTable.process_elements(applyUpdate, eids=list(changes))
+				for eid, transition in updates:
+					self.index.update(eid, transition)
+			if len(removes)>0:
+				self.transitionTable.remove(eids=removes)
+				for eid in removes:
+					self.index.remove(eid)
+		return eids
+
+	def eidForRequestId(self, requestId):
+		with self.lock:
+			return self.index.byRequestId.get(int(requestId))
+
+	def get(self, eid):
+		with self.lock:
+			return self.index.get(eid)
+
+	def findByRequestId(self, requestId):
+		with self.lock:
+			return self.index.findByRequestId(requestId)
+
+	def findByResourceId(self, resourceId):
+		with self.lock:
+			return self.index.findByResourceId(resourceId)
+
+	def findByState(self, state):
+		with self.lock:
+			return self.index.findByState(state)
+
+	def putSummaries(self, summaries):
+		# the summaries table is small, so it is rewritten as a whole
+		with self.lock:
+			self.summaries.update(summaries)
+			self.summaryTable.purge()
+			self.summaryTable.insert_multiple(list(self.summaries.values()))
+
+	def getSummary(self, resourceId):
+		with self.lock:
+			summary=self.summaries.get(str(resourceId))
+			if summary==None:
+				return None
+			return dict(summary)
+
+	def maxIds(self):
+		with self.lock:
+			return self.index.maxIds()
+
+	def close(self):
+		with self.lock:
+			self.db.close()
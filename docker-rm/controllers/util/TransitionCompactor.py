@@ -0,0 +1,120 @@
+import json
+import logging
+import threading
+import time
+from controllers.util.Timestamp import parseTimestamp
+
+TERMINAL_STATES=['COMPLETED','FAILED']
+
+class TransitionCompactor:
+	"""
+		Retention policy for finished transitions
+		-----------------------------------------
+		Periodically evicts COMPLETED and FAILED transitions that are older than
+		maxAge seconds, or beyond the newest maxPerResource for their resource.
+		Evictions are removed in batches. Before a resource loses its history a
+		small summary is kept with its install time and last transition.
+	"""
+	def __init__(self, db, maxAge=None, maxPerResource=None, interval=60, batchSize=500):
+		self.logger = logging.getLogger(__name__)
+		self.db=db
+		self.maxAge=maxAge
+		self.maxPerResource=maxPerResource
+		self.interval=interval
+		self.batchSize=batchSize
+
+		self.lock=threading.Lock()
+		self.evictedRows=0
+		self.bytesReclaimed=0
+		self.runs=0
+		self.lastRunSeconds=0.0
+
+		self.stopped=threading.Event()
+		self.thread=None
+
+	def start(self):
+		self.logger.debug('starting transition compactor, maxAge='+str(self.maxAge)+' maxPerResource='+str(self.maxPerResource))
+		self.thread=threading.Thread(target=self.runLoop, name='transition-compactor', daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
+
+	def runLoop(self):
+		while not self.stopped.wait(self.interval):
+			try:
+				self.runOnce()
+			except Exception as ex:
+				self.logger.error('transition compaction failed '+str(type(ex).__name__)+' '+str(ex))
+
+	def runOnce(self):
+		start=time.monotonic()
+		byResource={}
+		for state in TERMINAL_STATES:
+			for transition in self.db.findTransitionsByState(state):
+				byResource.setdefault(transition.get('resourceId'), []).append(transition)
+
+		cutoff=None
+		if self.maxAge!=None:
+			cutoff=time.time()-self.maxAge
+
+		evicted=[]
+		summaries={}
+		for resourceId, transitions in byResource.items():
+			transitions.sort(key=lambda t: int(t['requestId']), reverse=True)
+			expired=[t for position, t in enumerate(transitions) if self.isExpired(t, position, cutoff)]
+			if len(expired)>0:
+				evicted.extend(expired)
+				summaries[resourceId]=self.summarise(resourceId, transitions)
+
+		if len(summaries)>0:
+			self.db.saveResourceSummaries(summaries)
+
+		for i in range(0, len(evicted), self.batchSize):
+			batch=evicted[i:i+self.batchSize]
+			self.db.removeTransitions([t['requestId'] for t in batch])
+			with self.lock:
+				self.evictedRows=self.evictedRows+len(batch)
+				self.bytesReclaimed=self.bytesReclaimed+sum(len(json.dumps(t)) for t in batch)
+
+		with self.lock:
+			self.runs=self.runs+1
+			self.lastRunSeconds=time.monotonic()-start
+
+		if len(evicted)>0:
+			self.logger.info('evicted '+str(len(evicted))+' finished transitions from '+str(len(summaries))+' resources')
+		return len(evicted)
+
+	def isExpired(self, transition, position, cutoff):
+		if self.maxPerResource!=None and position>=self.maxPerResource:
+			return True
+		if cutoff!=None:
+			finishedAt=parseTimestamp(transition.get('finishedAt'))
+			if finishedAt!=None and finishedAt<cutoff:
+				return True
+		return False
+
+	def summarise(self, resourceId, transitions):
+		# transitions are newest first, merge into any summary left by an earlier run
+		summary=self.db.findResourceSummary(resourceId) or {'resourceId':resourceId}
+		latest=transitions[0]
+		summary['lastTransition']={
+			'requestId':latest['requestId'],
+			'transitionName':latest.get('transitionName'),
+			'requestState':latest['requestState'],
+			'finishedAt':latest.get('finishedAt')
+		}
+		for transition in transitions:
+			if str(transition.get('transitionName')).lower()=='install' and transition['requestState']=='COMPLETED':
+				summary['installedAt']=transition.get('finishedAt')
+				break
+		return summary
+
+	def getMetrics(self):
+		with self.lock:
+			return {
+				'evictedRows':self.evictedRows,
+				'bytesReclaimed':self.bytesReclaimed,
+				'runs':self.runs,
+				'lastRunSeconds':self.lastRunSeconds
+			}
@@ -0,0 +1,109 @@
+import logging
+
+class TransitionIndex:
+	"""
+		In memory index over the transitions table
+		------------------------------------------
+		Keeps a primary index by requestId and secondary indexes by resourceId
+		and requestState so status polls and history lookups do not have to scan
+		the whole table. Entries are keyed by the eid assigned by the storage.
+	"""
+	def __init__(self):
+		self.logger = logging.getLogger(__name__)
+		# eid -> transition document
+		self.transitions={}
+		# requestId -> eid
+		self.byRequestId={}
+		# resourceId -> set of eids
+		self.byResourceId={}
+		# requestState -> set of eids
+		self.byState={}
+
+	def rebuild(self, documents):
+		# documents is an iterable of (eid, transition) pairs
+		self.clear()
+		for eid, transition in documents:
+			self.add(eid, transition)
+		self.logger.debug('rebuilt transition index with '+str(len(self.transitions))+' entries')
+
+	def clear(self):
+		self.transitions={}
+		self.byRequestId={}
+		self.byResourceId={}
+		self.byState={}
+
+	def add(self, eid, transition):
+		transition=dict(transition)
+		self.transitions[eid]=transition
+		self.indexEntry(eid, transition)
+
+	def update(self, eid, fields):
+		# merge fields into the stored document, the same way the storage update does
+		transition=self.transitions.get(eid)
+		if transition==None:
+			self.logger.debug('no indexed transition with eid '+str(eid))
+			return
+		self.unindexEntry(eid, transition)
+		transition.update(fields)
+		self.indexEntry(eid, transition)
+
+	def remove(self, eid):
+		transition=self.transitions.pop(eid, None)
+		if transition!=None:
+			self.unindexEntry(eid, transition)
+
+	def get(self, eid):
+		return self.copy(self.transitions.get(eid))
+
+	def findByRequestId(self, requestId):
+		eid=self.byRequestId.get(int(requestId))
+		if eid==None:
+			return None
+		return self.copy(self.transitions[eid])
+
+	def findByResourceId(self, resourceId):
+		return [self.copy(self.transitions[eid]) for eid in sorted(self.byResourceId.get(str(resourceId), ()))]
+
+	def findByState(self, requestState):
+		return [self.copy(self.transitions[eid]) for eid in sorted(self.byState.get(requestState, ()))]
+
+	def maxIds(self):
+		# highest requestId and numeric resourceId seen, used to restore id counters
+		maxRequestId=max(self.byRequestId, default=0)
+		maxResourceId=max((int(r) for r in self.byResourceId if r.isdigit()), default=-1)
+		return maxRequestId, maxResourceId
+
+	def eids(self):
+		return list(self.transitions)
+
+	def __len__(self):
+		return len(self.transitions)
+
+	def indexEntry(self, eid, transition):
+		if 'requestId' in transition:
+			self.byRequestId[int(transition['requestId'])]=eid
+		if 'resourceId' in transition:
+			self.byResourceId.setdefault(str(transition['resourceId']), set()).add(eid)
+		if 'requestState' in transition:
+			self.byState.setdefault(transition['requestState'], set()).add(eid)
+
+	def unindexEntry(self, eid, transition):
+		if 'requestId' in transition and self.byRequestId.get(int(transition['requestId']))==eid:
+			del self.byRequestId[int(transition['requestId'])]
+		if 'resourceId' in transition:
+			self.discard(self.byResourceId, str(transition['resourceId']), eid)
+		if 'requestState' in transition:
+			self.discard(self.byState, transition['requestState'], eid)
+
+	def discard(self, index, key, eid):
+		eids=index.get(key)
+		if eids!=None:
+			eids.discard(eid)
+			if len(eids)==0:
+				del index[key]
+
+	def copy(self, transition):
+		# hand out copies so callers can decorate responses without corrupting the index
+		if transition==None:
+			return None
+		return dict(transition)
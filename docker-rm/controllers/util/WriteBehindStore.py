@@ -0,0 +1,194 @@
+import logging
+import threading
+
+# marker for a transition removed since the last flush
+REMOVED=object()
+
+class WriteBehindStore:
+	"""
+		Write-behind buffer in front of a transition store
+		--------------------------------------------------
+		Inserts, updates and removes are coalesced per requestId in memory and
+		written to the underlying store in one batch, either every flushInterval
+		seconds or as soon as maxBatchSize transitions are dirty. Readers see
+		buffered changes immediately. Transitions are addressed by requestId
+		rather than by storage eid, since the eid is only known after a flush.
+	"""
+	def __init__(self, store, flushInterval=1.0, maxBatchSize=100):
+		self.logger = logging.getLogger(__name__)
+		self.store=store
+		self.flushInterval=flushInterval
+		self.maxBatchSize=maxBatchSize
+
+		self.lock=threading.Lock()
+		self.flushLock=threading.Lock()
+		# requestId -> latest document, or REMOVED
+		self.pending={}
+		# requestId -> change counter, used to tell if a row changed during a flush
+		self.versions={}
+
+		self.wake=threading.Event()
+		self.stopped=False
+		self.flusher=threading.Thread(target=self.flushLoop, name='db-write-behind', daemon=True)
+		self.flusher.start()
+
+	def purge(self):
+		with self.flushLock, self.lock:
+			self.pending={}
+			self.versions={}
+			self.store.purge()
+
+	def insert(self, transition):
+		requestId=int(transition['requestId'])
+		self.stage(requestId, dict(transition))
+		return requestId
+
+	def update(self, requestId, transition):
+		with self.lock:
+			document=self.pending.get(requestId)
+			if document!=None:
+				dirty=self.mergeLocked(requestId, document, transition)
+		if document==None:
+			# first change since the last flush, start from the stored row. Only a flush drops buffered
+			# documents, so with none running the stored row cannot go stale before it is merged
+			with self.flushLock:
+				stored=self.store.findByRequestId(requestId)
+				with self.lock:
+					document=self.pending.get(requestId, stored)
+					if document==None:
+						self.logger.debug('no transition with request id '+str(requestId)+' to update')
+						return
+					dirty=self.mergeLocked(requestId, document, transition)
+		self.wakeIfFull(dirty)
+
+	def mergeLocked(self, requestId, document, transition):
+		if document is REMOVED:
+			return len(self.pending)
+		# buffered documents may be in the middle of a flush, so never change them in place
+		document=dict(document)
+		document.update(transition)
+		return self.stageLocked(requestId, document)
+
+	def remove(self, requestId):
+		self.stage(requestId, REMOVED)
+
+	def stage(self, requestId, document):
+		with self.lock:
+			dirty=self.stageLocked(requestId, document)
+		self.wakeIfFull(dirty)
+
+	def stageLocked(self, requestId, document):
+		self.pending[requestId]=document
+		self.versions[requestId]=self.versions.get(requestId, 0)+1
+		return len(self.pending)
+
+	def wakeIfFull(self, dirty):
+		if dirty>=self.maxBatchSize:
+			self.wake.set()
+
+	def writeBatch(self, inserts, updates, removes):
+		# batches are staged like any other change, updates and removes are addressed by requestId
+		requestIds=[self.insert(transition) for transition in inserts]
+		for requestId, transition in updates:
+			self.update(requestId, transition)
+		for requestId in removes:
+			self.remove(requestId)
+		return requestIds
+
+	def putSummaries(self, summaries):
+		self.store.putSummaries(summaries)
+
+	def getSummary(self, resourceId):
+		return self.store.getSummary(resourceId)
+
+	def get(self, requestId):
+		return self.findByRequestId(requestId)
+
+	def findByRequestId(self, requestId):
+		requestId=int(requestId)
+		with self.lock:
+			document=self.pending.get(requestId)
+		if document is REMOVED:
+			return None
+		if document!=None:
+			return dict(document)
+		return self.store.findByRequestId(requestId)
+
+	def eidForRequestId(self, requestId):
+		# transitions are addressed by requestId in write-behind mode
+		if self.findByRequestId(requestId)==None:
+			return None
+		return int(requestId)
+
+	def findByResourceId(self, resourceId):
+		return self.merge(self.store.findByResourceId(resourceId), 'resourceId', str(resourceId))
+
+	def findByState(self, state):
+		return self.merge(self.store.findByState(state), 'requestState', state)
+
+	def merge(self, stored, field, value):
+		# stored rows that are dirty are replaced by their buffered version
+		with self.lock:
+			transitions=[t for t in stored if int(t['requestId']) not in self.pending]
+			for document in self.pending.values():
+				if document is not REMOVED and document.get(field)==value:
+					transitions.append(dict(document))
+		transitions.sort(key=lambda t: int(t['requestId']))
+		return transitions
+
+	def maxIds(self):
+		maxRequestId, maxResourceId=self.store.maxIds()
+		with self.lock:
+			for requestId, document in self.pending.items():
+				maxRequestId=max(maxRequestId, requestId)
+				if document is not REMOVED and str(document.get('resourceId')).isdigit():
+					maxResourceId=max(maxResourceId, int(document['resourceId']))
+		return maxRequestId, maxResourceId
+
+	def flushLoop(self):
+		while not self.stopped:
+			self.wake.wait(self.flushInterval)
+			self.wake.clear()
+			try:
+				self.flush()
+			except Exception as ex:
+				self.logger.error('write-behind flush failed, will retry '+str(type(ex).__name__)+' '+str(ex))
+
+	def flush(self):
+		with self.flushLock:
+			with self.lock:
+				if len(self.pending)==0:
+					return 0
+				batch=[(requestId, document, self.versions[requestId]) for requestId, document in self.pending.items()]
+
+			inserts=[]
+			updates=[]
+			removes=[]
+			for requestId, document, version in batch:
+				eid=self.store.eidForRequestId(requestId)
+				if document is REMOVED:
+					if eid!=None:
+						removes.append(eid)
+				elif eid==None:
+					inserts.append(document)
+				else:
+					updates.append((eid, document))
+
+			self.store.writeBatch(inserts, updates, removes)
+
+			with self.lock:
+				# rows changed while the batch was written stay dirty for the next flush
+				for requestId, document, version in batch:
+					if self.versions.get(requestId)==version:
+						del self.pending[requestId]
+						del self.versions[requestId]
+
+			self.logger.debug('flushed '+str(len(batch))+' transitions')
+			return len(batch)
+
+	def close(self):
+		self.stopped=True
+		self.wake.set()
+		self.flusher.join()
+		self.flush()
+		self.store.close()
@@ -0,0 +1,252 @@
+# A fake Docker Engine API on a unix socket for the async transition engine tests and benchmarks. It
+# answers only the calls the engine makes: image inspect, container create, start,
+# inspect and remove, the archive calls that exchange properties with a container,
+# exec, and network create, list, remove, connect and disconnect. Everything else,
+# /_ping and /events included, is a 404, so neither the docker SDK nor the resource
+# manager can be run against it. Every exec takes execDelay seconds. Commands with
+# hang in their name run until they are killed through the transition pidfile, those
+# with fail in their name write to stderr and exit 1, and those with chatty in their
+# name write a line at a time over the delay. Exec output is streamed as it is written.
+
+import asyncio
+import io
+import itertools
+import json
+import os
+import re
+import shlex
+import struct
+import sys
+import tarfile
+from urllib.parse import unquote
+
+# lines written by a chatty command
+CHATTY_LINES=20
+
+class FakeDockerAPI:
+	def __init__(self, execDelay=0.05, images=None, requestDelay=0, concurrency=None, apiVersion='1.44'):
+		self.execDelay=execDelay
+		# newest api version the daemon speaks, unversioned requests use it
+		self.apiVersion=apiVersion
+		# seconds the daemon takes to answer any request
+		self.requestDelay=requestDelay
+		# requests the daemon works on at once, None for no limit
+		self.concurrency=concurrency
+		self.busy=None
+		# None accepts any image name
+		self.images=images
+		self.ids=itertools.count(1)
+		self.containers={}
+		self.networks={}
+		self.execs={}
+		self.requests=0
+
+	def newId(self):
+		return '%064x' % next(self.ids)
+
+	async def serve(self, socketPath):
+		if os.path.exists(socketPath):
+			os.remove(socketPath)
+		if self.concurrency!=None:
+			self.busy=asyncio.Semaphore(self.concurrency)
+		return await asyncio.start_unix_server(self.handle, path=socketPath)
+
+	async def handle(self, reader, writer):
+		try:
+			requestLine=await reader.readline()
+			if not requestLine:
+				return
+			method, target, version=requestLine.decode('ascii').split()
+			length=0
+			contentType=''
+			while True:
+				line=await reader.readline()
+				if line in (b'\r\n', b''):
+					break
+				name, value=line.decode('latin-1').split(':', 1)
+				if name.strip().lower()=='content-length':
+					length=int(value)
+				if name.strip().lower()=='content-type':
+					contentType=value.strip()
+			body=await reader.readexactly(length) if length else None
+			if body!=None and contentType=='application/json':
+				body=json.loads(body.decode('utf-8'))
+			self.requests=self.requests+1
+			if self.busy!=None:
+				async with self.busy:
+					await asyncio.sleep(self.requestDelay)
+			elif self.requestDelay:
+				await asyncio.sleep(self.requestDelay)
+
+			version=re.match('^/v([0-9.]+)/', target)
+			path=re.sub('^/v[0-9.]+', '', target.split('?')[0])
+			query=unquote(target.split('?')[1]) if '?' in target else ''
+			await self.route(method, path, query, body, writer, version.group(1) if version else self.apiVersion)
+		finally:
+			writer.close()
+
+	def respond(self, writer, status, body=None):
+		payload=json.dumps(body).encode('utf-8') if body!=None else b''
+		writer.write(('HTTP/1.1 %d X\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n' % (status, len(payload))).encode('ascii')+payload)
+
+	def respondArchive(self, writer, path, data):
+		info=tarfile.TarInfo(os.path.basename(path))
+		info.size=len(data)
+		buffer=io.BytesIO()
+		with tarfile.open(fileobj=buffer, mode='w') as tar:
+			tar.addfile(info, io.BytesIO(data))
+		payload=buffer.getvalue()
+		writer.write(('HTTP/1.1 200 OK\r\nContent-Type: application/x-tar\r\nContent-Length: %d\r\n\r\n' % len(payload)).encode('ascii')+payload)
+
+	async def route(self, method, path, query, body, writer, version):
+		parts=path.strip('/').split('/')
+		if parts[0]=='version':
+			return self.respond(writer, 200, {'ApiVersion':self.apiVersion})
+
+		if parts[0]=='images' and method=='GET':
+			name='/'.join(parts[1:-1])
+			if self.images!=None and name not in self.images:
+				return self.respond(writer, 404, {'message':'No such image: '+name})
+			return self.respond(writer, 200, {'Id':'sha256:'+self.newId()})
+
+		if parts[0]=='containers':
+			if parts[1]=='create':
+				containerId=self.newId()
+				name=query.split('name=')[1] if 'name=' in query else containerId
+				network=body['HostConfig']['NetworkMode']
+				# before api 1.44 a container is created on one network only
+				endpoints=list(((body.get('NetworkingConfig') or {}).get('EndpointsConfig') or {}))
+				if len(endpoints)>1 and tuple(int(p) for p in version.split('.'))<(1, 44):
+					return self.respond(writer, 400, {'message':'Container cannot be connected to network endpoints: '+', '.join(endpoints)})
+				extra=[n for n in endpoints if n!=network]
+				for n in extra:
+					if n not in self.networks.values():
+						return self.respond(writer, 404, {'message':'network '+n+' not found'})
+				self.containers[containerId]={'name':name, 'network':network, 'networks':extra, 'files':{}, 'running':None}
+				return self.respond(writer, 201, {'Id':containerId})
+			container=self.findContainer(parts[1])
+			if container==None:
+				return self.respond(writer, 404, {'message':'No such container: '+parts[1]})
+			containerId, state=container
+			if method=='DELETE':
+				del self.containers[containerId]
+				return self.respond(writer, 204)
+			if parts[2]=='start':
+				return self.respond(writer, 204)
+			if parts[2]=='json':
+				networks=dict((n, {'IPAddress':'172.18.%d.%d' % (i, int(containerId, 16) % 250+2)})
+							for i, n in enumerate([state['network']]+state['networks']))
+				return self.respond(writer, 200, {'Id':containerId, 'Name':'/'+state['name'], 'NetworkSettings':{'Networks':networks}})
+			if parts[2]=='archive':
+				path=query.split('path=')[1]
+				if method=='PUT':
+					with tarfile.open(fileobj=io.BytesIO(body), mode='r') as tar:
+						for member in tar:
+							state['files'][path.rstrip('/')+'/'+member.name]=tar.extractfile(member).read()
+					return self.respond(writer, 200)
+				if path not in state['files']:
+					return self.respond(writer, 404, {'message':'Could not find the file '+path+' in container '+parts[1]})
+				return self.respondArchive(writer, path, state['files'][path])
+			if parts[2]=='exec':
+				execId=self.newId()
+				self.execs[execId]={'container':containerId, 'cmd':body['Cmd'], 'exitCode':None}
+				return self.respond(writer, 201, {'Id':execId})
+
+		if parts[0]=='exec':
+			execution=self.execs.get(parts[1])
+			if execution==None:
+				return self.respond(writer, 404, {'message':'No such exec instance'})
+			if parts[2]=='json':
+				return self.respond(writer, 200, {'ExitCode':execution['exitCode'], 'Running':False})
+			# exec output is a hijacked stream of frames that ends when the connection closes
+			writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n\r\n')
+			def emit(stream, data):
+				if len(data)>0:
+					writer.write(struct.pack('>BxxxI', stream, len(data))+data)
+			emit(1, await self.runExec(execution, emit))
+			return
+
+		if parts[0]=='networks':
+			if len(parts)==1:
+				# every network, the name filter is left to the caller
+				return self.respond(writer, 200, [{'Id':networkId, 'Name':name} for networkId, name in self.networks.items()])
+			if parts[1]=='create':
+				if body.get('CheckDuplicate') and body['Name'] in self.networks.values():
+					return self.respond(writer, 409, {'message':'network with name '+body['Name']+' already exists'})
+				networkId=self.newId()
+				self.networks[networkId]=body['Name']
+				return self.respond(writer, 201, {'Id':networkId})
+			if method=='DELETE':
+				# by id or name, refused while a container is connected
+				for networkId, name in list(self.networks.items()):
+					if parts[1] in (networkId, name):
+						if any(name in state['networks'] for state in self.containers.values()):
+							return self.respond(writer, 403, {'message':'network '+name+' has active endpoints'})
+						del self.networks[networkId]
+						return self.respond(writer, 204)
+				return self.respond(writer, 404, {'message':'No such network'})
+			if parts[-1] in ('connect', 'disconnect'):
+				container=self.findContainer(body['Container'])
+				if container==None:
+					return self.respond(writer, 404, {'message':'No such container'})
+				name=self.networks.get(parts[1], parts[1])
+				if parts[-1]=='connect':
+					container[1]['networks'].append(name)
+				elif name in container[1]['networks']:
+					container[1]['networks'].remove(name)
+				return self.respond(writer, 200)
+
+		self.respond(writer, 404, {'message':'page not found'})
+
+	def findContainer(self, key):
+		if key in self.containers:
+			return key, self.containers[key]
+		for containerId, state in self.containers.items():
+			if state['name']==key:
+				return containerId, state
+		return None
+
+	async def runExec(self, execution, emit):
+		cmd=execution['cmd']
+		container=self.containers[execution['container']]
+		files=container['files']
+		execution['exitCode']=0
+		if cmd[:2]==['/bin/sh', '-c'] and cmd[2].startswith('echo $$ > '):
+			# a lifecycle command wrapped to record its pid, the kill command stops it
+			running=asyncio.ensure_future(self.runCommand(shlex.split(cmd[2].split('; exec ', 1)[1]), execution, emit))
+			container['running']=running
+			try:
+				return await running
+			except asyncio.CancelledError:
+				execution['exitCode']=137
+				return b''
+			finally:
+				container['running']=None
+		if cmd[:2]==['/bin/sh', '-c'] and 'kill -KILL' in cmd[2]:
+			if container['running']!=None:
+				container['running'].cancel()
+			return b''
+		if cmd[:2]==['/bin/sh', '-c'] and '>' in cmd[2]:
+			content, target=cmd[2].rsplit('>', 1)
+			# the shell would end the quoted string at the first quote in the content
+			content=content.strip()[6:-1] if content.startswith('echo ') else content
+			if "'" in content:
+				execution['exitCode']=2
+				return b'sh: syntax error: unterminated quoted string\n'
+			files[target.strip()]=content.encode('utf-8')
+			return b''
+		if cmd[0]=='cat':
+			return files.get(cmd[1], b'')
+		return await self.runCommand(cmd, execution, emit)
+
+	async def runCommand(self, cmd, execution, emit):
+		if 'chatty' in cmd[0]:
+			for line in range(CHATTY_LINES):
+				emit(1, ('line '+str(line)+' of '+cmd[0]+'\n').encode('utf-8'))
+				await asyncio.sleep(self.execDelay/CHATTY_LINES)
+			return b''
+		await asyncio.sleep(3600 if 'hang' in cmd[0] else self.execDelay)
+		if 'fail' in cmd[0]:
+			execution['exitCode']=1
+			emit(2, (cmd[0]+': something went wrong\n').encode('utf-8'))
+		return ('ran '+' '.join(cmd)+'\n').encode('utf-8')
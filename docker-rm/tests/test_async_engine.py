@@ -0,0 +1,233 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import yaml
+from controllers.resource.DockerEndpoint import DockerEndpoints
+from controllers.transition.AsyncTransitionEngine import AsyncTransitionEngine, ImageNotFoundException, NetworkRemoveException, NETWORK_TYPE
+from controllers.transition.TransitionDeadline import TransitionDeadline, TransitionStoppedException
+from controllers.transition.TransitionOutput import TransitionOutput, CommandFailedException
+from controllers.util.DockerAPI import DockerAPIException
+from tests.fake_docker_api import FakeDockerAPI
+
+class ExampleType:
+	name='resource::example::1.0'
+	imageName='dockerrm_example'
+	operationsPath={'operations':{'restart':'/operations/restart.sh'}}
+	def __init__(self, install='/lifecycle/install.sh'):
+		self.lifecyclePath={'lifecycle':{'install':install}}
+
+class NetworkType:
+	name=NETWORK_TYPE
+
+class Instance:
+	# the attributes the engine reads and writes on a ResourceInstance
+	def __init__(self, resourceId, resourceType=None, location='local', **properties):
+		self.resourceId=resourceId
+		self.name='example'+str(resourceId)
+		self.type=resourceType or ExampleType()
+		self.location=location
+		self.properties=properties
+		self.containerId=None
+		self.containerName=None
+		self.readonly=False
+
+def startFakeDocker(fake, socketPath):
+	# the fake daemon runs on a loop of its own, as a real one would be another process
+	loop=asyncio.new_event_loop()
+	ready=threading.Event()
+	def serve():
+		asyncio.set_event_loop(loop)
+		loop.run_until_complete(fake.serve(socketPath))
+		ready.set()
+		loop.run_forever()
+	threading.Thread(target=serve, daemon=True).start()
+	ready.wait()
+	return loop
+
+class AsyncTransitionEngineTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.loops=[]
+		self.engine=None
+
+	def tearDown(self):
+		if self.engine!=None:
+			self.engine.stop()
+		for loop in self.loops:
+			loop.call_soon_threadsafe(loop.stop)
+		shutil.rmtree(self.directory)
+
+	def startEngine(self, daemons=1, maxInFlight=1000, **fakeOptions):
+		fakeOptions.setdefault('execDelay', 0.01)
+		self.fakes=[]
+		endpoints=[]
+		for i in range(daemons):
+			fake=FakeDockerAPI(**fakeOptions)
+			socketPath=os.path.join(self.directory, 'docker'+str(i)+'.sock')
+			self.loops.append(startFakeDocker(fake, socketPath))
+			self.fakes.append(fake)
+			endpoints.append({'name':'daemon'+str(i), 'url':'unix://'+socketPath})
+		self.engine=AsyncTransitionEngine(endpoints=DockerEndpoints([{'name':'local', 'endpoints':endpoints}]), maxInFlight=maxInFlight)
+		self.engine.start()
+		return self.fakes[0]
+
+	def result(self, coroutine):
+		return self.engine.submit(coroutine).result(timeout=10)
+
+	def install(self, instance, deadline=None, output=None):
+		return self.result(self.engine.runStandardTransition(instance, 'install', None, deadline, output=output))
+
+	def test_install_creates_the_container_and_runs_the_script(self):
+		fake=self.startEngine()
+		instance=Instance(1, docker_network='bridge', docker_ipaddr='', hostname='example')
+		output=TransitionOutput()
+		response=self.install(instance, output=output)
+		self.assertEqual(response['status'], 'OK')
+		containerId, state=fake.findContainer(instance.containerId)
+		self.assertEqual(state['name'], 'dockerrm_example1')
+		self.assertEqual(instance.containerName, 'dockerrm_example1')
+		self.assertTrue(instance.properties['docker_ipaddr'].startswith('172.18.'))
+		self.assertEqual(yaml.safe_load(state['files']['/etc/rmparams'].decode('utf-8'))['hostname'], 'example')
+		self.assertEqual(output.exitCode, 0)
+		self.assertIn('ran /lifecycle/install.sh', output.getText('stdout'))
+		self.assertEqual(self.engine.getMetrics()['completed'], 1)
+
+	def test_properties_written_by_the_script_are_read_back(self):
+		fake=self.startEngine()
+		instance=Instance(1, docker_network='bridge', motd='')
+		self.install(instance)
+		state=fake.findContainer(instance.containerId)[1]
+		state['files']['/etc/rmparams']=yaml.safe_dump({'motd':"it's \"quoted\"", 'unknown':'x'}).encode('utf-8')
+		self.result(self.engine.runOperation(instance, 'restart', {'motd':'ignored'}))
+		self.assertEqual(instance.properties['motd'], "it's \"quoted\"")
+		self.assertNotIn('unknown', instance.properties)
+		self.assertEqual(yaml.safe_load(state['files']['/etc/opparams'].decode('utf-8')), {'motd':'ignored'})
+
+	def test_missing_image(self):
+		self.startEngine(images=[])
+		with self.assertRaises(ImageNotFoundException):
+			self.install(Instance(1))
+		self.assertEqual(self.engine.getMetrics()['failed'], 1)
+
+	def test_failing_script_fails_with_its_stderr(self):
+		self.startEngine()
+		output=TransitionOutput()
+		with self.assertRaises(CommandFailedException) as raised:
+			self.install(Instance(1, ExampleType('/lifecycle/fail.sh')), output=output)
+		self.assertEqual(raised.exception.exitCode, 1)
+		self.assertIn('/lifecycle/fail.sh: something went wrong', raised.exception.message)
+		self.assertEqual(output.exitCode, 1)
+
+	def test_chatty_script_output_arrives_while_it_runs(self):
+		self.startEngine(execDelay=0.5)
+		output=TransitionOutput()
+		future=self.engine.submit(self.engine.runStandardTransition(Instance(1, ExampleType('/lifecycle/chatty.sh')), 'install', None, output=output))
+		seen=[]
+		for chunks in output.follow(poll=0.01):
+			seen.append(future.done())
+			if len(chunks)>0 and not future.done():
+				break
+		self.assertFalse(seen[-1])
+		future.result(timeout=10)
+		self.assertEqual(len(output.getText('stdout').splitlines()), 20)
+
+	def test_deadline_kills_a_hung_script(self):
+		self.startEngine()
+		deadline=TransitionDeadline(timeout=0.2)
+		deadline.start()
+		started=time.monotonic()
+		with self.assertRaises(TransitionStoppedException) as raised:
+			self.install(Instance(1, ExampleType('/lifecycle/hang.sh')), deadline)
+		deadline.finish()
+		self.assertLess(time.monotonic()-started, 5)
+		self.assertIn('timed out', raised.exception.reason)
+		# the kill exec finishes on its own, the engine forgets it once it has
+		while len(self.engine.kills)>0 and time.monotonic()-started<5:
+			time.sleep(0.01)
+		self.assertEqual(self.engine.kills, set())
+
+	def test_extra_networks_joined_at_create(self):
+		fake=self.startEngine()
+		fake.networks['n1']='backend'
+		instance=Instance(1, docker_network='bridge', docker_network1='backend', docker_ipaddr1='', docker_network2='missing')
+		self.install(instance)
+		state=fake.findContainer(instance.containerId)[1]
+		self.assertEqual(state['networks'], ['backend'])
+		self.assertTrue(instance.properties['docker_ipaddr1'].startswith('172.18.1.'))
+
+	def test_extra_networks_connected_before_start_on_older_daemons(self):
+		fake=self.startEngine(apiVersion='1.40')
+		fake.networks['n1']='backend'
+		instance=Instance(1, docker_network='bridge', docker_network1='backend')
+		self.install(instance)
+		self.assertEqual(fake.findContainer(instance.containerId)[1]['networks'], ['backend'])
+
+	def test_uninstall_removes_the_container(self):
+		fake=self.startEngine()
+		instance=Instance(1)
+		self.install(instance)
+		self.assertEqual(self.result(self.engine.runStandardTransition(instance, 'uninstall', None))['status'], 'OK')
+		self.assertEqual(fake.containers, {})
+
+	def test_network_on_every_endpoint_of_the_location(self):
+		self.startEngine(daemons=2)
+		network=Instance(1, NetworkType(), networkname='backend', subnet='10.0.0.0/24', gateway='10.0.0.1')
+		self.assertTrue(self.engine.handles(network))
+		self.result(self.engine.runStandardTransition(network, 'install', None))
+		self.assertEqual([list(fake.networks.values()) for fake in self.fakes], [['backend'], ['backend']])
+		self.assertIn(network.properties['networkid'], self.fakes[0].networks)
+		self.assertEqual(network.endpoint, 'daemon0')
+		self.result(self.engine.runStandardTransition(network, 'uninstall', None))
+		self.assertEqual([fake.networks for fake in self.fakes], [{}, {}])
+
+	def test_handles_only_unix_socket_endpoints(self):
+		self.startEngine()
+		endpoints=DockerEndpoints([{'name':'remote', 'endpoints':[{'name':'remote0', 'url':'tcp://10.0.0.2:2376'}]}])
+		self.assertTrue(self.engine.handlesEndpoint(self.engine.endpoints.forLocation('local')[0]))
+		self.assertFalse(self.engine.handlesEndpoint(endpoints.forLocation('remote')[0]))
+
+	def test_network_failing_on_one_endpoint_is_removed_from_the_others(self):
+		self.startEngine(daemons=2)
+		self.fakes[1].networks['n1']='backend'
+		network=Instance(1, NetworkType(), networkname='backend', subnet='10.0.0.0/24', gateway='10.0.0.1')
+		with self.assertRaises(DockerAPIException):
+			self.result(self.engine.runStandardTransition(network, 'install', None))
+		self.assertEqual(self.fakes[0].networks, {})
+		self.assertEqual(list(self.fakes[1].networks.values()), ['backend'])
+
+	def test_network_removed_from_every_endpoint_it_can_be(self):
+		self.startEngine(daemons=3)
+		network=Instance(1, NetworkType(), networkname='backend', subnet='10.0.0.0/24', gateway='10.0.0.1')
+		self.result(self.engine.runStandardTransition(network, 'install', None))
+		self.fakes[1].containers['c1']={'name':'user', 'network':'bridge', 'networks':['backend'], 'files':{}, 'running':None}
+		with self.assertRaises(NetworkRemoveException) as raised:
+			self.result(self.engine.runStandardTransition(network, 'uninstall', None))
+		self.assertEqual([name for name, ex in raised.exception.failures], ['daemon1'])
+		self.assertIn('daemon1', raised.exception.message)
+		self.assertEqual([list(fake.networks.values()) for fake in self.fakes], [[], ['backend'], []])
+		# once the container has gone a retry removes what is left
+		del self.fakes[1].containers['c1']
+		self.assertEqual(self.result(self.engine.runStandardTransition(network, 'uninstall', None))['status'], 'OK')
+		self.assertEqual([fake.networks for fake in self.fakes], [{}, {}, {}])
+		with self.assertRaises(NetworkRemoveException):
+			self.result(self.engine.runStandardTransition(network, 'uninstall', None))
+
+	def test_submit_waits_for_a_free_slot(self):
+		self.startEngine(maxInFlight=1)
+		first=self.engine.submit(asyncio.sleep(0.3))
+		submitted=threading.Event()
+		def submitSecond():
+			self.engine.submit(asyncio.sleep(0)).result()
+			submitted.set()
+		threading.Thread(target=submitSecond, daemon=True).start()
+		self.assertFalse(submitted.wait(0.1))
+		self.assertEqual(self.engine.getMetrics()['inFlight'], 1)
+		first.result(timeout=10)
+		self.assertTrue(submitted.wait(5))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+from controllers.resource.ContainerPool import ContainerPools
+
+class Type:
+	def __init__(self, name, size=None):
+		self.name=name
+		self.imageName='dockerrm_'+name
+		self.resourceDescriptor={'pool':{'size':size}} if size!=None else {}
+
+class Backend:
+	# the docker calls the pools make, recorded
+	def __init__(self, pooled=None):
+		self.lock=threading.Lock()
+		self.created=[]
+		self.removed=[]
+		self.pooled=pooled or {}
+		self.failing=False
+
+	def create(self, resourceType, name):
+		if self.failing:
+			raise RuntimeError('docker is down')
+		with self.lock:
+			self.created.append(name)
+			return 'id-'+name
+
+	def remove(self, containerId):
+		with self.lock:
+			self.removed.append(containerId)
+
+	def listPooled(self, resourceType):
+		return list(self.pooled.get(resourceType.name, []))
+
+def waitFor(condition):
+	deadline=time.monotonic()+5
+	while not condition() and time.monotonic()<deadline:
+		time.sleep(0.005)
+	return condition()
+
+class ContainerPoolsTest(unittest.TestCase):
+	def pools(self, backend, size=0):
+		self.backend=backend
+		return ContainerPools(backend, size=size, refillInterval=3600)
+
+	def ready(self, pools, name):
+		return pools.getMetrics()[name]['ready']
+
+	def test_pools_fill_to_their_size(self):
+		pools=self.pools(Backend(), size=1)
+		pools.configure([Type('web', 3), Type('db'), Type('batch', 0)])
+		self.assertEqual(sorted(pools.getMetrics()), ['db', 'web'])
+		self.assertTrue(waitFor(lambda: self.ready(pools, 'web')==3 and self.ready(pools, 'db')==1))
+		self.assertTrue(all(name.startswith('dockerrm_web_pool_') or name.startswith('dockerrm_db_pool_') for name in self.backend.created))
+
+	def test_claim_hands_over_a_container_and_refills(self):
+		pools=self.pools(Backend())
+		web=Type('web', 2)
+		pools.configure([web])
+		self.assertTrue(waitFor(lambda: self.ready(pools, 'web')==2))
+		claimed=[]
+		self.assertTrue(pools.claim(web, claimed.append))
+		self.assertTrue(claimed[0].startswith('id-dockerrm_web_pool_'))
+		self.assertTrue(waitFor(lambda: len(self.backend.created)==3 and self.ready(pools, 'web')==2))
+		self.assertEqual(pools.getMetrics()['web']['hits'], 1)
+
+	def test_claim_misses_when_nothing_is_ready(self):
+		pools=self.pools(Backend())
+		self.assertFalse(pools.claim(Type('web'), lambda containerId: None))
+		self.backend.failing=True
+		web=Type('web', 1)
+		pools.configure([web])
+		self.assertTrue(waitFor(lambda: pools.getMetrics()['web']['failed']>0))
+		self.assertFalse(pools.claim(web, lambda containerId: None))
+		self.assertEqual(pools.getMetrics()['web']['misses'], 1)
+
+	def test_container_that_cannot_be_prepared_is_removed(self):
+		pools=self.pools(Backend(pooled={'web':['left-over']}))
+		web=Type('web', 1)
+		pools.configure([web])
+		def prepare(containerId):
+			raise RuntimeError('container is not running')
+		self.assertFalse(pools.claim(web, prepare))
+		self.assertEqual(self.backend.removed, ['left-over'])
+		self.assertEqual(pools.getMetrics()['web']['misses'], 1)
+
+	def test_reconfigure_adopts_shrinks_and_drops_pools(self):
+		pools=self.pools(Backend(pooled={'web':['a', 'b', 'c'], 'db':['d']}))
+		pools.configure([Type('web', 3), Type('db', 1)])
+		self.assertEqual((self.ready(pools, 'web'), self.ready(pools, 'db')), (3, 1))
+		self.assertEqual(self.backend.created, [])
+		pools.configure([Type('web', 1)])
+		self.assertEqual(list(pools.getMetrics()), ['web'])
+		self.assertEqual(sorted(self.backend.removed), ['b', 'c', 'd'])
+		claimed=[]
+		pools.claim(Type('web', 1), claimed.append)
+		self.assertEqual(claimed, ['a'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+import unittest
+from controllers.resource.DockerStateCache import DockerStateCache
+
+STOP=object()
+
+class Source:
+	# the docker calls the cache makes, answered from dicts of attrs, with events pushed by the test
+	def __init__(self):
+		self.containers={}
+		self.networks={}
+		self.streams=queue.Queue()
+		self.calls=[]
+
+	def container(self, containerId, name, state='running', **networks):
+		self.containers[containerId]={'Id':containerId, 'Name':'/'+name, 'State':{'Status':state},
+									'NetworkSettings':{'Networks':dict((n, {'NetworkID':n, 'IPAddress':ip}) for n, ip in networks.items())}}
+
+	def listContainers(self):
+		self.calls.append('listContainers')
+		return [dict(attrs, Names=[attrs['Name']], State=attrs['State']['Status']) for attrs in self.containers.values()]
+
+	def inspectContainer(self, key):
+		self.calls.append('inspectContainer')
+		for attrs in self.containers.values():
+			if key in (attrs['Id'], attrs['Name'].lstrip('/')):
+				return attrs
+		return None
+
+	def listNetworks(self):
+		self.calls.append('listNetworks')
+		return list(self.networks.values())
+
+	def inspectNetwork(self, key):
+		self.calls.append('inspectNetwork')
+		return self.networks.get(key)
+
+	def events(self):
+		events=queue.Queue()
+		self.streams.put(events)
+		def stream():
+			while True:
+				event=events.get()
+				if event is STOP:
+					return
+				yield event
+		return stream()
+
+def event(eventType, action, actorId, **attributes):
+	return {'Type':eventType, 'Action':action, 'Actor':{'ID':actorId, 'Attributes':attributes}}
+
+class DockerStateCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.source=Source()
+		self.source.container('c1', 'web1', bridge='172.17.0.2')
+		self.source.networks['n1']={'Id':'n1', 'Name':'backend'}
+		self.cache=DockerStateCache(self.source, waitTimeout=0.2)
+
+	def tearDown(self):
+		if self.cache.watcher!=None:
+			self.events.put(STOP)
+
+	def watch(self):
+		self.cache.watch()
+		self.events=self.source.streams.get(timeout=5)
+		deadline=time.monotonic()+5
+		while not self.cache.live and time.monotonic()<deadline:
+			time.sleep(0.005)
+		self.assertTrue(self.cache.live)
+		self.source.calls=[]
+
+	def send(self, *events):
+		# a new container created after them marks the end of the events sent
+		marker='marker'+str(len(self.source.containers))
+		self.source.container(marker, marker)
+		for e in events+(event('container', 'create', marker),):
+			self.events.put(e)
+		self.assertIsNotNone(self.cache.waitForContainer(marker, lambda entry: True, 5))
+
+	def test_reads_go_to_docker_until_the_cache_is_live(self):
+		self.assertEqual(self.cache.getContainer('web1')['networks']['bridge']['ipaddr'], '172.17.0.2')
+		self.assertEqual(self.cache.findNetwork('n1')['name'], 'backend')
+		self.assertEqual(list(self.cache.findNetworks({'backend', 'missing'})), ['backend'])
+		self.assertIsNone(self.cache.countContainers())
+		self.assertIsNone(self.cache.getContainerState('c1'))
+		self.assertEqual(self.source.calls, ['inspectContainer', 'inspectNetwork', 'listNetworks'])
+		self.assertEqual(self.cache.getMetrics()['misses'], 3)
+
+	def test_live_reads_ask_docker_nothing(self):
+		self.watch()
+		self.assertEqual(self.cache.getContainer('c1')['name'], 'web1')
+		self.assertEqual(self.cache.getContainerState('web1'), 'running')
+		self.assertEqual(self.cache.countContainers(), 1)
+		self.assertEqual(self.cache.findNetwork('backend')['id'], 'n1')
+		self.assertIsNone(self.cache.findNetwork('missing'))
+		self.assertEqual([entry['id'] for entry in self.cache.listNetworks()], ['n1'])
+		self.assertEqual(self.source.calls, [])
+
+	def test_container_events(self):
+		self.watch()
+		self.source.container('c2', 'web2', state='created')
+		self.send(event('container', 'create', 'c2'))
+		self.assertEqual(self.cache.getContainerState('c2'), 'created')
+		# a waiter is woken by the event that makes the container ready
+		self.source.container('c2', 'web2', backend='10.0.0.2')
+		waiter=threading.Timer(0.05, lambda: self.events.put(event('container', 'start', 'c2')))
+		waiter.start()
+		entry=self.cache.waitForContainer('web2', lambda entry: entry['state']=='running', 5)
+		self.assertEqual(entry['networks']['backend']['ipaddr'], '10.0.0.2')
+		self.source.container('c2', 'renamed')
+		self.send(event('container', 'rename', 'c2'), event('container', 'destroy', 'c1'), event('container', 'exec_start', 'c2'))
+		self.assertIsNone(self.cache.getContainerState('web2'))
+		self.assertEqual(self.cache.getContainerState('renamed'), 'running')
+		self.assertNotIn('c1', self.cache.containers)
+		self.assertEqual(self.cache.getMetrics()['events'], 6)
+
+	def test_waiting_too_long_inspects_the_container(self):
+		self.watch()
+		self.source.container('c1', 'web1', state='exited')
+		entry=self.cache.waitForContainer('c1', lambda entry: entry['state']=='exited')
+		self.assertEqual(entry['state'], 'exited')
+		self.assertEqual(self.source.calls, ['inspectContainer'])
+		self.assertEqual(self.cache.getContainerState('c1'), 'exited')
+
+	def test_network_events(self):
+		self.watch()
+		self.source.networks['n2']={'Id':'n2', 'Name':'frontend'}
+		self.source.container('c1', 'web1', bridge='172.17.0.2', frontend='10.1.0.2')
+		self.send(event('network', 'create', 'n2'), event('network', 'connect', 'n2', container='c1'), event('network', 'destroy', 'n1'))
+		self.assertEqual(self.cache.findNetwork('frontend')['id'], 'n2')
+		self.assertIsNone(self.cache.findNetwork('backend'))
+		self.assertEqual(self.cache.getContainer('c1')['networks']['frontend']['ipaddr'], '10.1.0.2')
+
+	def test_stream_end_takes_the_cache_offline(self):
+		self.watch()
+		self.events.put(STOP)
+		deadline=time.monotonic()+5
+		while self.cache.live and time.monotonic()<deadline:
+			time.sleep(0.005)
+		self.assertFalse(self.cache.live)
+		self.cache.watcher=None
+		self.assertEqual(self.cache.getContainer('c1')['id'], 'c1')
+		self.assertEqual(self.source.calls, ['inspectContainer'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from controllers.resource.ImageCache import ImageCache
+
+class Docker:
+	# image attributes by name, counting the lookups made
+	def __init__(self, images):
+		self.images=images
+		self.lookups=[]
+
+	def lookup(self, imageName):
+		self.lookups.append(imageName)
+		return self.images.get(imageName)
+
+def image(imageId):
+	return {'Id':imageId, 'RepoDigests':['example@sha256:'+imageId]}
+
+class ImageCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.docker=Docker({'dockerrm_web':image('1'), 'dockerrm_db':image('2')})
+		self.cache=ImageCache(self.docker.lookup)
+
+	def test_lookups_are_cached_including_missing_images(self):
+		self.assertEqual(self.cache.get('dockerrm_web'), {'id':'1', 'digest':'example@sha256:1'})
+		self.assertEqual(self.cache.get('dockerrm_web:latest')['id'], '1')
+		self.assertIsNone(self.cache.get('dockerrm_missing'))
+		self.assertIsNone(self.cache.get('dockerrm_missing'))
+		self.assertEqual(self.docker.lookups, ['dockerrm_web', 'dockerrm_missing'])
+		metrics=self.cache.getMetrics()
+		self.assertEqual((metrics['images'], metrics['missing'], metrics['hits'], metrics['misses']), (2, 1, 2, 2))
+
+	def test_peek_never_asks_docker(self):
+		self.assertIsNone(self.cache.peek('dockerrm_web'))
+		self.cache.get('dockerrm_web')
+		self.assertEqual(self.cache.peek('dockerrm_web')['id'], '1')
+		self.assertEqual(self.docker.lookups, ['dockerrm_web'])
+
+	def test_refresh_reports_missing_images(self):
+		self.cache.get('dockerrm_web')
+		self.assertEqual(self.cache.refresh(['dockerrm_web', 'dockerrm_gone']), ['dockerrm_gone'])
+		self.assertEqual(self.docker.lookups, ['dockerrm_web', 'dockerrm_web', 'dockerrm_gone'])
+
+	def test_image_events_invalidate_their_entries(self):
+		self.cache.get('dockerrm_web')
+		self.cache.get('dockerrm_db')
+		self.cache.handleEvent({'Type':'image', 'Action':'tag', 'Actor':{'ID':'9', 'Attributes':{'name':'dockerrm_web:latest'}}})
+		self.assertIsNone(self.cache.peek('dockerrm_web'))
+		self.cache.handleEvent({'Type':'image', 'Action':'delete', 'Actor':{'ID':'2', 'Attributes':{}}})
+		self.assertIsNone(self.cache.peek('dockerrm_db'))
+		self.cache.get('dockerrm_web')
+		self.cache.handleEvent({'Type':'container', 'Action':'delete', 'Actor':{'ID':'1'}})
+		self.cache.handleEvent({'Type':'image', 'Action':'push', 'Actor':{'ID':'1'}})
+		self.assertEqual(self.cache.peek('dockerrm_web')['id'], '1')
+		self.assertEqual(self.cache.getMetrics()['invalidations'], 2)
+
+	def test_lookup_racing_an_invalidation_is_not_cached(self):
+		generation=self.cache.generation
+		self.cache.invalidate('dockerrm_web')
+		self.cache.put('dockerrm_web', image('1'), generation)
+		self.assertIsNone(self.cache.peek('dockerrm_web'))
+		self.cache.put('dockerrm_web', image('1'), self.cache.generation)
+		self.assertEqual(self.cache.peek('dockerrm_web')['id'], '1')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from controllers.resource.InstanceRegistry import InstanceRegistry, NETWORK_TYPE
+
+class Type:
+	def __init__(self, name):
+		self.name=name
+
+class Instance:
+	# the attributes of a resource instance the registry reads
+	def __init__(self, resourceId, name, location='local', typename='resource::example::1.0', **properties):
+		self.resourceId=resourceId
+		self.name=name
+		self.location=location
+		self.type=Type(typename)
+		self.properties=properties
+
+class InstanceRegistryTest(unittest.TestCase):
+	def setUp(self):
+		self.registry=InstanceRegistry()
+
+	def ids(self, instances):
+		return [instance.resourceId for instance in instances]
+
+	def test_search_pages_in_resource_id_order(self):
+		for resourceId in [5, 1, 4, 2, 3]:
+			self.registry.add(Instance(resourceId, 'example'+str(resourceId)))
+		page, last=self.registry.search('local', limit=2)
+		self.assertEqual((self.ids(page), last), ([1, 2], 2))
+		page, last=self.registry.search('local', after=last, limit=2)
+		self.assertEqual((self.ids(page), last), ([3, 4], 4))
+		page, last=self.registry.search('local', after=last, limit=2)
+		self.assertEqual((self.ids(page), last), ([5], None))
+
+	def test_search_filters(self):
+		self.registry.add(Instance(1, 'web1'))
+		self.registry.add(Instance(2, 'db1', typename='resource::db::1.0'))
+		self.registry.add(Instance(3, 'web2'))
+		self.registry.add(Instance(4, 'web3', location='remote'))
+		self.assertEqual(self.ids(self.registry.search('local', typename='resource::db::1.0')[0]), [2])
+		self.assertEqual(self.ids(self.registry.search('local', instanceName='web')[0]), [1, 3])
+		self.assertEqual(self.ids(self.registry.search('remote')[0]), [4])
+		self.assertEqual(self.registry.search('nowhere'), ([], None))
+
+	def test_removed_instances_leave_the_pages(self):
+		for resourceId in range(1, 11):
+			self.registry.add(Instance(resourceId, 'example'+str(resourceId)))
+		for resourceId in range(1, 10, 2):
+			self.registry.remove(resourceId)
+		page, last=self.registry.search('local', limit=3)
+		self.assertEqual((self.ids(page), last), ([2, 4, 6], 6))
+		page, last=self.registry.search('local', after=last)
+		self.assertEqual((self.ids(page), last), ([8, 10], None))
+		self.assertEqual(len(self.registry), 5)
+
+	def test_instance_moved_to_another_type_is_searched_under_it(self):
+		self.registry.add(Instance(1, 'example1'))
+		self.registry.add(Instance(1, 'example1', typename='resource::db::1.0'))
+		self.assertEqual(self.registry.search('local', typename='resource::example::1.0')[0], [])
+		self.assertEqual(self.ids(self.registry.search('local', typename='resource::db::1.0')[0]), [1])
+
+	def test_related_instances(self):
+		network=Instance(1, 'net1', typename=NETWORK_TYPE)
+		self.registry.add(network)
+		self.registry.add(Instance(2, 'web1', docker_network='net1'))
+		self.registry.add(Instance(3, 'web2', docker_network='net2', docker_network1='net1'))
+		self.registry.add(Instance(4, 'web3'))
+		self.assertEqual(self.ids(self.registry.search('local', relatedInstanceId=1)[0]), [2, 3])
+		self.assertEqual(self.ids(self.registry.search('local', relatedInstanceId=3)[0]), [1])
+		self.assertEqual(self.registry.search('local', relatedInstanceId=4)[0], [])
+
+	def test_remove_after_network_properties_changed(self):
+		self.registry.add(Instance(1, 'net1', typename=NETWORK_TYPE))
+		self.registry.add(Instance(2, 'net2', typename=NETWORK_TYPE, networkname='net2'))
+		container=Instance(3, 'web1', docker_network='net1')
+		self.registry.add(container)
+		# its properties change after it was indexed
+		container.properties['docker_network']='net2'
+		self.registry.remove(3)
+		self.assertEqual(self.registry.byNetwork, {})
+		self.assertEqual(self.registry.search('local', relatedInstanceId=1)[0], [])
+
+	def test_refresh_indexes_the_current_networks(self):
+		self.registry.add(Instance(1, 'net1', typename=NETWORK_TYPE))
+		self.registry.add(Instance(2, 'net2', typename=NETWORK_TYPE))
+		container=Instance(3, 'web1', docker_network='net1')
+		self.registry.add(container)
+		container.properties['docker_network']='net2'
+		self.registry.refresh(container)
+		self.assertEqual(self.registry.search('local', relatedInstanceId=1)[0], [])
+		self.assertEqual(self.ids(self.registry.search('local', relatedInstanceId=2)[0]), [3])
+		self.registry.remove(3)
+		self.assertEqual(self.registry.byNetwork, {})
+		# an instance no longer registered is not indexed again
+		self.registry.refresh(container)
+		self.assertEqual(self.registry.byNetwork, {})
+
+if __name__ == '__main__':
+	unittest.main()
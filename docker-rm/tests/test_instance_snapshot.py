@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+from controllers.util.InstanceSnapshot import InstanceSnapshot
+
+def record(resourceId, **properties):
+	return {'resourceId':resourceId, 'resourceName':'example'+str(resourceId), 'properties':properties}
+
+class InstanceSnapshotTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.path=os.path.join(self.directory, 'instances.jsonl')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def lines(self):
+		with open(self.path) as f:
+			return len(f.readlines())
+
+	def test_replay_keeps_the_latest_record_of_live_instances(self):
+		snapshot=InstanceSnapshot(self.path)
+		snapshot.save(record(1, docker_ipaddr=''))
+		snapshot.save(record(2))
+		snapshot.save(record(1, docker_ipaddr='172.17.0.2'))
+		snapshot.remove(2)
+		snapshot.close()
+		records=InstanceSnapshot(self.path).load()
+		self.assertEqual(list(records), [1])
+		self.assertEqual(records[1]['properties']['docker_ipaddr'], '172.17.0.2')
+
+	def test_missing_journal_loads_nothing(self):
+		self.assertEqual(InstanceSnapshot(self.path).load(), {})
+
+	def test_torn_last_line_is_skipped(self):
+		snapshot=InstanceSnapshot(self.path)
+		snapshot.save(record(1))
+		snapshot.close()
+		with open(self.path, 'a') as f:
+			f.write('{"resourceId": 2, "resourceNa')
+		self.assertEqual(list(InstanceSnapshot(self.path).load()), [1])
+
+	def test_compact_leaves_one_line_per_instance(self):
+		snapshot=InstanceSnapshot(self.path)
+		for i in range(5):
+			snapshot.save(record(1, count=i))
+		snapshot.save(record(2))
+		snapshot.remove(2)
+		snapshot.compact()
+		self.assertEqual(self.lines(), 1)
+		# appending goes on after a compaction
+		snapshot.save(record(3))
+		snapshot.close()
+		self.assertEqual(InstanceSnapshot(self.path).load(), {1:record(1, count=4), 3:record(3)})
+
+	def test_compacts_once_enough_lines_are_superseded(self):
+		snapshot=InstanceSnapshot(self.path, compactThreshold=3)
+		for i in range(4):
+			snapshot.save(record(1, count=i))
+		self.assertEqual(self.lines(), 4)
+		snapshot.save(record(1, count=4))
+		self.assertEqual(self.lines(), 1)
+		snapshot.close()
+		self.assertEqual(InstanceSnapshot(self.path).load()[1]['properties']['count'], 4)
+
+if __name__ == '__main__':
+	unittest.main()
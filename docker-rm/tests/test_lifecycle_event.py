@@ -0,0 +1,61 @@
+import unittest
+from controllers.transition.LifecycleEvent import buildLifecycleEvent
+from controllers.util.Timestamp import parseTimestamp, formatTimestamp
+
+class Type:
+	def __init__(self, name):
+		self.name=name
+
+class Instance:
+	# the attributes buildLifecycleEvent reads from a ResourceInstance
+	def __init__(self, typename='resource::example::1.0', **properties):
+		self.resourceId=1
+		self.name='example'
+		self.type=Type(typename)
+		self.properties=properties
+		self.createdAt=1514764800.0
+		self.lastModifiedAt=None
+
+	def getID(self):
+		return 'c'*64
+
+class Transition:
+	# the attributes buildLifecycleEvent reads from a Transition
+	requestId=7
+	metricKey='key'
+	resourceManagerId='docker-rm::dev'
+	deploymentLocation='dev'
+	transitionName='Install'
+
+	def getTransitionRequestStatus(self):
+		return {'requestId':self.requestId, 'requestState':'COMPLETED'}
+
+class LifecycleEventTest(unittest.TestCase):
+	def test_event_of_a_container_instance(self):
+		instance=Instance(docker_ipaddr='172.17.0.2')
+		event=buildLifecycleEvent(Transition(), instance)
+		self.assertEqual((event['requestId'], event['requestState'], event['transitionName']), (7, 'COMPLETED', 'Install'))
+		self.assertEqual(event['deploymentLocation'], 'dev')
+		resource=event['resourceInstance']
+		self.assertEqual(resource['properties'], {'docker_ipaddr':'172.17.0.2'})
+		self.assertEqual(parseTimestamp(resource['createdAt']), 1514764800.0)
+		self.assertEqual(resource['lastModifiedAt'], '')
+		self.assertEqual(resource['internalResourceInstances'], [{'name':'example', 'type':'resource__example__1_0', 'id':'c'*64}])
+		# the event holds a copy of the properties
+		instance.properties['docker_ipaddr']=''
+		self.assertEqual(resource['properties']['docker_ipaddr'], '172.17.0.2')
+
+	def test_event_of_a_network_carries_its_network_id(self):
+		event=buildLifecycleEvent(Transition(), Instance('resource::docker-network::1.0', networkid='n1'))
+		self.assertEqual(event['resourceInstance']['internalResourceInstances'][0]['id'], 'n1')
+		event=buildLifecycleEvent(Transition(), Instance('resource::docker-network::1.0'))
+		self.assertNotIn('id', event['resourceInstance']['internalResourceInstances'][0])
+
+	def test_timestamps(self):
+		self.assertEqual(parseTimestamp(formatTimestamp(1514764800.5)), 1514764800.5)
+		self.assertEqual(parseTimestamp('2018-01-01T00:00:00+00:00'), 1514764800.0)
+		self.assertIsNone(parseTimestamp('yesterday'))
+		self.assertIsNone(parseTimestamp(''))
+
+if __name__ == '__main__':
+	unittest.main()
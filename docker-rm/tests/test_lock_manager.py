@@ -0,0 +1,51 @@
+import threading
+import unittest
+from controllers.util.LockManager import LockManager
+
+class LockManagerTest(unittest.TestCase):
+	def test_string_and_int_ids_share_a_lock(self):
+		locks=LockManager(stripes=64)
+		self.assertIs(locks.stripeFor(12), locks.stripeFor('12'))
+
+	def test_same_resource_is_exclusive(self):
+		locks=LockManager()
+		inside=threading.Event()
+		entered=threading.Event()
+		release=threading.Event()
+		def holder():
+			with locks.lock(1):
+				inside.set()
+				release.wait(5)
+		def waiter():
+			with locks.lock('1'):
+				entered.set()
+		threading.Thread(target=holder).start()
+		self.assertTrue(inside.wait(5))
+		thread=threading.Thread(target=waiter)
+		thread.start()
+		self.assertFalse(entered.wait(0.1))
+		release.set()
+		self.assertTrue(entered.wait(5))
+		thread.join()
+		metrics=locks.getMetrics()
+		self.assertEqual((metrics['acquisitions'], metrics['contended']), (2, 1))
+		self.assertGreater(metrics['maxWaitSeconds'], 0.05)
+
+	def test_other_stripes_are_not_held(self):
+		locks=LockManager(stripes=256)
+		other=next(i for i in range(2, 1000) if locks.stripeFor(i) is not locks.stripeFor(1))
+		with locks.lock(1):
+			self.assertFalse(locks.stripeFor(1).acquire(blocking=False))
+			with locks.lock(other):
+				pass
+		self.assertEqual(locks.getMetrics()['contended'], 0)
+
+	def test_released_when_the_body_raises(self):
+		locks=LockManager()
+		with self.assertRaises(RuntimeError):
+			with locks.lock(1):
+				raise RuntimeError()
+		self.assertTrue(locks.stripeFor(1).acquire(blocking=False))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from controllers.resource.DockerEndpoint import DockerEndpoints
+from controllers.resource.Placement import PlacementEngine, NoPlacementException, parseMemory
+
+class Type:
+	name='resource::example::1.0'
+	imageName='dockerrm_example'
+	def __init__(self, resources=None, placement=None):
+		self.resourceDescriptor={'resources':resources or {}, 'placement':placement or {}}
+
+class Instance:
+	def __init__(self, resourceId, name=None, resourceType=None):
+		self.resourceId=resourceId
+		self.name=name or 'example'+str(resourceId)
+		self.location='local'
+		self.type=resourceType or Type()
+		self.endpoint=None
+		self.placement=None
+
+class PlacementEngineTest(unittest.TestCase):
+	def engine(self, capacities, images=None, **options):
+		endpoints=[{'name':'daemon'+str(i), 'url':'unix:///tmp/daemon'+str(i)+'.sock', 'capacity':capacity} for i, capacity in enumerate(capacities)]
+		self.endpoints=DockerEndpoints([{'name':'local', 'endpoints':endpoints}])
+		for i, endpoint in enumerate(self.endpoints.forLocation('local')):
+			# the endpoints listed in images have the image of the type, docker has no other
+			endpoint.images.lookup=lambda imageName: None
+			if images==None or i in images:
+				endpoint.images.put(Type.imageName, {'Id':'sha256:example'})
+		return PlacementEngine(self.endpoints, **options)
+
+	def place(self, engine, count, start=0, **typeOptions):
+		resourceType=Type(**typeOptions)
+		return [engine.place(Instance(start+i, resourceType=resourceType)).name for i in range(count)]
+
+	def test_spread_fills_endpoints_evenly(self):
+		engine=self.engine([{}, {}, {}])
+		placed=self.place(engine, 9)
+		self.assertEqual(sorted(placed.count(name) for name in set(placed)), [3, 3, 3])
+
+	def test_spread_follows_capacity(self):
+		engine=self.engine([{'cpus':4}, {'cpus':8}])
+		placed=self.place(engine, 12, resources={'cpu':1})
+		self.assertEqual((placed.count('daemon0'), placed.count('daemon1')), (4, 8))
+		with self.assertRaises(NoPlacementException):
+			self.place(engine, 1, start=12, resources={'cpu':1})
+		self.assertEqual(engine.getMetrics()['rejected'], 1)
+
+	def test_binpack_fills_one_endpoint_first(self):
+		engine=self.engine([{'containers':3}, {'containers':3}], strategy='binpack')
+		placed=self.place(engine, 6)
+		self.assertEqual(placed[:3], [placed[0]]*3)
+		self.assertNotIn(placed[0], placed[3:])
+
+	def test_release_gives_back_the_reservation(self):
+		engine=self.engine([{'memory':'1g'}])
+		instance=Instance(1, resourceType=Type(resources={'memory':'1g'}))
+		engine.place(instance)
+		self.assertEqual(instance.endpoint, 'daemon0')
+		with self.assertRaises(NoPlacementException):
+			engine.place(Instance(2, resourceType=instance.type))
+		engine.release(instance)
+		engine.place(Instance(2, resourceType=instance.type))
+
+	def test_soft_anti_affinity_keeps_names_apart_while_it_can(self):
+		engine=self.engine([{}, {}], antiAffinity='soft')
+		placed=[engine.place(Instance(i, 'web')).name for i in range(3)]
+		self.assertEqual(sorted(placed[:2]), ['daemon0', 'daemon1'])
+
+	def test_hard_anti_affinity_refuses_a_third_replica(self):
+		engine=self.engine([{}, {}], antiAffinity='hard')
+		placed=[engine.place(Instance(i, 'web')).name for i in range(2)]
+		self.assertEqual(sorted(placed), ['daemon0', 'daemon1'])
+		with self.assertRaises(NoPlacementException) as raised:
+			engine.place(Instance(2, 'web'))
+		self.assertIn('already has an instance called web', raised.exception.message)
+
+	def test_type_overrides_the_policy(self):
+		engine=self.engine([{}, {}], antiAffinity='off')
+		resourceType=Type(placement={'antiAffinity':'hard'})
+		engine.place(Instance(0, 'db', resourceType))
+		engine.place(Instance(1, 'db', resourceType))
+		with self.assertRaises(NoPlacementException):
+			engine.place(Instance(2, 'db', resourceType))
+		with self.assertRaises(ValueError):
+			engine.place(Instance(3, resourceType=Type(placement={'strategy':'random'})))
+
+	def test_slow_endpoint_is_penalised(self):
+		engine=self.engine([{}, {}], latencyWeight=1.0)
+		slow=Instance(100)
+		slow.endpoint='daemon1'
+		engine.recordInstall(slow, 4.0)
+		fast=Instance(101)
+		fast.endpoint='daemon0'
+		engine.recordInstall(fast, 1.0)
+		self.assertEqual(self.place(engine, 4), ['daemon0']*4)
+
+	def test_endpoints_without_the_image_are_left_out(self):
+		engine=self.engine([{}, {}], images=[1])
+		self.assertEqual(self.place(engine, 3), ['daemon1']*3)
+		engine=self.engine([{}], images=[])
+		self.assertIsNone(engine.place(Instance(1)))
+
+	def test_parse_memory(self):
+		self.assertEqual(parseMemory('512m'), 512*1024**2)
+		self.assertEqual(parseMemory('2Gi'), 2*1024**3)
+		self.assertEqual(parseMemory('1GB'), 1024**3)
+		self.assertIsNone(parseMemory(None))
+		with self.assertRaises(ValueError):
+			parseMemory('lots')
+
+if __name__ == '__main__':
+	unittest.main()
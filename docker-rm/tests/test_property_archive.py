@@ -0,0 +1,22 @@
+import io
+import tarfile
+import unittest
+from controllers.util.PropertyArchive import packProperties, unpackProperties, TRANSITION_PROPERTIES
+
+class PropertyArchiveTest(unittest.TestCase):
+	def test_round_trip_keeps_quotes_and_types(self):
+		properties={'motd':'say "hello"', 'hostname':"it's quoted", 'port':8080, 'empty':''}
+		self.assertEqual(unpackProperties(packProperties(TRANSITION_PROPERTIES, properties)), properties)
+
+	def test_archive_holds_one_file_named_after_the_path(self):
+		with tarfile.open(fileobj=io.BytesIO(packProperties(TRANSITION_PROPERTIES, {'a':1})), mode='r') as tar:
+			members=tar.getmembers()
+		self.assertEqual([(member.name, member.mode) for member in members], [('rmparams', 0o644)])
+
+	def test_nothing_to_unpack(self):
+		self.assertIsNone(unpackProperties(b''))
+		self.assertIsNone(unpackProperties(None))
+		self.assertIsNone(unpackProperties(packProperties(TRANSITION_PROPERTIES, ['not', 'a', 'mapping'])))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from controllers.resource.PropertyMap import PropertyMap, internLayout
+
+class PropertyMapTest(unittest.TestCase):
+	def test_behaves_like_a_dict(self):
+		properties=PropertyMap(internLayout(['docker_network', 'hostname']), ['bridge', 'example'])
+		properties['dummy']='value'
+		properties['hostname']='renamed'
+		self.assertEqual(dict(properties), {'docker_network':'bridge', 'hostname':'renamed', 'dummy':'value'})
+		self.assertEqual(len(properties), 3)
+		self.assertEqual(properties.get('missing', 'default'), 'default')
+		self.assertIn('dummy', properties)
+		self.assertEqual(list(properties.items())[0], ('docker_network', 'bridge'))
+
+	def test_delete_layout_and_extra_keys(self):
+		properties=PropertyMap.fromDict({'a':1, 'b':None})
+		properties['c']=3
+		del properties['a']
+		del properties['c']
+		self.assertNotIn('a', properties)
+		self.assertEqual(dict(properties), {'b':None})
+		self.assertEqual(len(properties), 1)
+		with self.assertRaises(KeyError):
+			del properties['a']
+		with self.assertRaises(KeyError):
+			properties['c']
+		properties['a']=0
+		self.assertEqual(properties['a'], 0)
+
+	def test_layout_without_defaults_starts_empty(self):
+		properties=PropertyMap(internLayout(['a', 'b']))
+		self.assertEqual(len(properties), 0)
+		self.assertEqual(dict(properties), {})
+		properties['b']=2
+		self.assertEqual(list(properties), ['b'])
+
+	def test_instances_of_a_type_share_its_layout(self):
+		first=PropertyMap.fromDict({'docker_network':'bridge', 'hostname':'one'})
+		second=PropertyMap.fromDict({'docker_network':'host', 'hostname':'two'})
+		self.assertIs(first.layout, second.layout)
+		self.assertIsNot(first.layout, PropertyMap.fromDict({'hostname':'one', 'docker_network':'bridge'}).layout)
+		second['hostname']='changed'
+		self.assertEqual(first['hostname'], 'one')
+
+if __name__ == '__main__':
+	unittest.main()
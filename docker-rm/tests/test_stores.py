@@ -0,0 +1,136 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from controllers.util.TinyDBStore import TinyDBStore
+from controllers.util.SQLiteStore import SQLiteStore
+
+def transition(requestId, resourceId, requestState='PENDING', **fields):
+	document={'requestId':requestId, 'resourceId':str(resourceId), 'requestState':requestState, 'transitionName':'Install'}
+	document.update(fields)
+	return document
+
+class StoreTests:
+	# the same behaviour is expected of every transition store, subclasses open one
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.store=self.openStore(os.path.join(self.directory, 'db'))
+
+	def tearDown(self):
+		self.store.close()
+		shutil.rmtree(self.directory)
+
+	def test_insert_and_find(self):
+		eid=self.store.insert(transition(1, 10))
+		self.assertEqual(self.store.get(eid)['requestId'], 1)
+		self.assertEqual(self.store.findByRequestId(1)['resourceId'], '10')
+		self.assertEqual(self.store.findByRequestId('1')['resourceId'], '10')
+		self.assertEqual(self.store.eidForRequestId(1), eid)
+		self.assertIsNone(self.store.findByRequestId(2))
+		self.assertIsNone(self.store.eidForRequestId(2))
+
+	def test_update_merges_fields_and_moves_indexes(self):
+		eid=self.store.insert(transition(1, 10))
+		self.store.update(eid, {'requestState':'COMPLETED', 'finishedAt':'now'})
+		stored=self.store.findByRequestId(1)
+		self.assertEqual(stored['requestState'], 'COMPLETED')
+		self.assertEqual(stored['finishedAt'], 'now')
+		self.assertEqual(stored['transitionName'], 'Install')
+		self.assertEqual(self.store.findByState('PENDING'), [])
+		self.assertEqual([t['requestId'] for t in self.store.findByState('COMPLETED')], [1])
+
+	def test_find_by_resource_and_state_in_order(self):
+		for requestId in [1, 2, 3, 4]:
+			self.store.insert(transition(requestId, 10 if requestId%2==0 else 11, 'COMPLETED' if requestId<3 else 'PENDING'))
+		self.assertEqual([t['requestId'] for t in self.store.findByResourceId(10)], [2, 4])
+		self.assertEqual([t['requestId'] for t in self.store.findByResourceId('11')], [1, 3])
+		self.assertEqual([t['requestId'] for t in self.store.findByState('PENDING')], [3, 4])
+
+	def test_remove(self):
+		eid=self.store.insert(transition(1, 10))
+		self.store.remove(eid)
+		self.assertIsNone(self.store.findByRequestId(1))
+		self.assertEqual(self.store.findByResourceId(10), [])
+
+	def test_write_batch(self):
+		first=self.store.insert(transition(1, 10))
+		second=self.store.insert(transition(2, 10))
+		eids=self.store.writeBatch([transition(3, 11), transition(4, 11)], [(first, {'requestState':'FAILED'})], [second])
+		self.assertEqual(len(eids), 2)
+		self.assertEqual(self.store.findByRequestId(1)['requestState'], 'FAILED')
+		self.assertIsNone(self.store.findByRequestId(2))
+		self.assertEqual([t['requestId'] for t in self.store.findByResourceId(11)], [3, 4])
+
+	def test_write_batch_returns_ids_in_request_order(self):
+		eids=self.store.writeBatch([transition(requestId, 'None') for requestId in range(1, 51)], [], [])
+		self.assertEqual([self.store.get(eid)['requestId'] for eid in eids], list(range(1, 51)))
+		self.assertEqual(len(self.store.findByState('PENDING')), 50)
+
+	def test_max_ids(self):
+		self.assertEqual(self.store.maxIds(), (0, -1))
+		self.store.insert(transition(7, 12))
+		self.store.insert(transition(3, 'network'))
+		self.assertEqual(self.store.maxIds(), (7, 12))
+
+	def test_summaries(self):
+		self.assertIsNone(self.store.getSummary(10))
+		self.store.putSummaries({'10':{'resourceId':'10', 'requests':3}})
+		self.store.putSummaries({'11':{'resourceId':'11', 'requests':1}})
+		self.assertEqual(self.store.getSummary(10)['requests'], 3)
+		self.assertEqual(self.store.getSummary('11')['requests'], 1)
+
+	def test_purge(self):
+		self.store.insert(transition(1, 10))
+		self.store.putSummaries({'10':{'resourceId':'10'}})
+		self.store.purge()
+		self.assertIsNone(self.store.findByRequestId(1))
+		self.assertIsNone(self.store.getSummary(10))
+
+	def test_reopen_keeps_transitions(self):
+		self.store.insert(transition(1, 10, 'COMPLETED'))
+		self.store.close()
+		self.store=self.openStore(os.path.join(self.directory, 'db'))
+		self.assertEqual(self.store.findByRequestId(1)['requestState'], 'COMPLETED')
+		self.assertEqual(self.store.maxIds(), (1, 10))
+
+class TinyDBStoreTest(StoreTests, unittest.TestCase):
+	def openStore(self, path):
+		return TinyDBStore(path+'.json')
+
+class SQLiteStoreTest(StoreTests, unittest.TestCase):
+	def openStore(self, path):
+		return SQLiteStore(path+'.sqlite')
+
+	def test_threads_get_their_own_connection(self):
+		connections=[]
+		def lookup():
+			self.store.findByRequestId(1)
+			connections.append(self.store.connection())
+		threads=[threading.Thread(target=lookup) for i in range(3)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		self.assertEqual(len(set(id(c) for c in connections)), 3)
+
+	def test_close_closes_connections_of_every_thread(self):
+		connections=[self.store.connection()]
+		def lookup():
+			self.store.findByRequestId(1)
+			connections.append(self.store.connection())
+		threads=[threading.Thread(target=lookup) for i in range(3)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		self.store.close()
+		for conn in connections:
+			with self.assertRaisesRegex(sqlite3.ProgrammingError, 'closed database'):
+				conn.execute('SELECT 1')
+		# the store is closed again by tearDown
+		self.store=SQLiteStore(os.path.join(self.directory, 'db.sqlite'))
+
+if __name__ == '__main__':
+	unittest.main()
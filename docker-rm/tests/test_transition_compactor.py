@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from controllers.util.SQLiteStore import SQLiteStore
+from controllers.util.Timestamp import formatTimestamp
+from controllers.util.TransitionCompactor import TransitionCompactor
+from tests.test_stores import transition
+
+class Database:
+	# the DB methods the compactor calls, over a store
+	def __init__(self, store):
+		self.store=store
+
+	def findTransitionsByState(self, state):
+		return self.store.findByState(state)
+
+	def removeTransitions(self, requestIds):
+		self.store.writeBatch([], [], [self.store.eidForRequestId(requestId) for requestId in requestIds])
+
+	def saveResourceSummaries(self, summaries):
+		self.store.putSummaries(summaries)
+
+	def findResourceSummary(self, resourceId):
+		return self.store.getSummary(resourceId)
+
+def finished(requestId, resourceId, secondsAgo=0, transitionName='Start', requestState='COMPLETED'):
+	return transition(requestId, resourceId, requestState, transitionName=transitionName, finishedAt=formatTimestamp(time.time()-secondsAgo))
+
+class TransitionCompactorTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.store=SQLiteStore(os.path.join(self.directory, 'db.sqlite'))
+		self.db=Database(self.store)
+
+	def tearDown(self):
+		self.store.close()
+		shutil.rmtree(self.directory)
+
+	def requestIds(self, resourceId):
+		return [t['requestId'] for t in self.store.findByResourceId(resourceId)]
+
+	def test_keeps_the_newest_per_resource(self):
+		self.store.insert(finished(1, 10, transitionName='Install'))
+		for requestId in range(2, 6):
+			self.store.insert(finished(requestId, 10))
+		self.store.insert(transition(6, 10, 'IN_PROGRESS'))
+		self.store.insert(finished(7, 11))
+		compactor=TransitionCompactor(self.db, maxPerResource=2, batchSize=2)
+		self.assertEqual(compactor.runOnce(), 3)
+		self.assertEqual(self.requestIds(10), [4, 5, 6])
+		self.assertEqual(self.requestIds(11), [7])
+		summary=self.store.getSummary(10)
+		self.assertEqual(summary['lastTransition']['requestId'], 5)
+		self.assertIsNotNone(summary['installedAt'])
+		self.assertIsNone(self.store.getSummary(11))
+		metrics=compactor.getMetrics()
+		self.assertEqual((metrics['evictedRows'], metrics['runs']), (3, 1))
+		self.assertGreater(metrics['bytesReclaimed'], 0)
+
+	def test_evicts_transitions_older_than_max_age(self):
+		self.store.insert(finished(1, 10, secondsAgo=7200, transitionName='Install'))
+		self.store.insert(finished(2, 10, secondsAgo=7200, requestState='FAILED'))
+		self.store.insert(finished(3, 10, secondsAgo=10))
+		compactor=TransitionCompactor(self.db, maxAge=3600)
+		self.assertEqual(compactor.runOnce(), 2)
+		self.assertEqual(self.requestIds(10), [3])
+		self.assertEqual(compactor.runOnce(), 0)
+
+	def test_summary_keeps_the_install_time_of_an_earlier_run(self):
+		self.store.insert(finished(1, 10, transitionName='Install'))
+		self.store.insert(finished(2, 10))
+		TransitionCompactor(self.db, maxPerResource=1).runOnce()
+		installedAt=self.store.getSummary(10)['installedAt']
+		self.store.insert(finished(3, 10))
+		TransitionCompactor(self.db, maxPerResource=1).runOnce()
+		summary=self.store.getSummary(10)
+		self.assertEqual(summary['installedAt'], installedAt)
+		self.assertEqual(summary['lastTransition']['requestId'], 3)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+import controllers.transition.TransitionDeadline
+from controllers.transition.TransitionDeadline import TransitionDeadline, TransitionStoppedException, wrapCommand, PIDFILE
+
+class TransitionDeadlineTest(unittest.TestCase):
+	def test_stop_kills_the_guarded_command(self):
+		deadline=TransitionDeadline()
+		killed=threading.Event()
+		with self.assertRaises(TransitionStoppedException) as raised:
+			with deadline.guard(killed.set):
+				deadline.stop('Transition cancelled')
+				self.assertTrue(killed.is_set())
+		self.assertEqual(raised.exception.reason, 'Transition cancelled')
+
+	def test_nothing_runs_once_stopped(self):
+		deadline=TransitionDeadline()
+		deadline.stop('Transition cancelled')
+		ran=[]
+		with self.assertRaises(TransitionStoppedException):
+			with deadline.guard(lambda: None):
+				ran.append(True)
+		self.assertEqual(ran, [])
+		# the first reason stays
+		deadline.stop('Transition timed out')
+		self.assertEqual(deadline.reason, 'Transition cancelled')
+
+	def test_timeout_stops_the_transition(self):
+		deadline=TransitionDeadline(timeout=0.05)
+		killed=threading.Event()
+		deadline.start()
+		with self.assertRaises(TransitionStoppedException) as raised:
+			with deadline.guard(killed.set):
+				self.assertTrue(killed.wait(5))
+		self.assertIn('timed out after 0.05 seconds', raised.exception.reason)
+
+	def test_kill_is_repeated_until_the_command_returns(self):
+		retry=controllers.transition.TransitionDeadline.KILL_RETRY
+		controllers.transition.TransitionDeadline.KILL_RETRY=0.01
+		try:
+			deadline=TransitionDeadline()
+			kills=threading.Semaphore(0)
+			with self.assertRaises(TransitionStoppedException):
+				with deadline.guard(kills.release):
+					deadline.stop('Transition cancelled')
+					for i in range(3):
+						self.assertTrue(kills.acquire(timeout=5))
+		finally:
+			controllers.transition.TransitionDeadline.KILL_RETRY=retry
+
+	def test_unguarded_and_finished_transitions_are_left_alone(self):
+		deadline=TransitionDeadline(timeout=0.05)
+		deadline.start()
+		deadline.finish()
+		time.sleep(0.1)
+		with deadline.guard(lambda: None):
+			pass
+		self.assertIsNone(deadline.reason)
+
+	def test_wrapped_command_records_its_pid(self):
+		self.assertEqual(wrapCommand("/lifecycle/install.sh"), ['/bin/sh', '-c', 'echo $$ > '+PIDFILE+'; exec /lifecycle/install.sh'])
+		self.assertEqual(wrapCommand("it's.sh")[2], 'echo $$ > '+PIDFILE+'; exec \'it\'"\'"\'s.sh\'')
+
+if __name__ == '__main__':
+	unittest.main()
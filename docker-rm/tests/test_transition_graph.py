@@ -0,0 +1,96 @@
+import unittest
+from controllers.transition.TransitionGraph import TransitionGraph, resolveDependencies, InvalidDependencyException, DependencyRefusedException
+
+class FakeTransition:
+	# the accepted transition the graph hands to the scheduler, finished by the test
+	def __init__(self, requestId, queued):
+		self.requestId=requestId
+		self.requestState='PENDING'
+		self.requestStateReason=None
+		self.queued=queued
+		self.onComplete=None
+
+	def runTransition(self, onComplete):
+		self.onComplete=onComplete
+		self.queued.append(self.requestId)
+		return {'requestId':self.requestId, 'queued':True}
+
+	def cancel(self, reason):
+		self.requestState='FAILED'
+		self.requestStateReason=reason
+
+	def finish(self, requestState='COMPLETED'):
+		self.requestState=requestState
+		self.onComplete()
+
+	def getTransitionRequestResponse(self):
+		return {'requestId':self.requestId, 'requestState':self.requestState}
+
+class ResolveDependenciesTest(unittest.TestCase):
+	def test_valid_dependencies(self):
+		parents, errors=resolveDependencies({0:None, 1:[0], 2:[0, 1, 1]}, 3)
+		self.assertEqual(parents, {0:[], 1:[0], 2:[0, 1]})
+		self.assertEqual(errors, {})
+
+	def test_bad_positions(self):
+		parents, errors=resolveDependencies({0:[0], 1:[5], 2:[True], 3:['0'], 4:[]}, 5)
+		self.assertEqual(parents, {4:[]})
+		for position in range(4):
+			self.assertIsInstance(errors[position], InvalidDependencyException)
+
+	def test_cycles_and_what_depends_on_them(self):
+		parents, errors=resolveDependencies({0:[1], 1:[2], 2:[0], 3:[2], 4:[], 5:[4]}, 6)
+		self.assertEqual(parents, {4:[], 5:[4]})
+		self.assertEqual(sorted(errors), [0, 1, 2, 3])
+		for position in range(4):
+			self.assertIsInstance(errors[position], InvalidDependencyException)
+			self.assertIn('dependency cycle', errors[position].message)
+
+	def test_refusal_reaches_everything_downstream(self):
+		# position 1 was refused before its dependencies were looked at
+		parents, errors=resolveDependencies({0:[], 2:[1], 3:[2], 4:[0]}, 5)
+		self.assertEqual(parents, {0:[], 4:[0]})
+		self.assertIsInstance(errors[2], DependencyRefusedException)
+		self.assertEqual(errors[2].position, 1)
+		self.assertEqual(errors[3].position, 2)
+
+class TransitionGraphTest(unittest.TestCase):
+	def setUp(self):
+		self.queued=[]
+
+	def graph(self, parents):
+		self.transitions=dict((position, FakeTransition(100+position, self.queued)) for position in parents)
+		return TransitionGraph(self.transitions, parents)
+
+	def test_children_are_queued_once_every_parent_completes(self):
+		results=self.graph({0:[], 1:[], 2:[0, 1], 3:[2]}).start()
+		self.assertEqual(self.queued, [100, 101])
+		self.assertTrue(results[0]['queued'])
+		self.assertEqual(results[2], {'requestId':102, 'requestState':'PENDING'})
+		self.transitions[0].finish()
+		self.assertEqual(self.queued, [100, 101])
+		self.transitions[1].finish()
+		self.assertEqual(self.queued, [100, 101, 102])
+		self.transitions[2].finish()
+		self.assertEqual(self.queued, [100, 101, 102, 103])
+
+	def test_failure_fails_everything_downstream(self):
+		self.graph({0:[], 1:[0], 2:[1], 3:[]}).start()
+		self.transitions[0].finish('FAILED')
+		self.assertEqual(self.queued, [100, 103])
+		for position in [1, 2]:
+			self.assertEqual(self.transitions[position].requestState, 'FAILED')
+			self.assertEqual(self.transitions[position].requestStateReason, 'Dependency request 100 did not complete')
+		self.assertEqual(self.transitions[3].requestState, 'PENDING')
+
+	def test_refused_root_fails_its_dependents(self):
+		graph=self.graph({0:[], 1:[0]})
+		def refuse(onComplete):
+			raise RuntimeError('queue full')
+		self.transitions[0].runTransition=refuse
+		results=graph.start()
+		self.assertIsInstance(results[0], RuntimeError)
+		self.assertEqual(results[1]['requestState'], 'FAILED')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from controllers.util.TransitionIndex import TransitionIndex
+from tests.test_stores import transition
+
+class TransitionIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.index=TransitionIndex()
+
+	def test_lookups(self):
+		self.index.rebuild([(1, transition(1, 10)), (2, transition(2, 11, 'COMPLETED')), (3, transition(3, 10, 'COMPLETED'))])
+		self.assertEqual(len(self.index), 3)
+		self.assertEqual(self.index.findByRequestId('2')['resourceId'], '11')
+		self.assertIsNone(self.index.findByRequestId(4))
+		self.assertEqual([t['requestId'] for t in self.index.findByResourceId(10)], [1, 3])
+		self.assertEqual([t['requestId'] for t in self.index.findByState('COMPLETED')], [2, 3])
+		self.assertEqual(self.index.findByState('FAILED'), [])
+
+	def test_update_moves_the_state_index(self):
+		self.index.add(1, transition(1, 10))
+		self.index.update(1, {'requestState':'FAILED', 'requestStateReason':'timed out'})
+		self.assertEqual(self.index.findByState('PENDING'), [])
+		self.assertEqual(self.index.findByState('FAILED')[0]['requestStateReason'], 'timed out')
+		self.assertNotIn('PENDING', self.index.byState)
+		# an eid that is not indexed is ignored
+		self.index.update(2, {'requestState':'FAILED'})
+		self.assertEqual(len(self.index), 1)
+
+	def test_remove_empties_the_indexes(self):
+		self.index.add(1, transition(1, 10))
+		self.index.add(2, transition(2, 10))
+		self.index.remove(1)
+		self.index.remove(2)
+		self.index.remove(3)
+		self.assertEqual((self.index.byRequestId, self.index.byResourceId, self.index.byState), ({}, {}, {}))
+
+	def test_found_transitions_are_copies(self):
+		self.index.add(1, transition(1, 10))
+		self.index.findByRequestId(1)['requestState']='COMPLETED'
+		self.index.findByResourceId(10)[0]['queuePosition']=0
+		self.assertEqual(self.index.get(1), transition(1, 10))
+
+	def test_max_ids(self):
+		self.assertEqual(self.index.maxIds(), (0, -1))
+		self.index.add(1, transition(4, 'network'))
+		self.index.add(2, transition(2, 12))
+		self.assertEqual(self.index.maxIds(), (4, 12))
+
+if __name__ == '__main__':
+	unittest.main()
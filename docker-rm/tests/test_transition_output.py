@@ -0,0 +1,77 @@
+import json
+import unittest
+from controllers.transition.TransitionOutput import TransitionOutput, TransitionOutputs, CommandFailedException, checkExitCode
+
+class TransitionOutputTest(unittest.TestCase):
+	def test_streams_are_capped_apart(self):
+		output=TransitionOutput(maxBytes=10)
+		output.write('stderr', b'why')
+		for i in range(5):
+			output.write('stdout', b'0123456')
+		self.assertEqual(output.getText('stderr'), 'why')
+		self.assertEqual(output.getText('stdout'), '0123456')
+		self.assertEqual(output.dropped, 28)
+		self.assertEqual(output.getSummary()['stdoutBytes'], 35)
+
+	def test_oversized_write_keeps_its_end(self):
+		output=TransitionOutput(maxBytes=4)
+		output.write('stdout', b'abcdefgh')
+		self.assertEqual(output.getText('stdout'), 'efgh')
+		self.assertEqual(output.dropped, 4)
+
+	def test_read_after_a_number_in_write_order(self):
+		output=TransitionOutput()
+		output.write('stdout', b'a')
+		output.write('stderr', b'b')
+		output.write('stdout', b'c')
+		output.write('stdout', b'')
+		self.assertEqual(output.read(), ([(1, 'stdout', b'a'), (2, 'stderr', b'b'), (3, 'stdout', b'c')], False))
+		self.assertEqual(output.read(2), ([(3, 'stdout', b'c')], False))
+		output.close()
+		self.assertEqual(output.read(3), ([], True))
+
+	def test_follow_heartbeats_until_closed(self):
+		output=TransitionOutput()
+		sleeps=[]
+		def sleep(seconds):
+			sleeps.append(seconds)
+			if len(sleeps)==2:
+				output.write('stdout', b'done')
+				output.close()
+		batches=list(output.follow(sleep=sleep, poll=1.0, heartbeat=1.0))
+		self.assertEqual(batches, [[], [(1, 'stdout', b'done')]])
+
+	def test_events(self):
+		output=TransitionOutput()
+		output.write('stdout', b'one\r\ntwo')
+		output.exited(0)
+		output.close()
+		events=list(output.events(follow=False))
+		self.assertEqual(events[0], 'id: 1\nevent: stdout\ndata: one\ndata: two\n\n')
+		self.assertTrue(events[1].startswith('event: end\ndata: '))
+		self.assertEqual(json.loads(events[1].split('data: ')[1])['exitCode'], 0)
+
+	def test_check_exit_code_quotes_stderr(self):
+		output=TransitionOutput()
+		output.write('stderr', b'first\nsecond\n')
+		output.exited(0)
+		checkExitCode(output, 'install.sh', 'example')
+		output.exited(2)
+		with self.assertRaises(CommandFailedException) as raised:
+			checkExitCode(output, 'install.sh', 'example')
+		self.assertEqual(raised.exception.message, 'command install.sh exited with 2: first second')
+
+class TransitionOutputsTest(unittest.TestCase):
+	def test_output_of_the_oldest_finished_transitions_goes(self):
+		outputs=TransitionOutputs(keep=2)
+		for requestId in [1, 2, 3, 4]:
+			outputs.open(requestId)
+		self.assertIs(outputs.open(1), outputs.get(1))
+		for requestId in [1, 2, 1, 3]:
+			outputs.close(requestId)
+		self.assertIsNone(outputs.get(1))
+		self.assertEqual([outputs.get(requestId).closed for requestId in [2, 3, 4]], [True, True, False])
+		self.assertEqual(outputs.getMetrics()['running'], 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,132 @@
+import concurrent.futures
+import threading
+import time
+import unittest
+from controllers.transition.TransitionScheduler import TransitionScheduler, TransitionQueueFullException
+
+class Task:
+	# records when it ran, and waits for release when it is given an event
+	def __init__(self, name, log, release=None, result=None):
+		self.name=name
+		self.log=log
+		self.release=release
+		self.result=result
+		self.started=threading.Event()
+
+	def run(self):
+		self.log.append(('start', self.name))
+		self.started.set()
+		if self.release!=None:
+			self.release.wait(5)
+		time.sleep(0.001)
+		self.log.append(('end', self.name))
+		return self.result
+
+def waitFor(condition):
+	deadline=time.monotonic()+5
+	while not condition() and time.monotonic()<deadline:
+		time.sleep(0.005)
+	return condition()
+
+class TransitionSchedulerTest(unittest.TestCase):
+	def setUp(self):
+		self.log=[]
+		self.release=threading.Event()
+
+	def tearDown(self):
+		# the workers of each scheduler are daemon threads left waiting on an empty queue
+		self.release.set()
+
+	def scheduler(self, workers, queueSize=100):
+		scheduler=TransitionScheduler(workers=workers, queueSize=queueSize, retryAfter=7)
+		scheduler.start()
+		return scheduler
+
+	def test_transitions_on_one_resource_run_in_order(self):
+		scheduler=self.scheduler(4)
+		done=threading.Semaphore(0)
+		positions=[scheduler.submit(Task(i, self.log), 'Start', 1, requestId=i, onComplete=done.release) for i in range(6)]
+		self.assertEqual(positions, list(range(6)))
+		for i in range(6):
+			self.assertTrue(done.acquire(timeout=5))
+		self.assertEqual(self.log, [(event, i) for i in range(6) for event in ('start', 'end')])
+		self.assertTrue(waitFor(lambda: scheduler.getMetrics()['busyResources']==0))
+
+	def test_unrelated_resources_run_in_parallel(self):
+		scheduler=self.scheduler(2)
+		first=Task('first', self.log, self.release)
+		second=Task('second', self.log, self.release)
+		scheduler.submit(first, 'Start', 1)
+		scheduler.submit(second, 'Start', 2)
+		self.assertTrue(first.started.wait(5))
+		self.assertTrue(second.started.wait(5))
+
+	def test_queue_position(self):
+		scheduler=self.scheduler(1)
+		running=Task('running', self.log, self.release)
+		scheduler.submit(running, 'Start', 1, requestId=1)
+		self.assertTrue(running.started.wait(5))
+		scheduler.submit(Task('next', self.log), 'Stop', 1, requestId=2)
+		self.assertEqual(scheduler.queuePosition(1), 0)
+		self.assertEqual(scheduler.queuePosition(2), 1)
+		self.assertIsNone(scheduler.queuePosition(3))
+		self.release.set()
+		self.assertTrue(waitFor(lambda: scheduler.queuePosition(2)==None))
+
+	def test_ready_transitions_run_by_priority(self):
+		scheduler=self.scheduler(1)
+		blocker=Task('blocker', self.log, self.release)
+		scheduler.submit(blocker, 'Start', 1)
+		self.assertTrue(blocker.started.wait(5))
+		done=threading.Semaphore(0)
+		for name, resourceId in [('Install', 2), ('Configure', 3), ('Uninstall', 4)]:
+			scheduler.submit(Task(name, self.log), name, resourceId, onComplete=done.release)
+		self.release.set()
+		for i in range(3):
+			self.assertTrue(done.acquire(timeout=5))
+		self.assertEqual([name for event, name in self.log if event=='start'], ['blocker', 'Uninstall', 'Configure', 'Install'])
+
+	def test_full_queue_refuses_transitions(self):
+		scheduler=self.scheduler(1, queueSize=2)
+		running=Task('running', self.log, self.release)
+		scheduler.submit(running, 'Start', 1)
+		self.assertTrue(running.started.wait(5))
+		scheduler.submit(Task('waiting', self.log), 'Start', 2)
+		# queued behind the running transition on its resource, it still counts
+		scheduler.submit(Task('behind', self.log), 'Start', 1)
+		with self.assertRaises(TransitionQueueFullException) as raised:
+			scheduler.submit(Task('refused', self.log), 'Start', 3)
+		self.assertEqual(raised.exception.retryAfter, 7)
+		metrics=scheduler.getMetrics()
+		self.assertEqual((metrics['queueDepth'], metrics['rejected'], metrics['submitted']), (2, 1, 3))
+		self.release.set()
+		self.assertTrue(waitFor(lambda: scheduler.getMetrics()['completed']==3))
+		scheduler.submit(Task('accepted', self.log), 'Start', 3)
+
+	def test_resource_is_held_until_an_async_task_finishes(self):
+		scheduler=self.scheduler(2)
+		future=concurrent.futures.Future()
+		done=threading.Semaphore(0)
+		scheduler.submit(Task('async', self.log, result=future), 'Start', 1, onComplete=done.release)
+		following=Task('following', self.log)
+		scheduler.submit(following, 'Stop', 1, onComplete=done.release)
+		self.assertFalse(following.started.wait(0.1))
+		self.assertEqual(scheduler.getMetrics()['busyWorkers'], 1)
+		future.set_result(None)
+		self.assertTrue(done.acquire(timeout=5))
+		self.assertTrue(following.started.wait(5))
+		self.assertTrue(done.acquire(timeout=5))
+
+	def test_failing_task_releases_its_resource(self):
+		scheduler=self.scheduler(1)
+		done=threading.Semaphore(0)
+		failing=Task('failing', self.log)
+		failing.run=lambda: 1/0
+		scheduler.submit(failing, 'Start', 1, onComplete=done.release)
+		scheduler.submit(Task('next', self.log), 'Start', 1, onComplete=done.release)
+		self.assertTrue(done.acquire(timeout=5))
+		self.assertTrue(done.acquire(timeout=5))
+		self.assertEqual(self.log, [('start', 'next'), ('end', 'next')])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+from controllers.transition.TransitionTimings import TransitionTimings
+
+class TransitionTimingsTest(unittest.TestCase):
+	def test_phases_add_up_in_the_order_they_first_ran(self):
+		timings=TransitionTimings()
+		timings.add('imageLookup', 0.0015)
+		timings.add('networkAttach', 0.25)
+		timings.add('imageLookup', 0.001)
+		self.assertEqual(list(timings.asDict().items()), [('imageLookup', 2.5), ('networkAttach', 250.0)])
+
+	def test_phase_is_timed_when_its_body_raises(self):
+		timings=TransitionTimings()
+		with self.assertRaises(RuntimeError):
+			with timings.phase('lifecycleExec'):
+				raise RuntimeError()
+		self.assertIn('lifecycleExec', timings.phases)
+		self.assertGreaterEqual(timings.phases['lifecycleExec'], 0.0)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from controllers.util.SQLiteStore import SQLiteStore
+from controllers.util.WriteBehindStore import WriteBehindStore
+from tests.test_stores import transition
+
+class HookedLock:
+	# a lock that runs a function once, the first time it is released after the function is set
+	def __init__(self):
+		self.lock=threading.Lock()
+		self.afterRelease=None
+
+	def __enter__(self):
+		self.lock.acquire()
+
+	def __exit__(self, *args):
+		self.lock.release()
+		hook=self.afterRelease
+		if hook!=None:
+			self.afterRelease=None
+			hook()
+
+class WriteBehindStoreTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.backing=SQLiteStore(os.path.join(self.directory, 'db.sqlite'))
+		# flushed only when a test asks for it
+		self.store=WriteBehindStore(self.backing, flushInterval=3600, maxBatchSize=1000000)
+
+	def tearDown(self):
+		self.store.close()
+		shutil.rmtree(self.directory)
+
+	def test_reads_see_buffered_changes_before_a_flush(self):
+		self.store.insert(transition(1, 10))
+		self.store.update(1, {'requestState':'IN_PROGRESS'})
+		self.assertIsNone(self.backing.findByRequestId(1))
+		self.assertEqual(self.store.findByRequestId(1)['requestState'], 'IN_PROGRESS')
+		self.assertEqual([t['requestId'] for t in self.store.findByState('IN_PROGRESS')], [1])
+		self.assertEqual(self.store.eidForRequestId(1), 1)
+
+	def test_flush_writes_the_batch(self):
+		self.store.insert(transition(1, 10))
+		self.store.insert(transition(2, 10))
+		self.assertEqual(self.store.flush(), 2)
+		self.store.update(1, {'requestState':'COMPLETED'})
+		self.store.remove(2)
+		self.assertEqual(self.store.flush(), 2)
+		self.assertEqual(self.backing.findByRequestId(1)['requestState'], 'COMPLETED')
+		self.assertIsNone(self.backing.findByRequestId(2))
+		self.assertEqual(self.store.flush(), 0)
+
+	def test_update_of_stored_transition(self):
+		self.store.insert(transition(1, 10))
+		self.store.flush()
+		self.store.update(1, {'requestState':'FAILED'})
+		stored=self.store.findByRequestId(1)
+		self.assertEqual(stored['requestState'], 'FAILED')
+		self.assertEqual(stored['transitionName'], 'Install')
+
+	def test_update_of_unknown_transition_is_ignored(self):
+		self.store.update(5, {'requestState':'FAILED'})
+		self.assertIsNone(self.store.findByRequestId(5))
+		self.assertEqual(self.store.flush(), 0)
+
+	def test_merged_finders_prefer_buffered_rows(self):
+		self.store.insert(transition(1, 10, 'PENDING'))
+		self.store.insert(transition(2, 10, 'PENDING'))
+		self.store.flush()
+		self.store.update(2, {'requestState':'COMPLETED'})
+		self.store.insert(transition(3, 10, 'PENDING'))
+		self.assertEqual([t['requestId'] for t in self.store.findByState('PENDING')], [1, 3])
+		self.assertEqual([t['requestState'] for t in self.store.findByResourceId(10)], ['PENDING', 'COMPLETED', 'PENDING'])
+		self.assertEqual(self.store.maxIds(), (3, 10))
+
+	def test_update_survives_a_flush_between_its_lookups(self):
+		self.store.insert(transition(1, 10))
+		hooked=HookedLock()
+		self.store.lock=hooked
+		# the buffered row is flushed and dropped as soon as update first lets go of the lock
+		hooked.afterRelease=self.store.flush
+		self.store.update(1, {'requestState':'COMPLETED'})
+		self.store.flush()
+		self.assertEqual(self.backing.findByRequestId(1)['requestState'], 'COMPLETED')
+
+	def test_concurrent_updates_and_flushes_lose_nothing(self):
+		self.store.insert(transition(1, 10))
+		stop=threading.Event()
+		def flushing():
+			while not stop.is_set():
+				self.store.flush()
+		flusher=threading.Thread(target=flushing)
+		flusher.start()
+		def updating(worker):
+			for i in range(200):
+				self.store.update(1, {'field%d_%d' % (worker, i):i})
+		workers=[threading.Thread(target=updating, args=(worker,)) for worker in range(4)]
+		for t in workers:
+			t.start()
+		for t in workers:
+			t.join()
+		stop.set()
+		flusher.join()
+		self.store.flush()
+		stored=self.backing.findByRequestId(1)
+		self.assertEqual(sum(1 for key in stored if key.startswith('field')), 800)
+
+if __name__ == '__main__':
+	unittest.main()